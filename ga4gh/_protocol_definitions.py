@@ -8,8 +8,7 @@ on the appropriate schema version.
 from protocol import ProtocolElement
 from protocol import SearchRequest
 from protocol import SearchResponse
-
-import avro.schema
+from protocol import LazySchema
 
 version = '0.6.e6d6074'
 
@@ -24,7 +23,7 @@ Frequencies of alleles
 "allele"}, {"doc": "", "type": "double", "name": "frequency"}], "doc":
 ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "allele",
         "frequency",
@@ -66,7 +65,7 @@ information about the methodology used.
 {"default": {}, "doc": "", "type": {"values": {"items": "string",
 "type": "array"}, "type": "map"}, "name": "info"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["id"])
 
     @classmethod
@@ -127,7 +126,7 @@ null, "doc": "", "type": ["null", "string"], "name": "description"}]},
 "", "type": ["null", "string"], "name": "auth"}, {"default": null,
 "doc": "", "type": ["null", "string"], "name": "queries"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "api",
         "description",
@@ -191,7 +190,7 @@ The response from the Beacon
 "type": ["null", "string"], "name": "description"}]}], "name":
 "err"}]}, "name": "response"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "beacon",
         "query",
@@ -241,7 +240,7 @@ the occurrence of a SNP named rs1234 in a call set with the name NA12345.
 {"items": "string", "type": "array"}, "type": "map"}, "name":
 "info"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["callSetId"])
 
     @classmethod
@@ -283,7 +282,7 @@ null, "doc": "", "type": ["null", "string"], "name": "name"}, {"doc":
 "type": {"values": {"items": "string", "type": "array"}, "type":
 "map"}, "name": "info"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "id",
         "sampleId",
@@ -379,7 +378,7 @@ A structure for an instance of a CIGAR operation.
 null, "doc": "", "type": ["null", "string"], "name":
 "referenceSequence"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "operation",
         "operationLength",
@@ -428,7 +427,7 @@ null, "doc": "", "type": ["null", "string"], "name": "description"}]},
 "type": "array"}, "name": "requirements"}]}, "type": "array"}, "name":
 "data_use"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "id",
         "multiple",
@@ -474,7 +473,7 @@ DataSetSizeResource
 "variants"}, {"doc": "", "type": "int", "name": "samples"}], "doc":
 ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "samples",
         "variants",
@@ -507,7 +506,7 @@ DataUseRequirementResource
 "name": "name"}, {"default": null, "doc": "", "type": ["null",
 "string"], "name": "description"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["name"])
 
     @classmethod
@@ -541,7 +540,7 @@ DataUseResource
 null, "doc": "", "type": ["null", "string"], "name": "description"}]},
 "type": "array"}, "name": "requirements"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["category"])
 
     @classmethod
@@ -575,7 +574,7 @@ No documentation
 "fields": [{"doc": "", "type": "string", "name": "id"}, {"default":
 null, "doc": "", "type": ["null", "string"], "name": "description"}]}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["id"])
 
     @classmethod
@@ -605,7 +604,7 @@ ErrorResource
 "name"}, {"default": null, "doc": "", "type": ["null", "string"],
 "name": "description"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["name"])
 
     @classmethod
@@ -637,7 +636,7 @@ No documentation
 ["null", "string"], "name": "sequencingCenter"}, {"doc": "", "type":
 ["null", "string"], "name": "instrumentModel"}]}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "instrumentModel",
         "sequencingCenter",
@@ -673,7 +672,7 @@ A general exception type.
 "message"}, {"default": -1, "doc": "", "type": "int", "name":
 "errorCode"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["message"])
 
     @classmethod
@@ -742,7 +741,7 @@ null, "doc": "", "type": ["null", "long"], "name": "dateOfBirth"},
 "", "type": {"values": {"items": "string", "type": "array"}, "type":
 "map"}, "name": "info"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["id"])
 
     @classmethod
@@ -806,7 +805,7 @@ Represents a group of individuals. (e.g. a trio)
 {}, "doc": "", "type": {"values": {"items": "string", "type":
 "array"}, "type": "map"}, "name": "info"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["id"])
 
     @classmethod
@@ -855,7 +854,7 @@ A linear alignment can be represented by one CIGAR string.
 ["null", "string"], "name": "referenceSequence"}]}, "type": "array"},
 "name": "cigar"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["position"])
 
     @classmethod
@@ -896,7 +895,7 @@ example:
 ["null", "long"], "name": "end"}, {"default": null, "doc": "", "type":
 ["null", "string"], "name": "pageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -928,7 +927,7 @@ The response from `GET /references/{id}/bases` expressed as JSON.
 "name": "sequence"}, {"default": null, "doc": "", "type": ["null",
 "string"], "name": "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["sequence"])
 
     @classmethod
@@ -961,7 +960,7 @@ An ontology term describing an attribute. (e.g. the phenotype attribute
 {"default": null, "doc": "", "type": ["null", "string"], "name":
 "name"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "id",
         "ontologySource",
@@ -1000,7 +999,7 @@ forward or reverse strand that we're talking about.
 "NO_STRAND"], "doc": "", "type": "enum", "name": "Strand"}, "name":
 "strand"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "position",
         "referenceName",
@@ -1038,7 +1037,7 @@ No documentation
 "type": ["null", "string"], "name": "prevProgramId"}, {"default":
 null, "doc": "", "type": ["null", "string"], "name": "version"}]}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -1073,7 +1072,7 @@ A request for information about a specific site
 "string", "name": "reference"}, {"default": null, "doc": "", "type":
 ["null", "string"], "name": "dataset"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "allele",
         "chromosome",
@@ -1147,7 +1146,7 @@ false, "doc": "", "type": ["boolean", "null"], "name":
 "type": {"values": {"items": "string", "type": "array"}, "type":
 "map"}, "name": "info"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "fragmentName",
         "id",
@@ -1237,7 +1236,7 @@ null, "doc": "", "type": ["null", "string"], "name": "prevProgramId"},
 "type": {"values": {"items": "string", "type": "array"}, "type":
 "map"}, "name": "info"}]}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "experiment",
         "id",
@@ -1328,7 +1327,7 @@ null, "doc": "", "type": ["null", "long"], "name": "baseCount"}],
 "map"}, "name": "info"}], "type": "record", "name": "ReadGroup"},
 "type": "array"}, "name": "readGroups"}]}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["id"])
 
     @classmethod
@@ -1368,7 +1367,7 @@ No documentation
 "type": ["null", "long"], "name": "unalignedReadCount"}, {"default":
 null, "doc": "", "type": ["null", "long"], "name": "baseCount"}]}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -1408,7 +1407,7 @@ null, "doc": "", "type": ["null", "float"], "name":
 "sourceDivergence"}, {"default": null, "doc": "", "type": ["null",
 "int"], "name": "ncbiTaxonId"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "id",
         "length",
@@ -1463,7 +1462,7 @@ null, "doc": "", "type": ["null", "string"], "name": "sourceURI"},
 "sourceAccessions"}, {"default": false, "doc": "", "type": "boolean",
 "name": "isDerived"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "id",
         "md5checksum",
@@ -1515,7 +1514,7 @@ The response to the Beacon query
 "type": ["null", "string"], "name": "description"}]}], "name":
 "err"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["exists"])
 
     @classmethod
@@ -1574,7 +1573,7 @@ null, "doc": "", "type": ["null", "long"], "name": "updated"},
 "doc": "", "type": {"values": {"items": "string", "type": "array"},
 "type": "map"}, "name": "info"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set(["id"])
 
     @classmethod
@@ -1631,7 +1630,7 @@ This request maps to the body of `POST /analyses/search` as JSON.
 "doc": "", "type": ["null", "string"], "name": "pageToken"}], "doc":
 ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -1673,7 +1672,7 @@ null, "doc": "", "type": {"items": "string", "type": "array"}, "name":
 ""}, "type": "array"}, "name": "analyses"}, {"default": null, "doc":
 "", "type": ["null", "string"], "name": "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "analyses"
 
@@ -1711,7 +1710,7 @@ This request maps to the body of `POST /callsets/search` as JSON.
 "pageSize"}, {"default": null, "doc": "", "type": ["null", "string"],
 "name": "pageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -1753,7 +1752,7 @@ This is the response from `POST /callsets/search` expressed as JSON.
 "array"}, "name": "callSets"}, {"default": null, "doc": "", "type":
 ["null", "string"], "name": "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "callSets"
 
@@ -1790,7 +1789,7 @@ This request maps to the body of `POST /experiments/search` as JSON.
 "doc": "", "type": ["null", "string"], "name": "pageToken"}], "doc":
 ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -1842,7 +1841,7 @@ null, "doc": "", "type": ["null", "string"], "name": "molecule"},
 {"default": null, "doc": "", "type": ["null", "string"], "name":
 "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "experiments"
 
@@ -1879,7 +1878,7 @@ This request maps to the body of `POST /individualgroups/search` as JSON.
 null, "doc": "", "type": ["null", "string"], "name": "pageToken"}],
 "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -1921,7 +1920,7 @@ null, "doc": "", "type": ["null", "string"], "name": "type"},
 "doc": "", "type": ["null", "string"], "name": "nextPageToken"}],
 "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "individualGroups"
 
@@ -1959,7 +1958,7 @@ This request maps to the body of `POST /individuals/search` as JSON.
 "pageSize"}, {"default": null, "doc": "", "type": ["null", "string"],
 "name": "pageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -2018,7 +2017,7 @@ null, "doc": "", "type": ["null", "long"], "name": "dateOfBirth"},
 "individuals"}, {"default": null, "doc": "", "type": ["null",
 "string"], "name": "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "individuals"
 
@@ -2056,7 +2055,7 @@ This request maps to the body of `POST /readgroupsets/search` as JSON.
 "pageSize"}, {"default": null, "doc": "", "type": ["null", "string"],
 "name": "pageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -2127,7 +2126,7 @@ null, "doc": "", "type": ["null", "string"], "name": "name"},
 "array"}, "name": "readGroupSets"}, {"default": null, "doc": "",
 "type": ["null", "string"], "name": "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "readGroupSets"
 
@@ -2171,7 +2170,7 @@ specified, all `ReadGroup`s must be aligned to the same `ReferenceSet`.
 "int"], "name": "pageSize"}, {"default": null, "doc": "", "type":
 ["null", "string"], "name": "pageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -2244,7 +2243,7 @@ false, "doc": "", "type": ["boolean", "null"], "name":
 "alignments"}, {"default": null, "doc": "", "type": ["null",
 "string"], "name": "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "alignments"
 
@@ -2285,7 +2284,7 @@ as JSON.
 "doc": "", "type": ["null", "string"], "name": "pageToken"}], "doc":
 ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -2332,7 +2331,7 @@ expressed as JSON.
 "array"}, "name": "referenceSets"}, {"default": null, "doc": "",
 "type": ["null", "string"], "name": "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "referenceSets"
 
@@ -2373,7 +2372,7 @@ as JSON.
 null, "doc": "", "type": ["null", "string"], "name": "pageToken"}],
 "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -2418,7 +2417,7 @@ This is the response from `POST /references/search` expressed as JSON.
 "references"}, {"default": null, "doc": "", "type": ["null",
 "string"], "name": "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "references"
 
@@ -2456,7 +2455,7 @@ This request maps to the body of `POST /samples/search` as JSON.
 "pageSize"}, {"default": null, "doc": "", "type": ["null", "string"],
 "name": "pageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -2512,7 +2511,7 @@ null, "doc": "", "type": ["null", "string"], "name": "description"},
 {"default": null, "doc": "", "type": ["null", "string"], "name":
 "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "samples"
 
@@ -2549,7 +2548,7 @@ This request maps to the body of `POST /variantsets/search` as JSON.
 "pageSize"}, {"default": null, "doc": "", "type": ["null", "string"],
 "name": "pageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -2593,7 +2592,7 @@ This is the response from `POST /variantsets/search` expressed as JSON.
 null, "doc": "", "type": ["null", "string"], "name":
 "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "variantSets"
 
@@ -2635,7 +2634,7 @@ This request maps to the body of `POST /variants/search` as JSON.
 "pageSize"}, {"default": null, "doc": "", "type": ["null", "string"],
 "name": "pageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "end",
         "referenceName",
@@ -2700,7 +2699,7 @@ This is the response from `POST /variants/search` expressed as JSON.
 {"default": null, "doc": "", "type": ["null", "string"], "name":
 "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "variants"
 
@@ -2771,7 +2770,7 @@ This is equivalent to a row in VCF.
 "type": "map"}, "name": "info"}]}, "type": "array"}, "name":
 "calls"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "end",
         "id",
@@ -2835,7 +2834,7 @@ The variant set is equivalent to a VCF file.
 "map"}, "name": "info"}]}, "type": "array"}, "name": "metadata"}],
 "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "datasetId",
         "id",
@@ -2879,7 +2878,7 @@ This metadata represents VCF header information.
 "type": {"values": {"items": "string", "type": "array"}, "type":
 "map"}, "name": "info"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([
         "description",
         "id",
@@ -2921,7 +2920,7 @@ class SearchDatasetsRequest(SearchRequest):
 "type": ["null", "int"], "name": "pageSize"}, {"default": null, "doc":
 "", "type": ["null", "string"], "name": "pageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
 
     @classmethod
@@ -2958,7 +2957,7 @@ class SearchDatasetsResponse(SearchResponse):
 "datasets"}, {"default": null, "doc": "", "type": ["null", "string"],
 "name": "nextPageToken"}], "doc": ""}
 """
-    schema = avro.schema.parse(_schemaSource)
+    schema = LazySchema()
     requiredFields = set([])
     _valueListName = "datasets"
 
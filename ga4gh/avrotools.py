@@ -16,6 +16,9 @@ INT_MAX_VALUE = (1 << 31) - 1
 LONG_MIN_VALUE = -(1 << 63)
 LONG_MAX_VALUE = (1 << 63) - 1
 
+# compiled validation functions, keyed by protocol class
+_compiledValidators = {}
+
 
 class AvrotoolsException(Exception):
     """
@@ -57,6 +60,28 @@ class Validator(AvroTool):
         invalidFields = validator.getInvalidFields(jsonDict)
         return invalidFields
 
+    def isValid(self, jsonDict):
+        """
+        Returns True if the jsonDict is a valid instance of class class_.
+        This gives the same result as class_.validate, but uses a
+        validation function compiled from the schema, which is cached
+        for each class and cheap enough to run on the main data path.
+        A ProtocolElement may be passed in place of the jsonDict.
+        """
+        return self.getCompiledValidator()(jsonDict)
+
+    def getCompiledValidator(self):
+        """
+        Returns the compiled validation function for class class_,
+        compiling it on first use.
+        """
+        try:
+            return _compiledValidators[self.class_]
+        except KeyError:
+            validator = ValidatorCompiler(self.class_).compile()
+            _compiledValidators[self.class_] = validator
+            return validator
+
 
 class Creator(AvroTool):
     """
@@ -353,6 +378,119 @@ class SchemaValidator(AvroTypeSwitch):
         return self.handleRecord(schema, datum)
 
 
+class ValidatorCompiler(AvroTypeSwitch):
+    """
+    Compiles the schema of a protocol class into a function that takes
+    a jsonDict and returns True if it is a valid instance of the schema.
+    The compiled function gives the same answers as avro.io.validate,
+    but the walk over the schema is done once at compile time rather
+    than on every call. Records may also be given as ProtocolElement
+    instances, in which case their attributes are validated directly,
+    without first converting them to a jsonDict.
+    """
+    def __init__(self, class_):
+        super(ValidatorCompiler, self).__init__(class_)
+        self._recordValidators = {}
+
+    def compile(self):
+        """
+        Returns the validation function for the schema of class_
+        """
+        return self.handleSchema(self.schema)
+
+    def handleNull(self):
+        return lambda datum: datum is None
+
+    def handleBoolean(self):
+        return lambda datum: isinstance(datum, bool)
+
+    def handleString(self):
+        return lambda datum: isinstance(datum, basestring)
+
+    def handleBytes(self):
+        return lambda datum: isinstance(datum, str)
+
+    def handleInt(self):
+        return lambda datum: (
+            isinstance(datum, (int, long)) and
+            INT_MIN_VALUE <= datum <= INT_MAX_VALUE)
+
+    def handleLong(self):
+        return lambda datum: (
+            isinstance(datum, (int, long)) and
+            LONG_MIN_VALUE <= datum <= LONG_MAX_VALUE)
+
+    def handleFloat(self):
+        return lambda datum: isinstance(datum, (int, long, float))
+
+    def handleDouble(self):
+        return self.handleFloat()
+
+    def handleFixed(self, schema):
+        size = schema.size
+        return lambda datum: isinstance(datum, str) and len(datum) == size
+
+    def handleEnum(self, schema):
+        # symbols are always strings, so anything else can't be a member
+        symbols = frozenset(schema.symbols)
+        return lambda datum: (
+            isinstance(datum, basestring) and datum in symbols)
+
+    def handleArray(self, schema):
+        validateItem = self.handleSchema(schema.items)
+        return lambda datum: (
+            isinstance(datum, list) and all(map(validateItem, datum)))
+
+    def handleMap(self, schema):
+        validateValue = self.handleSchema(schema.values)
+        return lambda datum: (
+            isinstance(datum, dict) and
+            all(isinstance(key, basestring) for key in datum) and
+            all(map(validateValue, datum.values())))
+
+    def handleUnion(self, schema):
+        validators = [
+            self.handleSchema(unionSchema) for unionSchema in schema.schemas]
+        nonNullValidators = [
+            validator for unionSchema, validator
+            in zip(schema.schemas, validators) if unionSchema.type != 'null']
+        if len(nonNullValidators) == 1 and len(validators) == 2:
+            # the common ["null", T] optional field
+            validateValue = nonNullValidators[0]
+            return lambda datum: datum is None or validateValue(datum)
+        return lambda datum: any(
+            validator(datum) for validator in validators)
+
+    def handleRecord(self, schema):
+        name = schema.fullname
+        if name in self._recordValidators:
+            return self._recordValidators[name]
+        # Records may refer to themselves, so register a forwarding
+        # function before compiling the fields
+        compiled = []
+        self._recordValidators[name] = lambda datum: compiled[0](datum)
+        fieldValidators = tuple(
+            (field.name, self.handleSchema(field.type))
+            for field in schema.fields)
+
+        def validateRecord(datum):
+            if isinstance(datum, dict):
+                for fieldName, validateField in fieldValidators:
+                    if not validateField(datum.get(fieldName)):
+                        return False
+                return True
+            elif isinstance(datum, protocol.ProtocolElement):
+                # validate the attributes that would be serialised
+                for fieldName, validateField in fieldValidators:
+                    if not validateField(getattr(datum, fieldName, None)):
+                        return False
+                return True
+            return False
+        compiled.append(validateRecord)
+        self._recordValidators[name] = validateRecord
+        return validateRecord
+
+
 class RandomInstanceCreator(AvroTypeSwitch):
     """
     Generates random instances and values
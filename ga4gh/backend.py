@@ -8,13 +8,22 @@ from __future__ import unicode_literals
 
 import os
 import json
+import time
+import fcntl
+import functools
+import hashlib
 import random
+import threading
+import collections
 
 import ga4gh.protocol as protocol
+import ga4gh.avrotools as avrotools
 import ga4gh.datamodel.references as references
 import ga4gh.exceptions as exceptions
+import ga4gh.metrics as metrics
 import ga4gh.datamodel as datamodel
 import ga4gh.datamodel.datasets as datasets
+import ga4gh.datamodel.variants as variants
 
 
 def _parsePageToken(pageToken, numValues):
@@ -37,6 +46,55 @@ def _parsePageToken(pageToken, numValues):
     return values
 
 
+def _parseIntegerArgument(requestArgs, argName, defaultValue):
+    """
+    Returns the integer value of the specified argument in the specified
+    dictionary of request arguments, or defaultValue if it is not present.
+    Raises a BadRequestIntegerException if the value cannot be parsed.
+    """
+    ret = defaultValue
+    if argName in requestArgs:
+        argString = requestArgs[argName]
+        try:
+            ret = int(argString)
+        except ValueError:
+            raise exceptions.BadRequestIntegerException(argName, argString)
+    return ret
+
+
+def _getRequestKey(request, pageToken, searchOptions=None):
+    """
+    Returns a hashable key identifying the results of the specified search
+    request from the specified page token onwards. The page size does not
+    affect which objects are returned, and so is not part of the key. The
+    searchOptions are the options given as URL arguments rather than in
+    the request, such as a variant filter, which change the results.
+    """
+    jsonDict = request.toJsonDict()
+    jsonDict["pageSize"] = None
+    jsonDict["pageToken"] = pageToken
+    return (
+        type(request).__name__, json.dumps(jsonDict, sort_keys=True),
+        json.dumps(searchOptions, sort_keys=True))
+
+
+def _parseFieldsArgument(requestArgs, valueClass):
+    """
+    Returns the sorted list of the fields of the specified valueClass
+    named in the comma separated fields argument of the specified
+    request arguments, or None if there is no fields argument.
+    """
+    if "fields" not in requestArgs:
+        return None
+    fields = set(name.strip() for name in requestArgs["fields"].split(","))
+    fields.discard("")
+    unknownFields = fields - set(valueClass.__slots__)
+    if len(unknownFields) > 0:
+        raise exceptions.UnknownFieldsException(
+            ",".join(sorted(unknownFields)), valueClass.__name__)
+    return sorted(fields)
+
+
 def _getVariantSet(request, variantSetIdMap):
     if len(request.variantSetIds) != 1:
         if len(request.variantSetIds) == 0:
@@ -59,11 +117,18 @@ class IntervalIterator(object):
     range to search for the object. Returns an iterator over
     (object, pageToken) pairs. The pageToken is a string which allows
     us to pick up the iteration at any point, and is None for the last
-    value in the iterator.
+    value in the iterator. If reopen is True, the search reads from its
+    own copy of the underlying file handle, so the iterator can be kept
+    between pages while other searches use the same file. The
+    searchOptions are the options given as URL arguments alongside the
+    request.
     """
-    def __init__(self, request, containerIdMap):
+    def __init__(self, request, containerIdMap, reopen=False,
+                 searchOptions=None):
         self._request = request
         self._containerIdMap = containerIdMap
+        self._reopen = reopen
+        self._searchOptions = searchOptions
         self._container = self._getContainer()
         self._searchIterator = None
         self._currentObject = None
@@ -151,11 +216,33 @@ class IntervalIterator(object):
     def __iter__(self):
         return self
 
+    def getSearchOptions(self):
+        """
+        Returns the search options this iterator was created with.
+        """
+        return self._searchOptions
+
+    def _getSearchOption(self, name):
+        if self._searchOptions is None:
+            return None
+        return self._searchOptions.get(name)
+
 
 class ReadsIntervalIterator(IntervalIterator):
     """
-    An interval iterator for reads
+    An interval iterator for reads. The reference may be given by its
+    index in the header of the read group's BAM file, or by the id of
+    one of the References in the specified referenceIdMap, whose reads
+    are found by its name.
     """
+    def __init__(self, request, containerIdMap, reopen=False,
+                 searchOptions=None, referenceIdMap=None):
+        self._referenceIdMap = referenceIdMap
+        if referenceIdMap is None:
+            self._referenceIdMap = {}
+        super(ReadsIntervalIterator, self).__init__(
+            request, containerIdMap, reopen, searchOptions)
+
     def _getContainer(self):
         if len(self._request.readGroupIds) != 1:
             if len(self._request.readGroupIds) == 0:
@@ -171,8 +258,16 @@ class ReadsIntervalIterator(IntervalIterator):
         return readGroup
 
     def _search(self, start, end):
+        referenceId = self._request.referenceId
+        referenceName = None
+        reference = self._referenceIdMap.get(referenceId)
+        if reference is not None:
+            referenceId = None
+            referenceName = reference.getName()
         return self._container.getReadAlignments(
-            self._request.referenceId, start, end)
+            referenceId, start, end, reopen=self._reopen,
+            fields=self._getSearchOption("fields"),
+            referenceName=referenceName)
 
     @classmethod
     def _getStart(cls, readAlignment):
@@ -192,9 +287,15 @@ class VariantsIntervalIterator(IntervalIterator):
         return _getVariantSet(self._request, self._containerIdMap)
 
     def _search(self, start, end):
+        variantFilter = None
+        if self._getSearchOption("filter") is not None:
+            variantFilter = variants.VariantFilter(
+                self._getSearchOption("filter"))
         return self._container.getVariants(
             self._request.referenceName, start, end, self._request.variantName,
-            self._request.callSetIds)
+            self._request.callSetIds, reopen=self._reopen,
+            variantFilter=variantFilter,
+            fields=self._getSearchOption("fields"))
 
     @classmethod
     def _getStart(cls, variant):
@@ -205,6 +306,432 @@ class VariantsIntervalIterator(IntervalIterator):
         return variant.end
 
 
+class CursorCache(object):
+    """
+    A bounded cache of live search iterators. When a page of an interval
+    search ends, the iterator is parked under a key derived from the
+    request and the nextPageToken it returned, so that the request for
+    the next page can continue the iteration rather than repeating the
+    search and skipping forward. Cursors expire after timeout seconds,
+    and the least recently parked cursor is evicted when more than
+    maxSize are held; each cursor holds an open file handle. A request
+    whose cursor is gone falls back to resuming from its page token.
+    """
+    def __init__(self, maxSize=0, timeout=60):
+        self._cursors = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._maxSize = maxSize
+        self._timeout = timeout
+
+    def setMaxSize(self, maxSize):
+        """
+        Sets the maximum number of cursors held. A size of zero disables
+        the cache.
+        """
+        with self._lock:
+            self._maxSize = maxSize
+            self._evict()
+
+    def setTimeout(self, timeout):
+        """
+        Sets the number of seconds for which a cursor is kept.
+        """
+        self._timeout = timeout
+
+    def isEnabled(self):
+        """
+        Returns True if cursors are kept by this cache.
+        """
+        return self._maxSize > 0
+
+    def getNumCursors(self):
+        """
+        Returns the number of cursors currently held.
+        """
+        return len(self._cursors)
+
+    def park(self, key, cursor):
+        """
+        Keeps the specified cursor under the specified key.
+        """
+        with self._lock:
+            self._cursors.pop(key, None)
+            self._cursors[key] = (time.time() + self._timeout, cursor)
+            self._evict()
+
+    def take(self, key):
+        """
+        Removes the cursor held under the specified key and returns it,
+        or returns None if there is no such cursor or it has expired.
+        """
+        with self._lock:
+            expiry, cursor = self._cursors.pop(key, (None, None))
+        if cursor is not None and expiry <= time.time():
+            cursor = None
+        return cursor
+
+    def _evict(self):
+        now = time.time()
+        expiredKeys = [
+            key for key, (expiry, _) in self._cursors.items()
+            if expiry <= now]
+        for key in expiredKeys:
+            del self._cursors[key]
+        while len(self._cursors) > self._maxSize:
+            self._cursors.popitem(last=False)
+
+
+class PrefetchedPage(object):
+    """
+    A search response page that is being, or has been, computed in a
+    background thread by the PagePrefetcher.
+    """
+    def __init__(self):
+        self.computed = threading.Event()
+        self.responseString = None
+        self.nextPageToken = None
+        self.expiry = None
+
+
+class PagePrefetcher(object):
+    """
+    Computes search response pages in background threads ahead of the
+    requests for them, and holds the serialised pages until they are
+    requested. The pages held are bounded by a memory budget in bytes,
+    beyond which the oldest pages are discarded, and pages that are not
+    requested within timeout seconds expire. At most maxPending pages
+    are computed at any one time; further prefetches are skipped.
+    """
+    maxPending = 4
+
+    def __init__(self, memoryBudget=64 * 1024 * 1024, timeout=60):
+        self._pages = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._memoryBudget = memoryBudget
+        self._memoryUsed = 0
+        self._numPending = 0
+        self._timeout = timeout
+
+    def setMemoryBudget(self, memoryBudget):
+        """
+        Sets the maximum total length of the pages held.
+        """
+        with self._lock:
+            self._memoryBudget = memoryBudget
+            self._evict()
+
+    def getMemoryUsed(self):
+        """
+        Returns the total length of the pages currently held.
+        """
+        return self._memoryUsed
+
+    def prefetch(self, key, computePage):
+        """
+        Starts computing the page under the specified key in a background
+        thread by calling computePage, which returns the serialised page
+        and its nextPageToken.
+        """
+        with self._lock:
+            if key in self._pages or self._numPending >= self.maxPending:
+                return
+            page = PrefetchedPage()
+            self._pages[key] = page
+            self._numPending += 1
+        thread = threading.Thread(
+            target=self._computePage, args=(key, page, computePage))
+        thread.daemon = True
+        thread.start()
+
+    def _computePage(self, key, page, computePage):
+        # Prefetches are not part of any request, so the time spent
+        # computing each page is added to a stage of its own.
+        start = time.time()
+        try:
+            responseString, nextPageToken = computePage()
+        except Exception:
+            # The request for this page will compute it again and
+            # report the error
+            responseString, nextPageToken = None, None
+        metrics.registry.addTime(metrics.PREFETCH, time.time() - start)
+        with self._lock:
+            self._numPending -= 1
+            if self._pages.get(key) is page:
+                if responseString is None:
+                    del self._pages[key]
+                else:
+                    page.responseString = responseString
+                    page.nextPageToken = nextPageToken
+                    page.expiry = time.time() + self._timeout
+                    self._memoryUsed += len(responseString)
+                    self._evict()
+        page.computed.set()
+
+    def take(self, key):
+        """
+        Removes the page held under the specified key and returns its
+        (responseString, nextPageToken) pair, waiting for it to be computed
+        if necessary. Returns None if there is no such page, or it has
+        expired.
+        """
+        with self._lock:
+            page = self._pages.get(key)
+        if page is None:
+            return None
+        page.computed.wait(self._timeout)
+        with self._lock:
+            if self._pages.get(key) is not page:
+                return None
+            del self._pages[key]
+            if page.responseString is None:
+                return None
+            self._memoryUsed -= len(page.responseString)
+        if page.expiry <= time.time():
+            return None
+        return page.responseString, page.nextPageToken
+
+    def _evict(self):
+        now = time.time()
+        for key, page in self._pages.items():
+            if page.responseString is not None and (
+                    page.expiry <= now or
+                    self._memoryUsed > self._memoryBudget):
+                del self._pages[key]
+                self._memoryUsed -= len(page.responseString)
+
+
+class SearchPageCache(object):
+    """
+    A least recently used cache of serialised search response pages,
+    keyed by the normalised request. Each page is stored with the
+    version of the data it was computed from, and is discarded when it
+    is looked up with a different version. The total length of the pages
+    held is bounded by maxSize bytes; a maxSize of zero disables the
+    cache.
+    """
+    def __init__(self, maxSize=0):
+        self._pages = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._maxSize = maxSize
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def setMaxSize(self, maxSize):
+        """
+        Sets the maximum total length of the pages held.
+        """
+        with self._lock:
+            self._maxSize = maxSize
+            self._evict()
+
+    def isEnabled(self):
+        """
+        Returns True if pages are kept by this cache.
+        """
+        return self._maxSize > 0
+
+    def get(self, key, dataVersion):
+        """
+        Returns the (responseString, nextPageToken) pair held under the
+        specified key for the specified data version, or None if there
+        is no such page.
+        """
+        with self._lock:
+            entry = self._pages.pop(key, None)
+            if entry is not None and entry[0] != dataVersion:
+                self._size -= len(entry[1][0])
+                entry = None
+            if entry is None:
+                self._misses += 1
+                metrics.registry.increment(metrics.SEARCH_PAGE_CACHE_MISSES)
+                return None
+            self._hits += 1
+            metrics.registry.increment(metrics.SEARCH_PAGE_CACHE_HITS)
+            self._pages[key] = entry
+            return entry[1]
+
+    def put(self, key, dataVersion, page):
+        """
+        Keeps the specified (responseString, nextPageToken) pair under the
+        specified key for the specified data version.
+        """
+        with self._lock:
+            oldEntry = self._pages.pop(key, None)
+            if oldEntry is not None:
+                self._size -= len(oldEntry[1][0])
+            self._pages[key] = (dataVersion, page)
+            self._size += len(page[0])
+            self._evict()
+
+    def getStatistics(self):
+        """
+        Returns a dictionary of the hit, miss and eviction counts of
+        this cache and the number and total length of pages held.
+        """
+        with self._lock:
+            return {
+                "hits": self._hits, "misses": self._misses,
+                "evictions": self._evictions, "pages": len(self._pages),
+                "size": self._size}
+
+    def _evict(self):
+        while self._size > self._maxSize:
+            _, (_, page) = self._pages.popitem(last=False)
+            self._size -= len(page[0])
+            self._evictions += 1
+            metrics.registry.increment(metrics.SEARCH_PAGE_CACHE_EVICTIONS)
+
+
+class SingleFlightCall(object):
+    """
+    A call being made by the SingleFlight on behalf of a group of callers.
+    """
+    def __init__(self):
+        self.finished = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight(object):
+    """
+    Collapses concurrent calls with the same key into a single call,
+    whose result is returned to every caller. Calls are collapsed
+    between the threads of this process and, if a lock directory is
+    given, between the processes on this host that share it. Between
+    processes the results are passed through files in the lock
+    directory, and so must be serialisable as JSON; sequences come back
+    as lists.
+    """
+    # The number of seconds after which unused files are removed from
+    # the lock directory
+    fileTimeout = 60
+
+    def __init__(self, lockDirectory=None):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._lockDirectory = lockDirectory
+        self._nextCleanup = 0
+
+    def run(self, key, function):
+        """
+        Returns the result of calling function, unless a call with the
+        same key is already being made, in which case we wait for it to
+        finish and return its result, or raise its exception.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            isLeader = call is None
+            if isLeader:
+                call = SingleFlightCall()
+                self._calls[key] = call
+        if not isLeader:
+            call.finished.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+        try:
+            if self._lockDirectory is None:
+                call.result = function()
+            else:
+                call.result = self._runBetweenProcesses(key, function)
+        except Exception as exception:
+            call.exception = exception
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.finished.set()
+        return call.result
+
+    def _runBetweenProcesses(self, key, function):
+        # Callers hold an exclusive lock on a file named for the key
+        # while making the call. Each result is written with a generation
+        # number one greater than that of the result it replaces, so a
+        # caller that finds a newer generation once it gets the lock knows
+        # another process made the call while it was waiting, and uses
+        # that result rather than making the call again.
+        self._removeUnusedFiles()
+        name = hashlib.sha1(json.dumps(key)).hexdigest()
+        lockPath = os.path.join(self._lockDirectory, name + ".lock")
+        resultPath = os.path.join(self._lockDirectory, name + ".json")
+        requestGeneration = self._readGeneration(resultPath)
+        with self._lockFile(lockPath):
+            generation = 0
+            try:
+                with open(resultPath) as resultFile:
+                    generation = int(resultFile.readline())
+                    if generation > requestGeneration:
+                        return json.load(resultFile)
+            except (IOError, OSError, ValueError):
+                pass
+            result = function()
+            tempPath = "{}.{}".format(resultPath, os.getpid())
+            with open(tempPath, "w") as resultFile:
+                resultFile.write("{}\n".format(generation + 1))
+                json.dump(result, resultFile)
+            os.rename(tempPath, resultPath)
+            return result
+
+    def _lockFile(self, lockPath):
+        # Returns the open lock file at the specified path, once we hold
+        # an exclusive lock on it. The file may be removed as unused
+        # between our opening and locking it, in which case we hold a lock
+        # nobody else can see, and so we try again. Each lock marks the
+        # file as used.
+        while True:
+            lockFile = open(lockPath, "a")
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            try:
+                if (os.fstat(lockFile.fileno()).st_ino ==
+                        os.stat(lockPath).st_ino):
+                    os.utime(lockPath, None)
+                    return lockFile
+            except OSError:
+                pass
+            lockFile.close()
+
+    def _readGeneration(self, resultPath):
+        # Returns the generation of the result in the specified file,
+        # or 0 if there is none.
+        try:
+            with open(resultPath) as resultFile:
+                return int(resultFile.readline())
+        except (IOError, OSError, ValueError):
+            return 0
+
+    def _removeUnusedFiles(self):
+        now = time.time()
+        if now < self._nextCleanup:
+            return
+        self._nextCleanup = now + self.fileTimeout
+        for fileName in os.listdir(self._lockDirectory):
+            path = os.path.join(self._lockDirectory, fileName)
+            try:
+                if fileName.endswith(".lock"):
+                    self._removeUnusedLockFile(path, now)
+                elif os.path.getmtime(path) < now - self.fileTimeout:
+                    os.unlink(path)
+            except (IOError, OSError):
+                # Removed by another process
+                pass
+
+    def _removeUnusedLockFile(self, lockPath, now):
+        # A lock file is only removed while we hold its lock, so that no
+        # other process is making the call under it, and a process that
+        # opened it before its removal sees that it is gone once it gets
+        # the lock.
+        with open(lockPath) as lockFile:
+            try:
+                fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                # In use
+                return
+            if os.path.getmtime(lockPath) < now - self.fileTimeout:
+                os.unlink(lockPath)
+
+
 class AbstractBackend(object):
     """
     An abstract GA4GH backend.
@@ -217,10 +744,35 @@ class AbstractBackend(object):
         self._referenceIds = []
         self._requestValidation = False
         self._responseValidation = False
+        self._responseValidationSampleRate = 1.0
+        self._responseValidationRandom = random.Random()
         self._defaultPageSize = 100
         self._maxResponseLength = 2**20  # 1 MiB
+        self._maxCoverageBins = 10000
+        self._cursorCache = CursorCache()
+        self._pagePrefetcher = PagePrefetcher()
+        self._searchPageCache = SearchPageCache()
+        self._singleFlight = None
+        self._prefetchRequestClasses = set()
         self._datasetIdMap = {}
         self._datasetIds = []
+        self._indexReferences()
+
+    def _indexReferences(self):
+        """
+        Builds the indexes from md5checksum to the ids of the References
+        and ReferenceSets in this backend, so that searches for checksums
+        need not scan every object. This must be called again whenever
+        the references change.
+        """
+        self._referenceSetMd5Index = collections.defaultdict(set)
+        self._referenceMd5Index = collections.defaultdict(set)
+        for referenceSetId, referenceSet in self._referenceSetIdMap.items():
+            self._referenceSetMd5Index[referenceSet.getMd5Checksum()].add(
+                referenceSetId)
+        for referenceId, reference in self._referenceIdMap.items():
+            self._referenceMd5Index[reference.getMd5Checksum()].add(
+                referenceId)
 
     def _getDatasetFromReadsRequest(self, request):
         if len(request.readGroupIds) != 1:
@@ -295,22 +847,9 @@ class AbstractBackend(object):
             reference = self._referenceIdMap[id_]
         except KeyError:
             raise exceptions.ObjectWithIdNotFoundException(id_)
-        start = 0
-        end = datamodel.PysamDatamodelMixin.fastaMax
-        if 'start' in requestArgs:
-            startString = requestArgs['start']
-            try:
-                start = int(startString)
-            except ValueError:
-                raise exceptions.BadRequestIntegerException(
-                    'start', startString)
-        if 'end' in requestArgs:
-            endString = requestArgs['end']
-            try:
-                end = int(endString)
-            except ValueError:
-                raise exceptions.BadRequestIntegerException(
-                    'end', endString)
+        start = _parseIntegerArgument(requestArgs, 'start', 0)
+        end = _parseIntegerArgument(
+            requestArgs, 'end', datamodel.PysamDatamodelMixin.fastaMax)
         if 'pageToken' in requestArgs:
             pageTokenStr = requestArgs['pageToken']
             start = _parsePageToken(pageTokenStr, 1)[0]
@@ -335,21 +874,65 @@ class AbstractBackend(object):
         response.nextPageToken = nextPageToken
         return response.toJsonString()
 
+    def getReadGroupCoverage(self, id_, requestArgs):
+        """
+        Returns a JSON string holding the mean read depth of the read group
+        with the specified id over the [start, end) interval of the
+        reference named in requestArgs, summarised into bins of binSize
+        bases. If binSize is not given, the smallest bin size that
+        results in no more than the maximum number of bins is used.
+        """
+        dataset = self._getDatasetFromCompoundId(id_)
+        try:
+            readGroup = dataset.getReadGroupIdMap()[id_]
+        except KeyError:
+            raise exceptions.ReadGroupNotFoundException(id_)
+        if 'referenceName' not in requestArgs:
+            raise exceptions.RequestArgumentMissingException('referenceName')
+        if 'end' not in requestArgs:
+            raise exceptions.RequestArgumentMissingException('end')
+        referenceName = requestArgs['referenceName']
+        start = _parseIntegerArgument(requestArgs, 'start', 0)
+        end = _parseIntegerArgument(requestArgs, 'end', None)
+        if start < 0 or start >= end:
+            raise exceptions.BadRangeException(start, end)
+        length = end - start
+        defaultBinSize = (
+            length + self._maxCoverageBins - 1) // self._maxCoverageBins
+        binSize = _parseIntegerArgument(
+            requestArgs, 'binSize', defaultBinSize)
+        if binSize <= 0 or length > binSize * self._maxCoverageBins:
+            raise exceptions.BadBinSizeException(
+                binSize, self._maxCoverageBins)
+        coverage = readGroup.getCoverage(referenceName, start, end, binSize)
+        response = {
+            "readGroupId": id_,
+            "referenceName": referenceName,
+            "start": start,
+            "end": end,
+            "binSize": binSize,
+            "coverage": coverage,
+        }
+        return json.dumps(response)
+
     def runGetRequest(self, idMap, id_):
         """
         Runs a get request by indexing into the provided idMap and
         returning a json string of that object
         """
-        try:
-            obj = idMap[id_]
-        except KeyError:
-            raise exceptions.ObjectWithIdNotFoundException(id_)
-        protocolElement = obj.toProtocolElement()
-        jsonString = protocolElement.toJsonString()
+        with metrics.registry.timer(metrics.CONTAINER_LOOKUP):
+            try:
+                obj = idMap[id_]
+            except KeyError:
+                raise exceptions.ObjectWithIdNotFoundException(id_)
+        with metrics.registry.timer(metrics.SERIALIZATION):
+            protocolElement = obj.toProtocolElement()
+            jsonString = protocolElement.toJsonString()
         return jsonString
 
     def runSearchRequest(
-            self, requestStr, requestClass, responseClass, objectGenerator):
+            self, requestStr, requestClass, responseClass, objectGenerator,
+            searchOptions=None):
         """
         Runs the specified request. The request is a string containing
         a JSON representation of an instance of the specified requestClass.
@@ -358,30 +941,123 @@ class AbstractBackend(object):
         using the specified object generator, which must return
         (object, nextPageToken) pairs, and be able to resume iteration from
         any point using the nextPageToken attribute of the request object.
+        Any searchOptions the object generator uses must also be given, so
+        that they are part of the keys of cached pages.
         """
         self.startProfile()
-        try:
-            requestDict = json.loads(requestStr)
-        except ValueError:
-            raise exceptions.InvalidJsonException(requestStr)
-        self.validateRequest(requestDict, requestClass)
+        with metrics.registry.timer(metrics.JSON_PARSE):
+            try:
+                requestDict = json.loads(requestStr)
+            except ValueError:
+                raise exceptions.InvalidJsonException(requestStr)
+        with metrics.registry.timer(metrics.VALIDATION):
+            self.validateRequest(requestDict, requestClass)
+        start = time.time()
         request = requestClass.fromJsonDict(requestDict)
+        metrics.registry.addTime(metrics.JSON_PARSE, time.time() - start, 0)
         if request.pageSize is None:
             request.pageSize = self._defaultPageSize
         if request.pageSize <= 0:
             raise exceptions.BadPageSizeException(request.pageSize)
+        prefetch = requestClass in self._prefetchRequestClasses
+        pageKey = (
+            _getRequestKey(request, request.pageToken, searchOptions),
+            request.pageSize)
+        page = None
+        if self._searchPageCache.isEnabled():
+            dataVersion = self.getDataVersion()
+            page = self._searchPageCache.get(pageKey, dataVersion)
+        if page is None:
+            if prefetch and request.pageToken is not None:
+                page = self._pagePrefetcher.take(pageKey)
+            if page is None and self._singleFlight is not None:
+                # pages shared between processes come back as lists
+                page = tuple(self._singleFlight.run(
+                    pageKey, lambda: self._runSearchPage(
+                        request, responseClass, objectGenerator,
+                        searchOptions)))
+            elif page is None:
+                page = self._runSearchPage(
+                    request, responseClass, objectGenerator, searchOptions)
+            if self._searchPageCache.isEnabled():
+                self._searchPageCache.put(pageKey, dataVersion, page)
+        responseString, nextPageToken = page
+        if prefetch and nextPageToken is not None:
+            self._prefetchPage(
+                request, nextPageToken, responseClass, objectGenerator,
+                searchOptions)
+        self.endProfile()
+        return responseString
+
+    def getDataVersion(self):
+        """
+        Returns a value that changes whenever the data served by this
+        backend changes, which is used to invalidate cached search pages.
+        """
+        return None
+
+    def getSearchPageCacheStatistics(self):
+        """
+        Returns a dictionary of statistics for the search page cache.
+        """
+        return self._searchPageCache.getStatistics()
+
+    def _runSearchPage(
+            self, request, responseClass, objectGenerator,
+            searchOptions=None):
+        """
+        Returns the (responseString, nextPageToken) pair for the page of
+        results of the specified request.
+        """
+        fields = None
+        if searchOptions is not None:
+            fields = searchOptions.get("fields")
+        valueValidator = self.getResponseValueValidator(responseClass)
         responseBuilder = protocol.SearchResponseBuilder(
-            responseClass, request.pageSize, self._maxResponseLength)
+            responseClass, request.pageSize, self._maxResponseLength,
+            valueValidator, fields)
         nextPageToken = None
-        for obj, nextPageToken in objectGenerator(request):
+        with metrics.registry.timer(metrics.CONTAINER_LOOKUP):
+            iterator = objectGenerator(request)
+        # Values are timed individually, as the time spent fetching
+        # them between calls to addValue is timed by the datamodel.
+        serializationTime = 0.0
+        for obj, nextPageToken in iterator:
+            start = time.time()
             responseBuilder.addValue(obj)
+            serializationTime += time.time() - start
             if responseBuilder.isFull():
                 break
+        if nextPageToken is not None and isinstance(
+                iterator, IntervalIterator):
+            self._parkCursor(request, nextPageToken, iterator)
         responseBuilder.setNextPageToken(nextPageToken)
-        responseString = responseBuilder.getJsonString()
-        self.validateResponse(responseString, responseClass)
-        self.endProfile()
-        return responseString
+        if valueValidator is not None:
+            self.validateResponseEnvelope(responseClass, nextPageToken)
+        with metrics.registry.timer(metrics.SERIALIZATION):
+            jsonString = responseBuilder.getJsonString()
+        metrics.registry.addTime(metrics.SERIALIZATION, serializationTime, 0)
+        metrics.registry.increment(
+            metrics.RECORDS_RETURNED, responseBuilder.getNumValues())
+        return jsonString, nextPageToken
+
+    def _prefetchPage(
+            self, request, nextPageToken, responseClass, objectGenerator,
+            searchOptions=None):
+        """
+        Starts computing the page following the specified request in the
+        background, so that it is ready when the client asks for it.
+        """
+        nextRequest = type(request).fromJsonDict(request.toJsonDict())
+        nextRequest.pageToken = nextPageToken
+
+        def computePage():
+            return self._runSearchPage(
+                nextRequest, responseClass, objectGenerator, searchOptions)
+        self._pagePrefetcher.prefetch(
+            (_getRequestKey(nextRequest, nextPageToken, searchOptions),
+             request.pageSize),
+            computePage)
 
     def searchReadGroupSets(self, request):
         """
@@ -393,15 +1069,25 @@ class AbstractBackend(object):
             protocol.SearchReadGroupSetsResponse,
             self.readGroupSetsGenerator)
 
-    def searchReads(self, request):
+    def searchReads(self, request, requestArgs=None):
         """
         Returns a GASearchReadsResponse for the specified
-        GASearchReadsRequest object.
-        """
+        GASearchReadsRequest object. If the requestArgs include a comma
+        separated list of fields, only those fields of the reads are
+        returned.
+        """
+        if requestArgs is None:
+            requestArgs = {}
+        searchOptions = {}
+        fields = _parseFieldsArgument(requestArgs, protocol.ReadAlignment)
+        if fields is not None:
+            searchOptions["fields"] = fields
         return self.runSearchRequest(
             request, protocol.SearchReadsRequest,
             protocol.SearchReadsResponse,
-            self.readsGenerator)
+            functools.partial(
+                self.readsGenerator, searchOptions=searchOptions),
+            searchOptions)
 
     def searchReferenceSets(self, request):
         """
@@ -440,15 +1126,31 @@ class AbstractBackend(object):
             protocol.SearchVariantSetsResponse,
             self.variantSetsGenerator)
 
-    def searchVariants(self, request):
+    def searchVariants(self, request, requestArgs=None):
         """
         Returns a GASearchVariantsResponse for the specified
-        GASearchVariantsRequest object.
-        """
+        GASearchVariantsRequest object. If the requestArgs include a
+        filter, only the variants that pass it are returned; see
+        VariantFilter for its syntax. If they include a comma separated
+        list of fields, only those fields of the variants are returned.
+        """
+        if requestArgs is None:
+            requestArgs = {}
+        searchOptions = {}
+        if "filter" in requestArgs:
+            # Parse the filter now so that bad expressions are reported
+            # before any search is done.
+            variants.VariantFilter(requestArgs["filter"])
+            searchOptions["filter"] = requestArgs["filter"]
+        fields = _parseFieldsArgument(requestArgs, protocol.Variant)
+        if fields is not None:
+            searchOptions["fields"] = fields
         return self.runSearchRequest(
             request, protocol.SearchVariantsRequest,
             protocol.SearchVariantsResponse,
-            self.variantsGenerator)
+            functools.partial(
+                self.variantsGenerator, searchOptions=searchOptions),
+            searchOptions)
 
     def searchCallSets(self, request):
         """
@@ -507,21 +1209,86 @@ class AbstractBackend(object):
             request, dataset.getReadGroupSetIdMap(),
             dataset.getReadGroupSetIds())
 
+    def _filterIds(self, idList, idSets):
+        """
+        Returns the sorted ids in the intersection of the specified sets
+        of ids, or idList if no sets are specified.
+        """
+        if len(idSets) == 0:
+            return idList
+        return sorted(set.intersection(*idSets))
+
+    def _scanIds(self, idMap, predicate):
+        """
+        Returns the set of ids of the objects in the specified map for
+        which the specified predicate is True. None of the references we
+        load have accessions or assemblyIds, so searches for them are
+        rare enough to be answered by scanning rather than from indexes.
+        """
+        return set(
+            id_ for id_, obj in idMap.items() if predicate(obj))
+
+    def _lookupIds(self, index, keys):
+        """
+        Returns the set of ids associated with any of the specified keys
+        in the specified index.
+        """
+        ids = set()
+        for key in keys:
+            ids.update(index.get(key, ()))
+        return ids
+
     def referenceSetsGenerator(self, request):
         """
         Returns a generator over the (referenceSet, nextPageToken) pairs
         defined by the specified request.
         """
+        idSets = []
+        if len(request.md5checksums) > 0:
+            idSets.append(self._lookupIds(
+                self._referenceSetMd5Index, request.md5checksums))
+        if len(request.accessions) > 0:
+            accessions = set(request.accessions)
+            idSets.append(self._scanIds(
+                self._referenceSetIdMap,
+                lambda referenceSet: not accessions.isdisjoint(
+                    referenceSet.getSourceAccessions())))
+        if request.assemblyId is not None:
+            # The protocol asks for assemblyIds that contain the requested
+            # string.
+            idSets.append(self._scanIds(
+                self._referenceSetIdMap,
+                lambda referenceSet: request.assemblyId in (
+                    referenceSet.getAssemblyId() or "")))
+        referenceSetIds = self._filterIds(self._referenceSetIds, idSets)
         return self._topLevelObjectGenerator(
-            request, self._referenceSetIdMap, self._referenceSetIds)
+            request, self._referenceSetIdMap, referenceSetIds)
 
     def referencesGenerator(self, request):
         """
         Returns a generator over the (reference, nextPageToken) pairs
         defined by the specified request.
         """
+        idSets = []
+        if request.referenceSetId is not None:
+            try:
+                referenceSet = self._referenceSetIdMap[request.referenceSetId]
+            except KeyError:
+                raise exceptions.ReferenceSetNotFoundException(
+                    request.referenceSetId)
+            idSets.append(set(referenceSet.getReferenceIds()))
+        if len(request.md5checksums) > 0:
+            idSets.append(self._lookupIds(
+                self._referenceMd5Index, request.md5checksums))
+        if len(request.accessions) > 0:
+            accessions = set(request.accessions)
+            idSets.append(self._scanIds(
+                self._referenceIdMap,
+                lambda reference: not accessions.isdisjoint(
+                    reference.getSourceAccessions())))
+        referenceIds = self._filterIds(self._referenceIds, idSets)
         return self._topLevelObjectGenerator(
-            request, self._referenceIdMap, self._referenceIds)
+            request, self._referenceIdMap, referenceIds)
 
     def variantSetsGenerator(self, request):
         """
@@ -533,26 +1300,63 @@ class AbstractBackend(object):
             request, dataset.getVariantSetIdMap(),
             dataset.getVariantSetIds())
 
-    def readsGenerator(self, request):
+    def readsGenerator(self, request, searchOptions=None):
         """
         Returns a generator over the (read, nextPageToken) pairs defined
-        by the specified request
+        by the specified request and search options.
         """
         dataset = self._getDatasetFromReadsRequest(request)
-        intervalIterator = ReadsIntervalIterator(
-            request, dataset.getReadGroupIdMap())
-        return intervalIterator
+        iteratorClass = functools.partial(
+            ReadsIntervalIterator, referenceIdMap=self._referenceIdMap)
+        return self._getIntervalIterator(
+            iteratorClass, request, dataset.getReadGroupIdMap(),
+            searchOptions)
 
-    def variantsGenerator(self, request):
+    def variantsGenerator(self, request, searchOptions=None):
         """
         Returns a generator over the (variant, nextPageToken) pairs defined
-        by the specified request.
+        by the specified request and search options.
         """
         dataset = self._getDatasetFromVariantsRequest(request)
-        intervalIterator = VariantsIntervalIterator(
-            request, dataset.getVariantSetIdMap())
+        return self._getIntervalIterator(
+            VariantsIntervalIterator, request, dataset.getVariantSetIdMap(),
+            searchOptions)
+
+    def _getIntervalIterator(
+            self, iteratorClass, request, containerIdMap, searchOptions=None):
+        """
+        Returns an instance of the specified IntervalIterator subclass for
+        the specified request, continuing the iterator parked at the end
+        of the previous page if there is one.
+        """
+        intervalIterator = None
+        if self._cursorCache.isEnabled() and request.pageToken is not None:
+            intervalIterator = self._cursorCache.take(_getRequestKey(
+                request, request.pageToken, searchOptions))
+        if intervalIterator is None:
+            # Iterators that outlive the request, or that are run in the
+            # prefetcher's threads alongside the requests, read from their
+            # own copies of the file handles, which are otherwise shared.
+            reopen = (
+                self._cursorCache.isEnabled() or
+                type(request) in self._prefetchRequestClasses)
+            intervalIterator = iteratorClass(
+                request, containerIdMap, reopen=reopen,
+                searchOptions=searchOptions)
         return intervalIterator
 
+    def _parkCursor(self, request, nextPageToken, intervalIterator):
+        """
+        Keeps the specified interval iterator, which has stopped at the
+        specified nextPageToken, for the request for the next page.
+        """
+        if self._cursorCache.isEnabled():
+            self._cursorCache.park(
+                _getRequestKey(
+                    request, nextPageToken,
+                    intervalIterator.getSearchOptions()),
+                intervalIterator)
+
     def callSetsGenerator(self, request):
         """
         Returns a generator over the (callSet, nextPageToken) pairs defined
@@ -587,20 +1391,48 @@ class AbstractBackend(object):
         Throws an error if the data is invalid
         """
         if self._requestValidation:
-            if not requestClass.validate(jsonDict):
+            validator = avrotools.Validator(requestClass)
+            if not validator.isValid(jsonDict):
                 raise exceptions.RequestValidationFailureException(
                     jsonDict, requestClass)
 
-    def validateResponse(self, jsonString, responseClass):
-        """
-        Ensures the jsonDict corresponds to a valid instance of responseClass
-        Throws an error if the data is invalid
-        """
-        if self._responseValidation:
-            jsonDict = json.loads(jsonString)
-            if not responseClass.validate(jsonDict):
+    def validateResponseEnvelope(self, responseClass, nextPageToken):
+        """
+        Ensures that a page of the specified responseClass with the
+        specified nextPageToken is valid, apart from its values, which
+        are checked by the validator from getResponseValueValidator.
+        Throws an error if it is invalid.
+        """
+        envelope = responseClass()
+        envelope.nextPageToken = nextPageToken
+        if not avrotools.Validator(responseClass).isValid(envelope):
+            raise exceptions.ResponseValidationFailureException(
+                envelope.toJsonDict(), responseClass)
+
+    def getResponseValueValidator(self, responseClass):
+        """
+        Returns a function that validates each value added to a page of
+        the specified responseClass, raising an error if it is invalid,
+        or None if this response should not be validated. Values are
+        checked as ProtocolElements before they are serialised, so the
+        response does not need to be parsed again. Only the configured
+        fraction of responses is validated.
+        """
+        if not self._responseValidation:
+            return None
+        sampleRate = self._responseValidationSampleRate
+        if sampleRate < 1:
+            if self._responseValidationRandom.random() >= sampleRate:
+                return None
+        valueClass = responseClass.getEmbeddedType(
+            responseClass.getValueListName())
+        validator = avrotools.Validator(valueClass)
+
+        def validateValue(protocolElement):
+            if not validator.isValid(protocolElement):
                 raise exceptions.ResponseValidationFailureException(
-                    jsonDict, responseClass)
+                    protocolElement.toJsonDict(), valueClass)
+        return validateValue
 
     def setRequestValidation(self, requestValidation):
         """
@@ -614,6 +1446,69 @@ class AbstractBackend(object):
         """
         self._responseValidation = responseValidation
 
+    def setResponseValidationSampleRate(self, sampleRate):
+        """
+        Sets the fraction of search responses that are validated when
+        response validation is enabled.
+        """
+        self._responseValidationSampleRate = sampleRate
+
+    def setCursorCacheSize(self, cursorCacheSize):
+        """
+        Sets the maximum number of search iterators kept between pages.
+        A size of zero disables keeping them.
+        """
+        self._cursorCache.setMaxSize(cursorCacheSize)
+
+    def setCursorCacheTimeout(self, cursorCacheTimeout):
+        """
+        Sets the number of seconds for which a search iterator is kept
+        for the request for the next page.
+        """
+        self._cursorCache.setTimeout(cursorCacheTimeout)
+
+    def setPrefetchEndpoints(self, endpointNames):
+        """
+        Sets the search endpoints, named as in their URLs (e.g. "reads"
+        for /reads/search), for which the page following each response
+        is computed in the background.
+        """
+        requestClasses = {}
+        for url, requestClass, _ in protocol.postMethods:
+            requestClasses[url.split("/")[1]] = requestClass
+        prefetchRequestClasses = set()
+        for endpointName in endpointNames:
+            if endpointName not in requestClasses:
+                raise exceptions.ConfigurationException(
+                    "Unknown search endpoint '{}'".format(endpointName))
+            prefetchRequestClasses.add(requestClasses[endpointName])
+        self._prefetchRequestClasses = prefetchRequestClasses
+
+    def setPrefetchMemoryBudget(self, prefetchMemoryBudget):
+        """
+        Sets the maximum total length in bytes of the prefetched pages
+        that are held.
+        """
+        self._pagePrefetcher.setMemoryBudget(prefetchMemoryBudget)
+
+    def setSearchPageCacheSize(self, searchPageCacheSize):
+        """
+        Sets the maximum total length in bytes of the search response
+        pages that are cached. A size of zero disables the cache.
+        """
+        self._searchPageCache.setMaxSize(searchPageCacheSize)
+
+    def setSingleFlight(self, singleFlight, lockDirectory=None):
+        """
+        Enables or disables collapsing identical concurrent search
+        requests into a single computation. If a lock directory is given,
+        requests are also collapsed between the server processes on this
+        host that share it.
+        """
+        self._singleFlight = None
+        if singleFlight:
+            self._singleFlight = SingleFlight(lockDirectory)
+
     def setDefaultPageSize(self, defaultPageSize):
         """
         Sets the default page size for request to the specified value.
@@ -627,6 +1522,33 @@ class AbstractBackend(object):
         """
         self._maxResponseLength = maxResponseLength
 
+    def setReferenceBasesCache(self, referenceBasesCache):
+        """
+        Enables or disables serving reference bases from memory mapped,
+        uncompressed copies of the reference sequences.
+        """
+        for referenceSet in self.getReferenceSets():
+            referenceSet.setBasesCache(referenceBasesCache)
+
+    def setMaxCoverageBins(self, maxCoverageBins):
+        """
+        Sets the maximum number of bins returned by a single read group
+        coverage request to the specified value.
+        """
+        self._maxCoverageBins = maxCoverageBins
+
+    def setReadFilter(self, excludedFlags, minMappingQuality):
+        """
+        Sets the filter applied by every read group to the reads it
+        returns: reads with any of the SAM flags in excludedFlags set, or
+        with a mapping quality below minMappingQuality, are skipped.
+        """
+        for datasetId in self.getDatasetIds():
+            dataset = self.getDataset(datasetId)
+            for readGroupSet in dataset.getReadGroupSets():
+                for readGroup in readGroupSet.getReadGroups():
+                    readGroup.setReadFilter(excludedFlags, minMappingQuality)
+
 
 class EmptyBackend(AbstractBackend):
     """
@@ -640,16 +1562,19 @@ class SimulatedBackend(AbstractBackend):
     """
     def __init__(self, randomSeed=0, numCalls=1, variantDensity=0.5,
                  numVariantSets=1, numReferenceSets=1,
-                 numReferencesPerReferenceSet=1, numAlignments=2):
+                 numReferencesPerReferenceSet=1, numAlignments=2,
+                 readLength=100, numIndels=0, numTags=0):
         super(SimulatedBackend, self).__init__()
 
         # Datasets
         dataset1 = datasets.SimulatedDataset(
             "simulatedDataset1", randomSeed, numCalls,
-            variantDensity, numVariantSets, numAlignments)
+            variantDensity, numVariantSets, numAlignments, readLength,
+            numIndels, numTags)
         dataset2 = datasets.SimulatedDataset(
             "simulatedDataset2", randomSeed, numCalls,
-            variantDensity, numVariantSets, numAlignments)
+            variantDensity, numVariantSets, numAlignments, readLength,
+            numIndels, numTags)
         self._datasetIdMap[dataset1.getId()] = dataset1
         self._datasetIdMap[dataset2.getId()] = dataset2
         self._datasetIds = sorted(self._datasetIdMap.keys())
@@ -669,15 +1594,22 @@ class SimulatedBackend(AbstractBackend):
                 self._referenceIdMap[referenceId] = reference
         self._referenceSetIds = sorted(self._referenceSetIdMap.keys())
         self._referenceIds = sorted(self._referenceIdMap.keys())
+        self._indexReferences()
 
 
 class FileSystemBackend(AbstractBackend):
     """
     A GA4GH backend backed by data on the file system
     """
+    # The number of seconds between the scans of the data directory that
+    # update the data version
+    dataVersionInterval = 5
+
     def __init__(self, dataDir):
         super(FileSystemBackend, self).__init__()
         self._dataDir = dataDir
+        self._dataVersion = None
+        self._dataVersionLock = threading.Lock()
         # TODO this code is very ugly and should be regarded as a temporary
         # stop-gap until we deal with iterating over the data tree properly.
 
@@ -695,6 +1627,7 @@ class FileSystemBackend(AbstractBackend):
                     self._referenceIdMap[referenceId] = reference
         self._referenceSetIds = sorted(self._referenceSetIdMap.keys())
         self._referenceIds = sorted(self._referenceIdMap.keys())
+        self._indexReferences()
 
         # Datasets
         datasetDirs = [
@@ -706,3 +1639,33 @@ class FileSystemBackend(AbstractBackend):
             dataset = datasets.FileSystemDataset(datasetDir)
             self._datasetIdMap[dataset.getId()] = dataset
         self._datasetIds = sorted(self._datasetIdMap.keys())
+
+    def getDataVersion(self):
+        # The latest modification time of the files and directories in the
+        # data directory. Scanning a large data directory is slow, so after
+        # the first call the version is updated by a background thread
+        # rather than on the threads answering requests.
+        with self._dataVersionLock:
+            if self._dataVersion is None:
+                self._dataVersion = self._scanDataVersion()
+                thread = threading.Thread(target=self._refreshDataVersion)
+                thread.daemon = True
+                thread.start()
+        return self._dataVersion
+
+    def _refreshDataVersion(self):
+        while True:
+            time.sleep(self.dataVersionInterval)
+            self._dataVersion = self._scanDataVersion()
+
+    def _scanDataVersion(self):
+        dataVersion = os.path.getmtime(self._dataDir)
+        for dirPath, dirNames, fileNames in os.walk(self._dataDir):
+            for name in dirNames + fileNames:
+                path = os.path.join(dirPath, name)
+                try:
+                    dataVersion = max(dataVersion, os.path.getmtime(path))
+                except OSError:
+                    # The file was removed while we were scanning
+                    pass
+        return dataVersion
@@ -7,7 +7,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
+import json
+import math
 import time
+import bisect
+import random
+import threading
+import fnmatch
 import argparse
 import logging
 import unittest
@@ -16,10 +23,10 @@ import unittest.suite
 
 import ga4gh.client as client
 import ga4gh.protocol as protocol
-import ga4gh.converters as converters
-import ga4gh.frontend as frontend
-import ga4gh.configtest as configtest
 
+# The server programs import the modules they need when they run, as
+# Flask, oic and pysam dominate startup time for the client programs,
+# which are often run many times from scripts.
 
 # the maximum value of a long type in avro = 2**63 - 1
 # (64 bit signed integer)
@@ -181,6 +188,7 @@ def ga2vcf_main(parser=None):
 
 
 def ga2vcf_run(args):
+    import ga4gh.converters as converters
     # The factory expects a variantSetIds value rather than a single variant
     # set, so we add this in by hand.
     args.variantSetIds = args.variantSetId
@@ -216,6 +224,7 @@ def ga2sam_main(parser=None):
 
 
 def ga2sam_run(args):
+    import ga4gh.converters as converters
     # instantiate params
     searchReadsRequest = RequestFactory(
         args).createSearchReadsRequest()
@@ -264,6 +273,7 @@ def server_main(parser=None):
             description="GA4GH reference server")
     addGlobalOptions(parser)
     args = parser.parse_args()
+    import ga4gh.frontend as frontend
     frontend.configure(args.config_file, args.config, args.port)
     sslContext = None
     if args.tls or ("OIDC_PROVIDER" in frontend.app.config):
@@ -273,6 +283,107 @@ def server_main(parser=None):
         use_reloader=not args.dont_use_reloader, ssl_context=sslContext)
 
 
+##############################################################################
+# Coverage
+##############################################################################
+
+
+def coverage_main(parser=None):
+    if parser is None:
+        parser = argparse.ArgumentParser(
+            description=(
+                "GA4GH coverage tile builder. Precomputes multi-resolution "
+                "read depth summaries for BAM files and stores them in a "
+                "sidecar file next to each, from which the server answers "
+                "zoomed-out coverage queries."))
+    parser.add_argument(
+        "paths", nargs="+",
+        help="BAM files, or directories to search for BAM files")
+    parser.add_argument(
+        "--tileSizes", default=None,
+        help=(
+            "Comma separated list of tile sizes for the levels of the "
+            "summary. Each must be a multiple of the smallest."))
+    parser.add_argument(
+        "--force", default=False, action="store_true",
+        help="Rebuild sidecar files even if they are up to date")
+    args = parser.parse_args()
+    if "paths" not in args:
+        parser.print_help()
+    else:
+        coverage_run(args)
+
+
+def findDataFiles(paths, pattern):
+    """
+    Returns the sorted list of the specified file paths, along with the
+    files matching the specified pattern in the specified directories
+    and their subdirectories.
+    """
+    filePaths = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirPath, _, fileNames in os.walk(path):
+                for fileName in fnmatch.filter(fileNames, pattern):
+                    filePaths.append(os.path.join(dirPath, fileName))
+        else:
+            filePaths.append(path)
+    return sorted(filePaths)
+
+
+def coverage_run(args):
+    import ga4gh.datamodel.reads as reads
+    tileSizes = None
+    if args.tileSizes is not None:
+        tileSizes = [int(tileSize) for tileSize in args.tileSizes.split(",")]
+    for samFilePath in findDataFiles(args.paths, "*.bam"):
+        if not args.force and reads.CoverageTiles.isUpToDate(samFilePath):
+            print("Up to date:", samFilePath)
+        else:
+            print("Building:", samFilePath)
+            reads.CoverageTiles.build(samFilePath, tileSizes)
+
+
+##############################################################################
+# Reference cache
+##############################################################################
+
+
+def reference_cache_main(parser=None):
+    if parser is None:
+        parser = argparse.ArgumentParser(
+            description=(
+                "GA4GH reference cache builder. Writes the MD5 checksum and "
+                "an uncompressed copy of the sequence of each FASTA file "
+                "next to it. The server reads the checksum rather than "
+                "computing it when it starts, and serves reference bases "
+                "from the copy when REFERENCE_BASES_CACHE is set."))
+    parser.add_argument(
+        "paths", nargs="+",
+        help="FASTA files, or directories to search for FASTA files")
+    parser.add_argument(
+        "--force", default=False, action="store_true",
+        help="Rebuild the files even if they are up to date")
+    args = parser.parse_args()
+    if "paths" not in args:
+        parser.print_help()
+    else:
+        reference_cache_run(args)
+
+
+def reference_cache_run(args):
+    import ga4gh.datamodel.references as references
+    for fastaFilePath in findDataFiles(args.paths, "*.fa.gz"):
+        reference = references.HtslibReference(fastaFilePath, fastaFilePath)
+        if (not args.force and reference.isBasesCacheUpToDate() and
+                reference.isMd5ChecksumUpToDate()):
+            print("Up to date:", fastaFilePath)
+        else:
+            print("Building:", fastaFilePath)
+            reference.writeMd5Checksum()
+            reference.writeBasesCache()
+
+
 ##############################################################################
 # Client
 ##############################################################################
@@ -377,6 +488,10 @@ class SearchVariantsRunner(AbstractSearchRunner):
         else:
             setCommaSeparatedAttribute(request, args, 'variantSetIds')
         self._setRequest(request, args)
+        self._variantFilter = args.filter
+
+    def _searchVariants(self, request):
+        return self._httpClient.searchVariants(request, self._variantFilter)
 
     def run(self):
         # TODO this is a hack until we make a nicer interface to deal with
@@ -387,9 +502,9 @@ class SearchVariantsRunner(AbstractSearchRunner):
         for variantSetId in variantSetIds:
             request.variantSetIds = [variantSetId]
             if self._minimalOutput:
-                self._run(self._httpClient.searchVariants, 'id')
+                self._run(self._searchVariants, 'id')
             else:
-                results = self._httpClient.searchVariants(self._request)
+                results = self._searchVariants(self._request)
                 for result in results:
                     self.printVariant(result)
 
@@ -552,7 +667,7 @@ class BenchmarkRunner(SearchVariantsRunner):
         beforeCpu = time.clock()
         beforeWall = time.time()
         try:
-            for variant in self._httpClient.searchVariants(self._request):
+            for variant in self._searchVariants(self._request):
                 numVariants += 1
         except KeyboardInterrupt:
             pass
@@ -567,6 +682,408 @@ class BenchmarkRunner(SearchVariantsRunner):
         print(s)
 
 
+LOAD_TEST_REQUEST_TYPES = [
+    "variants", "reads", "bases", "variantsets", "callsets",
+    "readgroupsets", "references", "referencesets", "datasets"]
+
+# The upper bounds, in milliseconds, of the buckets of latency histograms.
+# A last bucket holds the latencies above the largest bound.
+LATENCY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+def parseRequestMix(mixString):
+    """
+    Parses a comma separated list of type=weight pairs giving the
+    relative frequencies of the types of request in a load test, and
+    returns a list of (requestType, weight) pairs.
+    """
+    requestMix = []
+    for entry in mixString.split(","):
+        requestType, _, weight = entry.partition("=")
+        if requestType not in LOAD_TEST_REQUEST_TYPES:
+            raise ValueError("Unknown request type '{}'".format(requestType))
+        weight = float(weight) if weight != "" else 1
+        if weight < 0:
+            raise ValueError("Negative weight for '{}'".format(requestType))
+        requestMix.append((requestType, weight))
+    return requestMix
+
+
+def parseContigs(contigsString):
+    """
+    Parses a comma separated list of name:length pairs and returns a list
+    of (name, length) pairs.
+    """
+    contigs = []
+    for entry in contigsString.split(","):
+        name, _, length = entry.rpartition(":")
+        contigs.append((name, int(length)))
+    return contigs
+
+
+class WeightedChoice(object):
+    """
+    Chooses from a list of (value, weight) pairs with probabilities in
+    proportion to the weights.
+    """
+    def __init__(self, weightedValues):
+        self._values = []
+        self._cumulativeWeights = []
+        totalWeight = 0
+        for value, weight in weightedValues:
+            if weight > 0:
+                totalWeight += weight
+                self._values.append(value)
+                self._cumulativeWeights.append(totalWeight)
+        if len(self._values) == 0:
+            raise ValueError("Nothing to choose from")
+
+    def choose(self, randomGenerator):
+        point = randomGenerator.random() * self._cumulativeWeights[-1]
+        index = bisect.bisect_right(self._cumulativeWeights, point)
+        return self._values[min(index, len(self._values) - 1)]
+
+
+def getPercentile(values, fraction):
+    """
+    Returns the specified percentile, as a fraction, of the values using
+    the nearest rank method.
+    """
+    ordered = sorted(values)
+    rank = int(math.ceil(fraction * len(ordered)))
+    return ordered[max(rank - 1, 0)]
+
+
+def getLatencyHistogram(latencies):
+    """
+    Returns the number of the specified latencies, in seconds, that fall
+    into each of the LATENCY_BUCKETS, plus the number above the last one.
+    """
+    counts = [0] * (len(LATENCY_BUCKETS) + 1)
+    for latency in latencies:
+        counts[bisect.bisect_left(LATENCY_BUCKETS, latency * 1000)] += 1
+    return counts
+
+
+def summariseLatencies(latencies):
+    """
+    Returns a dictionary of the percentiles, in seconds, of the specified
+    latencies.
+    """
+    if len(latencies) == 0:
+        return {"p50": 0, "p90": 0, "p99": 0, "max": 0}
+    return {
+        "p50": getPercentile(latencies, 0.5),
+        "p90": getPercentile(latencies, 0.9),
+        "p99": getPercentile(latencies, 0.99),
+        "max": max(latencies),
+    }
+
+
+class LoadTestRunner(AbstractQueryRunner):
+    """
+    Runner class for load testing a server. For each of the numbers of
+    concurrent clients in turn, each client sends requests drawn from a
+    weighted mix of request types for a fixed time, one after another.
+    Searches over regions use regions drawn from the contigs in proportion
+    to their lengths; reads are searched on the server's reference of the
+    same name as the contig, so only the contigs the server has a
+    reference for are used for reads. Each request is for a single page,
+    and its response is not parsed, so the latencies are those of the
+    server. The throughput, latency percentiles of the successful
+    requests, a histogram of those latencies and the number of failed
+    requests are reported for each number of clients, so that the point
+    at which the server saturates can be seen.
+    """
+    def __init__(self, args):
+        super(LoadTestRunner, self).__init__(args)
+        self._baseUrl = args.baseUrl
+        self._requestMix = parseRequestMix(args.mix)
+        self._clientCounts = [int(count) for count in args.clients.split(",")]
+        self._duration = args.duration
+        self._regionSize = args.regionSize
+        self._pageSize = args.pageSize
+        self._searchParams = {"reads": {}, "variants": {}}
+        if args.readFields is not None:
+            self._searchParams["reads"]["fields"] = args.readFields
+        if args.variantFields is not None:
+            self._searchParams["variants"]["fields"] = args.variantFields
+        self._seed = args.seed
+        self._outputFile = args.output
+        self._contigs = None
+        if args.contigs is not None:
+            self._contigs = parseContigs(args.contigs)
+
+    def _discover(self):
+        """
+        Finds the ids of the containers on the server that the requests
+        search in.
+        """
+        httpClient = self._httpClient
+        self._datasetIds = [
+            dataset.id for dataset in httpClient.searchDatasets(
+                protocol.SearchDatasetsRequest())]
+        self._variantSetIds = []
+        self._readGroupIds = []
+        # The server searches a single dataset at a time
+        for datasetId in self._datasetIds:
+            request = protocol.SearchVariantSetsRequest()
+            request.datasetIds = [datasetId]
+            self._variantSetIds.extend(
+                variantSet.id
+                for variantSet in httpClient.searchVariantSets(request))
+            request = protocol.SearchReadGroupSetsRequest()
+            request.datasetIds = [datasetId]
+            self._readGroupIds.extend(
+                readGroup.id
+                for readGroupSet in httpClient.searchReadGroupSets(request)
+                for readGroup in readGroupSet.readGroups)
+        self._referenceSetIds = [
+            referenceSet.id for referenceSet in httpClient.searchReferenceSets(
+                protocol.SearchReferenceSetsRequest())]
+        references = list(httpClient.searchReferences(
+            protocol.SearchReferencesRequest()))
+        self._references = [
+            (reference.id, reference.length) for reference in references]
+        self._referenceIdsByName = dict(
+            (reference.name, reference.id) for reference in references)
+        if self._contigs is None:
+            self._contigs = [
+                (reference.name, reference.length)
+                for reference in references]
+        self._readsContigs = [
+            contig for contig in self._contigs
+            if contig[0] in self._referenceIdsByName]
+
+    def _getRequestChoice(self):
+        """
+        Returns a WeightedChoice of the request types in the mix, leaving
+        out those that need data that the server does not have.
+        """
+        needs = {
+            "variants": self._variantSetIds and self._contigs,
+            "reads": self._readGroupIds and self._readsContigs,
+            "bases": self._references,
+            "variantsets": self._datasetIds,
+            "callsets": self._variantSetIds,
+            "readgroupsets": self._datasetIds,
+        }
+        requestMix = []
+        for requestType, weight in self._requestMix:
+            if needs.get(requestType, True):
+                requestMix.append((requestType, weight))
+            else:
+                print("Not running {} requests: no data found".format(
+                    requestType))
+        return WeightedChoice(requestMix)
+
+    def _getRegion(self, randomGenerator, contigChoice):
+        """
+        Returns a (contigName, start, end) tuple for a region drawn from
+        the specified WeightedChoice of contigs.
+        """
+        name, length = contigChoice.choose(randomGenerator)
+        start = randomGenerator.randint(0, max(length - self._regionSize, 0))
+        return name, start, min(start + self._regionSize, length)
+
+    def _searchRequest(self, requestClass, **fields):
+        request = requestClass()
+        request.pageSize = self._pageSize
+        for name, value in fields.items():
+            setattr(request, name, value)
+        return request.toJsonString()
+
+    def _sendRequest(self, httpClient, randomGenerator, requestType):
+        """
+        Sends a request of the specified type and returns the number of
+        bytes in the response.
+        """
+        choice = randomGenerator.choice
+        if requestType == "bases":
+            referenceId, length = choice(self._references)
+            start = randomGenerator.randint(
+                0, max(length - self._regionSize, 0))
+            end = min(start + self._regionSize, length)
+            response = httpClient.doRawRequest(
+                'GET', "references/{}/bases".format(referenceId),
+                httpParams={"start": start, "end": end})
+            return len(response)
+        if requestType == "variants":
+            referenceName, start, end = self._getRegion(
+                randomGenerator, self._contigChoice)
+            data = self._searchRequest(
+                protocol.SearchVariantsRequest,
+                variantSetIds=[choice(self._variantSetIds)],
+                referenceName=referenceName, start=start, end=end)
+        elif requestType == "reads":
+            referenceName, start, end = self._getRegion(
+                randomGenerator, self._readsContigChoice)
+            data = self._searchRequest(
+                protocol.SearchReadsRequest,
+                readGroupIds=[choice(self._readGroupIds)],
+                referenceId=self._referenceIdsByName[referenceName],
+                start=start, end=end)
+        elif requestType == "variantsets":
+            data = self._searchRequest(
+                protocol.SearchVariantSetsRequest,
+                datasetIds=[choice(self._datasetIds)])
+        elif requestType == "callsets":
+            data = self._searchRequest(
+                protocol.SearchCallSetsRequest,
+                variantSetIds=[choice(self._variantSetIds)])
+        elif requestType == "readgroupsets":
+            data = self._searchRequest(
+                protocol.SearchReadGroupSetsRequest,
+                datasetIds=[choice(self._datasetIds)])
+        elif requestType == "references":
+            data = self._searchRequest(protocol.SearchReferencesRequest)
+        elif requestType == "referencesets":
+            data = self._searchRequest(protocol.SearchReferenceSetsRequest)
+        else:
+            data = self._searchRequest(protocol.SearchDatasetsRequest)
+        response = httpClient.doRawRequest(
+            'POST', requestType + "/search",
+            httpParams=self._searchParams.get(requestType, {}),
+            httpData=data)
+        return len(response)
+
+    def _runClient(self, clientIndex, endTime, results):
+        """
+        Sends requests until endTime, appending a (requestType, seconds,
+        numBytes, succeeded) tuple to results for each one.
+        """
+        httpClient = client.HttpClient(
+            self._baseUrl, self._verbosity, self._workarounds, self._key)
+        # An int seed, as seeding with a string uses its hash
+        randomGenerator = random.Random(self._seed * 1000003 + clientIndex)
+        while time.time() < endTime:
+            requestType = self._requestChoice.choose(randomGenerator)
+            startTime = time.time()
+            try:
+                numBytes = self._sendRequest(
+                    httpClient, randomGenerator, requestType)
+                succeeded = True
+            except Exception:
+                # Errors are counted rather than stopping the load test;
+                # the client has logged the status of the response.
+                numBytes = 0
+                succeeded = False
+            results.append(
+                (requestType, time.time() - startTime, numBytes, succeeded))
+
+    def _runStage(self, numClients):
+        """
+        Runs numClients clients concurrently for the duration of the test
+        and returns a dictionary summarising their requests.
+        """
+        results = []
+        startTime = time.time()
+        endTime = startTime + self._duration
+        threads = [
+            threading.Thread(
+                target=self._runClient, args=(index, endTime, results))
+            for index in range(numClients)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            # Joining with a timeout lets a KeyboardInterrupt through
+            while thread.is_alive():
+                thread.join(0.1)
+        elapsedTime = time.time() - startTime
+        # Failed requests are counted as errors, but are left out of the
+        # latencies, as an error is often returned much faster than a
+        # response.
+        latencies = [
+            seconds for _, seconds, _, succeeded in results if succeeded]
+        numBytes = sum(numBytes for _, _, numBytes, _ in results)
+        stage = {
+            "clients": numClients,
+            "seconds": elapsedTime,
+            "requests": len(results),
+            "errors": len(results) - len(latencies),
+            "bytes": numBytes,
+            "requestsPerSecond": len(results) / elapsedTime,
+            "bytesPerSecond": numBytes / elapsedTime,
+            "histogram": getLatencyHistogram(latencies),
+            "requestTypes": {},
+        }
+        stage.update(summariseLatencies(latencies))
+        for requestType, _ in self._requestMix:
+            typeResults = [
+                result for result in results if result[0] == requestType]
+            if len(typeResults) > 0:
+                typeLatencies = [
+                    seconds for _, seconds, _, succeeded in typeResults
+                    if succeeded]
+                typeStage = {
+                    "requests": len(typeResults),
+                    "errors": len(typeResults) - len(typeLatencies),
+                }
+                typeStage.update(summariseLatencies(typeLatencies))
+                stage["requestTypes"][requestType] = typeStage
+        return stage
+
+    def _printStage(self, stage):
+        print("{} clients: {} requests ({} errors) in {:.1f}s; "
+              "{:.1f} requests/s; {:.2f} MB/s".format(
+                  stage["clients"], stage["requests"], stage["errors"],
+                  stage["seconds"], stage["requestsPerSecond"],
+                  stage["bytesPerSecond"] / 2**20))
+        rowFormat = "  {:<14} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9}"
+        print(rowFormat.format(
+            "request", "count", "errors", "p50 ms", "p90 ms", "p99 ms",
+            "max ms"))
+        rows = sorted(stage["requestTypes"].items()) + [("all", stage)]
+        for requestType, typeStage in rows:
+            print(rowFormat.format(
+                requestType, typeStage["requests"], typeStage["errors"],
+                *["{:.1f}".format(typeStage[key] * 1000)
+                  for key in ["p50", "p90", "p99", "max"]]))
+        histogram = stage["histogram"]
+        maxCount = max(max(histogram), 1)
+        labels = ["<= {} ms".format(bound) for bound in LATENCY_BUCKETS]
+        labels.append("> {} ms".format(LATENCY_BUCKETS[-1]))
+        for label, count in zip(labels, histogram):
+            print("  {:>11} {:>8} {}".format(
+                label, count,
+                "#" * int(round(50 * count / maxCount))).rstrip())
+
+    def run(self):
+        self._discover()
+        self._requestChoice = self._getRequestChoice()
+        if len(self._contigs) > 0:
+            self._contigChoice = WeightedChoice(
+                (contig, contig[1]) for contig in self._contigs)
+        if len(self._readsContigs) > 0:
+            self._readsContigChoice = WeightedChoice(
+                (contig, contig[1]) for contig in self._readsContigs)
+        stages = []
+        try:
+            for numClients in self._clientCounts:
+                stage = self._runStage(numClients)
+                self._printStage(stage)
+                stages.append(stage)
+        except KeyboardInterrupt:
+            pass
+        rowFormat = "{:>8} {:>12} {:>9} {:>9} {:>7}"
+        print(rowFormat.format(
+            "clients", "requests/s", "p50 ms", "p99 ms", "errors"))
+        for stage in stages:
+            print(rowFormat.format(
+                stage["clients"], "{:.1f}".format(stage["requestsPerSecond"]),
+                "{:.1f}".format(stage["p50"] * 1000),
+                "{:.1f}".format(stage["p99"] * 1000), stage["errors"]))
+        if self._outputFile is not None:
+            output = {
+                "latencyBuckets": LATENCY_BUCKETS,
+                "requestMix": self._requestMix,
+                "stages": stages,
+            }
+            with open(self._outputFile, "w") as outputFile:
+                json.dump(output, outputFile, indent=2, sort_keys=True)
+
+
 def addVariantSearchOptions(parser):
     """
     Adds common options to a variant searches command line parser.
@@ -578,12 +1095,21 @@ def addVariantSearchOptions(parser):
     addStartArgument(parser)
     addEndArgument(parser)
     addPageSizeArgument(parser)
+    addVariantFilterArgument(parser)
     # maxCalls not in protocol; supported by google
     parser.add_argument(
         "--maxCalls", default=1,
         help="The maxiumum number of calls to return")
 
 
+def addVariantFilterArgument(parser):
+    parser.add_argument(
+        "--filter", default=None,
+        help=(
+            "Only return the variants that pass this expression, for "
+            "example 'FILTER==PASS && QUAL>=30 && INFO/AF<0.05'"))
+
+
 def addVariantSetIdsArgument(parser):
     parser.add_argument(
         "--variantSetIds", "-V", default=None,
@@ -703,6 +1229,62 @@ def addBenchmarkingParser(subparsers):
     return parser
 
 
+def addLoadTestParser(subparsers):
+    parser = subparsers.add_parser(
+        "loadtest",
+        description=(
+            "Send a mix of requests to a server from many concurrent "
+            "clients and report the throughput and latencies"),
+        help="Load test a server")
+    parser.set_defaults(runner=LoadTestRunner)
+    addUrlArgument(parser)
+    parser.add_argument(
+        "--mix", default="variants=6,reads=2,variantsets=1,bases=1",
+        help=(
+            "The relative frequencies of the types of request, as comma "
+            "separated type=weight pairs. The types are {}. "
+            "Default: %(default)s".format(
+                ", ".join(LOAD_TEST_REQUEST_TYPES))))
+    parser.add_argument(
+        "--clients", default="1,2,4,8",
+        help=(
+            "Comma separated numbers of concurrent clients, each of which "
+            "is run in turn. Default: %(default)s"))
+    parser.add_argument(
+        "--duration", type=float, default=30,
+        help="The number of seconds to run each number of clients for. "
+             "Default: %(default)s")
+    parser.add_argument(
+        "--regionSize", type=int, default=10000,
+        help="The length of the regions searched. Default: %(default)s")
+    parser.add_argument(
+        "--contigs", default=None,
+        help=(
+            "The contigs to draw regions from, as comma separated "
+            "name:length pairs. The default is the references on the "
+            "server, which may not be named as in the variant sets. Reads "
+            "are only searched on the contigs named as one of the "
+            "server's references"))
+    parser.add_argument(
+        "--readFields", default=None,
+        help=(
+            "Comma separated fields of the reads to ask for in reads "
+            "searches. The default is all of them"))
+    parser.add_argument(
+        "--variantFields", default=None,
+        help=(
+            "Comma separated fields of the variants to ask for in variants "
+            "searches. The default is all of them"))
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="The seed for the choice of requests. Default: %(default)s")
+    parser.add_argument(
+        "--output", default=None,
+        help="Write the results to this file as JSON")
+    addPageSizeArgument(parser)
+    return parser
+
+
 def addVariantsSearchParser(subparsers):
     parser = subparsers.add_parser(
         "variants-search",
@@ -854,6 +1436,7 @@ def client_main(parser=None):
     subparsers = parser.add_subparsers(title='subcommands',)
     addHelpParser(subparsers)
     addBenchmarkingParser(subparsers)
+    addLoadTestParser(subparsers)
     addVariantsSearchParser(subparsers)
     addVariantSetsSearchParser(subparsers)
     addReferenceSetsSearchParser(subparsers)
@@ -905,6 +1488,7 @@ def configtest_main(parser=None):
         help="The configuration file to use")
     args = parser.parse_args()
     configStr = 'ga4gh.serverconfig:{0}'.format(args.config)
+    import ga4gh.configtest as configtest
 
     configtest.TestConfig.configStr = configStr
     configtest.TestConfig.configFile = args.config_file
@@ -111,10 +111,9 @@ class HttpClient(object):
             notDone = False
         return notDone
 
-    def _doRequest(self, httpMethod, url, protocolResponseClass,
-                   httpParams={}, httpData=None):
+    def _sendRequest(self, httpMethod, url, httpParams, httpData):
         """
-        Performs a request to the server and returns the response
+        Sends a request to the server and returns the HTTP response
         """
         headers = {}
         params = self._getAuth()
@@ -127,22 +126,43 @@ class HttpClient(object):
             httpMethod, url, params=params, data=httpData, headers=headers,
             verify=False)
         self._checkStatus(response)
+        return response
+
+    def _doRequest(self, httpMethod, url, protocolResponseClass,
+                   httpParams={}, httpData=None):
+        """
+        Performs a request to the server and returns the response
+        """
+        response = self._sendRequest(httpMethod, url, httpParams, httpData)
         return self._deserializeResponse(response, protocolResponseClass)
 
+    def doRawRequest(self, httpMethod, path, httpParams={}, httpData=None):
+        """
+        Performs a request for the specified path relative to the URL
+        prefix and returns the body of the response, without parsing it.
+        Used where the cost of parsing the response is not wanted, such
+        as when load testing a server.
+        """
+        url = posixpath.join(self._urlPrefix, path)
+        response = self._sendRequest(httpMethod, url, httpParams, httpData)
+        self._updateBytesRead(response.content)
+        return response.content
+
     def runSearchRequest(self, protocolRequest, objectName,
-                         protocolResponseClass):
+                         protocolResponseClass, httpParams={}):
         """
         Runs the specified request at the specified objectName and instantiates
         an object of the specified class. We yield each object in listAttr.
         If pages of results are present, repeat this process until the
-        pageToken is null.
+        pageToken is null. The httpParams are sent as URL arguments with
+        the request for every page.
         """
         fullUrl = posixpath.join(self._urlPrefix, objectName + '/search')
         notDone = True
         while notDone:
             data = protocolRequest.toJsonString()
             responseObject = self._doRequest(
-                'POST', fullUrl, protocolResponseClass, httpData=data)
+                'POST', fullUrl, protocolResponseClass, httpParams, data)
             valueList = getattr(
                 responseObject, protocolResponseClass.getValueListName())
             self._logger.info("Response pageSize={}".format(len(valueList)))
@@ -196,12 +216,22 @@ class HttpClient(object):
             protocolRequest, "references/{id}/bases",
             protocol.ListReferenceBasesResponse, id_)
 
-    def searchVariants(self, protocolRequest):
+    def searchVariants(self, protocolRequest, variantFilter=None,
+                       fields=None):
         """
-        Returns an iterator over the Variants from the server
+        Returns an iterator over the Variants from the server. If a
+        variantFilter expression is given, the server only returns the
+        variants that pass it. If a list of fields is given, only those
+        fields of the Variants are filled in.
         """
+        httpParams = {}
+        if variantFilter is not None:
+            httpParams["filter"] = variantFilter
+        if fields is not None:
+            httpParams["fields"] = ",".join(fields)
         return self.runSearchRequest(
-            protocolRequest, "variants", protocol.SearchVariantsResponse)
+            protocolRequest, "variants", protocol.SearchVariantsResponse,
+            httpParams)
 
     def getVariantSet(self, id_):
         """
@@ -247,12 +277,18 @@ class HttpClient(object):
             protocolRequest, "readgroupsets",
             protocol.SearchReadGroupSetsResponse)
 
-    def searchReads(self, protocolRequest):
+    def searchReads(self, protocolRequest, fields=None):
         """
-        Returns an iterator over the Reads from the server
+        Returns an iterator over the Reads from the server. If a list of
+        fields is given, only those fields of the ReadAlignments are
+        filled in.
         """
+        httpParams = {}
+        if fields is not None:
+            httpParams["fields"] = ",".join(fields)
         return self.runSearchRequest(
-            protocolRequest, "reads", protocol.SearchReadsResponse)
+            protocolRequest, "reads", protocol.SearchReadsResponse,
+            httpParams)
 
     def searchDatasets(self, protocolRequest):
         """
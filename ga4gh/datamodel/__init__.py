@@ -12,9 +12,11 @@ import json
 import tempfile
 import shutil
 import atexit
+import threading
 import collections
 
 import ga4gh.exceptions as exceptions
+import ga4gh.metrics as metrics
 
 
 def _cleanupHtslibsMess(indexDir):
@@ -33,12 +35,14 @@ class PysamFileHandleCache(object):
     advantage to have push/pop operations in O(1) We always add
     elements on the left of the deque and pop elements from the right.
     When a file is accessed via getFileHandle, its priority gets
-    updated, it is put at the "top" of the deque.
+    updated, it is put at the "top" of the deque. The cache is shared by
+    the threads answering requests, so it is updated under a lock.
     """
 
     def __init__(self):
         self._cache = collections.deque()
         self._memoTable = dict()
+        self._lock = threading.Lock()
         # Initialize the value even if it will be set up by the config
         self._maxCacheSize = 50
 
@@ -88,11 +92,17 @@ class PysamFileHandleCache(object):
         its handle. Otherwise, open the file using openMethod, store
         it in the cache and return the corresponding handle.
         """
+        with self._lock:
+            return self._lookUpFileHandle(dataFile, openMethod)
+
+    def _lookUpFileHandle(self, dataFile, openMethod):
         if dataFile in self._memoTable:
+            metrics.registry.increment(metrics.FILE_HANDLE_CACHE_HITS)
             handle = self._memoTable[dataFile]
             self._update(dataFile, handle)
             return handle
         else:
+            metrics.registry.increment(metrics.FILE_HANDLE_CACHE_MISSES)
             try:
                 handle = openMethod(dataFile)
             except ValueError:
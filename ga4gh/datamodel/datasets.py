@@ -98,7 +98,8 @@ class SimulatedDataset(AbstractDataset):
     """
     def __init__(
             self, datasetId, randomSeed, numCalls,
-            variantDensity, numVariantSets, numAlignments):
+            variantDensity, numVariantSets, numAlignments, readLength=100,
+            numIndels=0, numTags=0):
         super(SimulatedDataset, self).__init__()
         self._id = datasetId
         self._randomSeed = randomSeed
@@ -116,8 +117,10 @@ class SimulatedDataset(AbstractDataset):
 
         # Reads
         readGroupSetId = "{}:aReadGroupSet".format(self._id)
+        seed = self._randomGenerator.randint(0, 2**32 - 1)
         readGroupSet = reads.SimulatedReadGroupSet(
-            readGroupSetId, numAlignments)
+            readGroupSetId, numAlignments, seed, readLength, numIndels,
+            numTags)
         self._readGroupSetIdMap[readGroupSetId] = readGroupSet
         for readGroup in readGroupSet.getReadGroups():
             self._readGroupIdMap[readGroup.getId()] = readGroup
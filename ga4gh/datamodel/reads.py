@@ -6,13 +6,23 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import array
+import collections
 import datetime
+import mmap
 import os
+import random
+import string
+import struct
+import sys
+import zlib
 
 import pysam
 
 import ga4gh.protocol as protocol
 import ga4gh.datamodel as datamodel
+import ga4gh.metrics as metrics
+import ga4gh.exceptions as exceptions
 
 
 class SamCigar(object):
@@ -50,6 +60,7 @@ class SamFlags(object):
     """
     NUMBER_READS = 0x1
     PROPER_PLACEMENT = 0x2
+    SEGMENT_UNMAPPED = 0x4
     READ_NUMBER_ONE = 0x40
     READ_NUMBER_TWO = 0x80
     SECONDARY_ALIGNMENT = 0x100
@@ -66,6 +77,296 @@ class SamFlags(object):
         flagAttr |= flag
 
 
+def binCoverage(blocks, start, end, binSize, depths=None):
+    """
+    Returns the list of mean depths in consecutive bins of binSize bases
+    over the interval [start, end), given an iterable of the
+    (blockStart, blockEnd) intervals covered by aligned bases. The last
+    bin is truncated at end, and its mean is taken over its true length.
+    If depths is given, it holds the number of aligned bases already
+    counted in each bin, to which those in the blocks are added.
+    """
+    numBins = (end - start + binSize - 1) // binSize
+    if depths is None:
+        depths = [0] * numBins
+    for blockStart, blockEnd in blocks:
+        blockStart = max(blockStart, start)
+        blockEnd = min(blockEnd, end)
+        while blockStart < blockEnd:
+            binIndex = (blockStart - start) // binSize
+            binEnd = min(start + (binIndex + 1) * binSize, blockEnd)
+            depths[binIndex] += binEnd - blockStart
+            blockStart = binEnd
+    coverage = []
+    for binIndex, depth in enumerate(depths):
+        binStart = start + binIndex * binSize
+        coverage.append(depth / min(binSize, end - binStart))
+    return coverage
+
+
+def filterReads(samReads, excludedFlags=0, minMappingQuality=0):
+    """
+    Returns an iterator over the specified pysam reads that have none of
+    the SAM flags in excludedFlags set and a mapping quality of at least
+    minMappingQuality.
+    """
+    for read in samReads:
+        if (read.flag & excludedFlags == 0 and
+                read.mapping_quality >= minMappingQuality):
+            yield read
+
+
+def getAlignedBlocks(samFile, referenceName, start=None, end=None):
+    """
+    Returns an iterator over the (blockStart, blockEnd) reference intervals
+    covered by the aligned bases of the reads in the specified pysam
+    AlignmentFile that overlap the specified region. As samtools depth
+    does, we skip unmapped, secondary, QC failed and duplicate reads.
+    """
+    excludedFlags = (
+        SamFlags.SEGMENT_UNMAPPED | SamFlags.SECONDARY_ALIGNMENT |
+        SamFlags.FAILED_VENDOR_QUALITY_CHECKS | SamFlags.DUPLICATE_FRAGMENT)
+    for read in samFile.fetch(referenceName, start, end):
+        if read.flag & excludedFlags == 0:
+            for block in read.get_blocks():
+                yield block
+
+
+class CoverageTiles(object):
+    """
+    Multi-resolution summaries of the read depth of a BAM file, held in
+    a sidecar file next to it and memory mapped on use. The map holds an
+    open file descriptor until it is closed, so read groups open their
+    CoverageTiles through the bounded file handle cache. Each level of
+    the summary holds the mean depth over consecutive tiles of a fixed
+    number of bases as an array of 32 bit floats, so that range queries
+    at a coarse resolution cost time proportional to the number of
+    bins returned rather than the number of reads in the range. Only the
+    reads at the edges of bins that do not line up with the finest tiles
+    need to be scanned.
+
+    The sidecar consists of a header (magic, version, number of levels
+    and number of references), the tile size of each level, then for
+    each reference its name, length, and the offset and number of tiles
+    of each of its levels. The tile arrays follow. All values are
+    little-endian.
+    """
+    magic = b"GA4GHCOV"
+    version = 1
+    sidecarSuffix = ".cov"
+    defaultTileSizes = [128, 1024, 8192, 65536, 524288]
+
+    _headerFormat = str("<8sIII")
+    _referenceFormat = str("<QH")
+    _levelFormat = str("<QQ")
+    _floatSize = 4
+
+    def __init__(self, path):
+        with open(path, "rb") as sidecarFile:
+            self._mmap = mmap.mmap(
+                sidecarFile.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = 0
+        magic, version, numLevels, numReferences = self._unpack(
+            self._headerFormat, offset)
+        if magic != self.magic or version != self.version:
+            raise ValueError("Not a version {} coverage file: {}".format(
+                self.version, path))
+        offset += struct.calcsize(self._headerFormat)
+        tileSizesFormat = str("<{}I".format(numLevels))
+        tileSizes = self._unpack(tileSizesFormat, offset)
+        offset += struct.calcsize(tileSizesFormat)
+        self._references = {}
+        for _ in range(numReferences):
+            length, nameLength = self._unpack(self._referenceFormat, offset)
+            offset += struct.calcsize(self._referenceFormat)
+            name = self._mmap[offset:offset + nameLength]
+            offset += nameLength
+            levels = []
+            for tileSize in tileSizes:
+                dataOffset, numTiles = self._unpack(
+                    self._levelFormat, offset)
+                offset += struct.calcsize(self._levelFormat)
+                levels.append((tileSize, dataOffset, numTiles))
+            self._references[name] = length, levels
+
+    def close(self):
+        """
+        Unmaps the sidecar file.
+        """
+        self._mmap.close()
+
+    def _unpack(self, format_, offset):
+        return struct.unpack_from(format_, self._mmap, offset)
+
+    def _readTiles(self, dataOffset, firstTile, lastTile):
+        tiles = array.array(str("f"))
+        tiles.fromstring(self._mmap[
+            dataOffset + firstTile * self._floatSize:
+            dataOffset + lastTile * self._floatSize])
+        if sys.byteorder != "little":
+            tiles.byteswap()
+        return tiles
+
+    @classmethod
+    def getSidecarPath(cls, samFilePath):
+        """
+        Returns the path of the coverage sidecar file for the specified
+        BAM file.
+        """
+        return samFilePath + cls.sidecarSuffix
+
+    @classmethod
+    def isUpToDate(cls, samFilePath):
+        """
+        Returns True if the specified BAM file has a coverage sidecar file
+        that is at least as recent as it.
+        """
+        sidecarPath = cls.getSidecarPath(samFilePath)
+        return (
+            os.path.exists(sidecarPath) and
+            os.path.getmtime(sidecarPath) >= os.path.getmtime(samFilePath))
+
+    @classmethod
+    def build(cls, samFilePath, tileSizes=None):
+        """
+        Computes the coverage tiles for the specified indexed BAM file in
+        a single pass over its reads and writes them to its sidecar file.
+        The tile size of each level must be a multiple of the tile size
+        of the first, finest, level.
+        """
+        if tileSizes is None:
+            tileSizes = cls.defaultTileSizes
+        tileSizes = sorted(tileSizes)
+        finestTileSize = tileSizes[0]
+        if finestTileSize <= 0 or any(
+                tileSize % finestTileSize != 0 for tileSize in tileSizes):
+            raise ValueError(
+                "Tile sizes must be positive multiples of the smallest")
+        samFile = pysam.AlignmentFile(samFilePath)
+        referenceLevels = []
+        for referenceName, length in zip(
+                samFile.references, samFile.lengths):
+            # Most tiles of a typical reference are empty at any depth of
+            # sequencing we can afford to build this for, so we keep
+            # sparse sums of the aligned bases in each tile.
+            depths = collections.defaultdict(int)
+            for blockStart, blockEnd in getAlignedBlocks(
+                    samFile, referenceName):
+                blockEnd = min(blockEnd, length)
+                while blockStart < blockEnd:
+                    tile = blockStart // finestTileSize
+                    tileEnd = min((tile + 1) * finestTileSize, blockEnd)
+                    depths[tile] += tileEnd - blockStart
+                    blockStart = tileEnd
+            levels = []
+            for tileSize in tileSizes:
+                ratio = tileSize // finestTileSize
+                levelDepths = collections.defaultdict(int)
+                for tile, depth in depths.iteritems():
+                    levelDepths[tile // ratio] += depth
+                numTiles = (length + tileSize - 1) // tileSize
+                tiles = array.array(str("f"), [0]) * numTiles
+                for tile, depth in levelDepths.iteritems():
+                    tileLength = min(tileSize, length - tile * tileSize)
+                    tiles[tile] = depth / tileLength
+                if sys.byteorder != "little":
+                    tiles.byteswap()
+                levels.append(tiles)
+            referenceLevels.append((referenceName, length, levels))
+        samFile.close()
+
+        # Lay out the index, then the tile data following it.
+        indexSize = struct.calcsize(cls._headerFormat) + struct.calcsize(
+            str("<{}I".format(len(tileSizes))))
+        for referenceName, _, levels in referenceLevels:
+            indexSize += struct.calcsize(cls._referenceFormat) + len(
+                referenceName) + len(levels) * struct.calcsize(
+                cls._levelFormat)
+        sidecarPath = cls.getSidecarPath(samFilePath)
+        temporaryPath = sidecarPath + ".tmp"
+        with open(temporaryPath, "wb") as sidecarFile:
+            sidecarFile.write(struct.pack(
+                cls._headerFormat, cls.magic, cls.version, len(tileSizes),
+                len(referenceLevels)))
+            sidecarFile.write(struct.pack(
+                str("<{}I".format(len(tileSizes))), *tileSizes))
+            dataOffset = indexSize
+            for referenceName, length, levels in referenceLevels:
+                sidecarFile.write(struct.pack(
+                    cls._referenceFormat, length, len(referenceName)))
+                sidecarFile.write(referenceName)
+                for tiles in levels:
+                    sidecarFile.write(struct.pack(
+                        cls._levelFormat, dataOffset, len(tiles)))
+                    dataOffset += len(tiles) * cls._floatSize
+            for _, _, levels in referenceLevels:
+                for tiles in levels:
+                    tiles.tofile(sidecarFile)
+        os.rename(temporaryPath, sidecarPath)
+
+    def getBinDepths(self, referenceName, start, end, binSize):
+        """
+        Returns the number of aligned bases in each bin of binSize bases
+        over [start, end) that fall in the whole tiles of the finest level
+        the bin covers, together with the list of the (start, end)
+        intervals at the edges of the bins that are not covered by whole
+        tiles, whose reads the caller must count. Adjacent intervals are
+        merged. Returns None if the reference is not in this file.
+        """
+        if referenceName not in self._references:
+            return None
+        length, levels = self._references[referenceName]
+        finestTileSize = levels[0][0]
+        depths = []
+        edges = []
+
+        def addEdge(edgeStart, edgeEnd):
+            if edgeStart >= edgeEnd:
+                return
+            if len(edges) > 0 and edges[-1][1] == edgeStart:
+                edges[-1] = (edges[-1][0], edgeEnd)
+            else:
+                edges.append((edgeStart, edgeEnd))
+        for binStart in range(start, end, binSize):
+            # There are no reads beyond the end of the reference
+            binEnd = min(binStart + binSize, end, length)
+            tilesStart = -(-binStart // finestTileSize) * finestTileSize
+            tilesEnd = binEnd
+            if binEnd < length:
+                tilesEnd = binEnd // finestTileSize * finestTileSize
+            if tilesStart < tilesEnd:
+                depths.append(self._sumDepths(
+                    length, levels, tilesStart, tilesEnd))
+                addEdge(binStart, tilesStart)
+                addEdge(tilesEnd, binEnd)
+            else:
+                depths.append(0)
+                addEdge(binStart, binEnd)
+        return depths, edges
+
+    def _sumDepths(self, length, levels, start, end):
+        # Returns the number of aligned bases in [start, end), which lies
+        # on tile boundaries of the first level, taking as many whole
+        # tiles as possible from the coarsest level and the finer levels
+        # only for what is left at either side.
+        if start >= end:
+            return 0
+        tileSize, dataOffset, numTiles = levels[-1]
+        firstTile = -(-start // tileSize)
+        lastTile = numTiles if end >= length else end // tileSize
+        if firstTile >= lastTile:
+            return self._sumDepths(length, levels[:-1], start, end)
+        tiles = self._readTiles(dataOffset, firstTile, lastTile)
+        total = 0
+        for tile, depth in enumerate(tiles, firstTile):
+            total += depth * min(tileSize, length - tile * tileSize)
+        return (
+            total +
+            self._sumDepths(
+                length, levels[:-1], start, firstTile * tileSize) +
+            self._sumDepths(length, levels[:-1], lastTile * tileSize, end))
+
+
 class AbstractReadGroupSet(datamodel.DatamodelObject):
     """
     The base class of a read group set
@@ -101,10 +402,13 @@ class SimulatedReadGroupSet(AbstractReadGroupSet):
     """
     A simulated read group set
     """
-    def __init__(self, id_, numAlignments=2):
+    def __init__(self, id_, numAlignments=2, randomSeed=0, readLength=100,
+                 numIndels=0, numTags=0):
         super(SimulatedReadGroupSet, self).__init__(id_)
         readGroupId = "{}:one".format(id_)
-        readGroup = SimulatedReadGroup(readGroupId, numAlignments)
+        readGroup = SimulatedReadGroup(
+            readGroupId, numAlignments, randomSeed, readLength, numIndels,
+            numTags)
         self._readGroups.append(readGroup)
 
 
@@ -138,6 +442,8 @@ class AbstractReadGroup(object):
         now = protocol.convertDatetime(datetime.datetime.now())
         self._creationTime = now
         self._updateTime = now
+        self._excludedFlags = 0
+        self._minMappingQuality = 0
 
     def getId(self):
         """
@@ -145,6 +451,19 @@ class AbstractReadGroup(object):
         """
         return self._id
 
+    def setReadFilter(self, excludedFlags=0, minMappingQuality=0):
+        """
+        Sets the filter applied to the reads returned by
+        getReadAlignments: reads with any of the SAM flags in
+        excludedFlags set, or with a mapping quality below
+        minMappingQuality, are skipped.
+        """
+        self._excludedFlags = excludedFlags
+        self._minMappingQuality = minMappingQuality
+
+    def _isFilteringReads(self):
+        return self._excludedFlags != 0 or self._minMappingQuality > 0
+
     def toProtocolElement(self):
         """
         Returns the GA4GH protocol representation of this ReadGroup.
@@ -166,39 +485,220 @@ class AbstractReadGroup(object):
         readGroup.sampleId = None
         return readGroup
 
+    def getCoverage(self, referenceName, start, end, binSize):
+        """
+        Returns the list of mean read depths over [start, end) on the
+        specified reference, summarised into bins of binSize bases.
+        """
+        blocks = self._getAlignedBlocks(referenceName, start, end)
+        return binCoverage(blocks, start, end, binSize)
+
+    def _getAlignedBlocks(self, referenceName, start, end):
+        """
+        Returns an iterator over the (blockStart, blockEnd) reference
+        intervals covered by the aligned bases of the reads overlapping
+        [start, end) on the specified reference. This default
+        implementation works from the GA4GH ReadAlignment objects.
+        """
+        referenceConsuming = [
+            protocol.CigarOperation.DELETE, protocol.CigarOperation.SKIP]
+        aligned = [
+            protocol.CigarOperation.ALIGNMENT_MATCH,
+            protocol.CigarOperation.SEQUENCE_MATCH,
+            protocol.CigarOperation.SEQUENCE_MISMATCH]
+        for readAlignment in self.getReadAlignments(None, start, end):
+            position = readAlignment.alignment.position
+            if position.referenceName != referenceName:
+                continue
+            blockStart = position.position
+            cigar = readAlignment.alignment.cigar
+            if not cigar:
+                yield blockStart, blockStart + len(
+                    readAlignment.alignedSequence)
+            for cigarUnit in cigar:
+                if cigarUnit.operation in aligned:
+                    blockEnd = blockStart + cigarUnit.operationLength
+                    yield blockStart, blockEnd
+                    blockStart = blockEnd
+                elif cigarUnit.operation in referenceConsuming:
+                    blockStart += cigarUnit.operationLength
+
 
 class SimulatedReadGroup(AbstractReadGroup):
     """
-    A simulated readgroup
+    A simulated readgroup. The reference is split into windows of
+    readLength bases, and numAlignments reads start in each window, so
+    that numAlignments is the mean read depth. The reads in a window are
+    generated from a random generator seeded with the window's position,
+    so the same reads are produced whatever range is searched. Each read
+    has numIndels insertions or deletions in its CIGAR, and numTags tags
+    in its info.
     """
-    def __init__(self, id_, numAlignments=2):
+    # The length of the simulated references, which is searched to the
+    # end when no end is given.
+    referenceLength = 10**8
+    # Maps the hex digits of a random number to bases, which is much
+    # faster than choosing the bases of a read one at a time
+    basesTranslation = string.maketrans(b"0123456789abcdef", b"ACGT" * 4)
+
+    def __init__(self, id_, numAlignments=2, randomSeed=0, readLength=100,
+                 numIndels=0, numTags=0):
         super(SimulatedReadGroup, self).__init__(id_)
+        if readLength <= 4 * numIndels:
+            raise ValueError(
+                "Reads of length {} cannot have {} indels".format(
+                    readLength, numIndels))
         self._numAlignments = numAlignments
+        self._randomSeed = randomSeed
+        self._readLength = readLength
+        self._numIndels = numIndels
+        self._tagNames = [
+            first + second for first in "XYZ"
+            for second in "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"][:numTags]
+        # Indels are at most 3 bases long, so this is the longest a read
+        # can be on the reference
+        self._maxReferenceLength = readLength + 3 * numIndels
+
+    def getReadAlignments(
+            self, referenceId=None, start=None, end=None, reopen=False,
+            fields=None, referenceName=None):
+        # The protocol gives reference ids as strings, while the htslib
+        # read groups take BAM reference indexes, so accept either. The
+        # reads on a named reference are those of the id of that name.
+        if referenceName is not None:
+            referenceId = referenceName
+        if referenceId is None:
+            referenceId = 0
+        referenceId = str(referenceId)
+        if start is None:
+            start = 0
+        if end is None:
+            end = self.referenceLength
+        firstWindow = max(
+            start - self._maxReferenceLength, 0) // self._readLength
+        lastWindow = (end - 1) // self._readLength
+        for window in range(firstWindow, lastWindow + 1):
+            for alignment in self._getWindowAlignments(referenceId, window):
+                position = alignment.alignment.position.position
+                if position >= end:
+                    break
+                referenceEnd = position + self._getReferenceLength(
+                    alignment)
+                if referenceEnd > start and not self._isExcluded(alignment):
+                    yield alignment
+
+    def _isExcluded(self, alignment):
+        """
+        Returns True if the specified simulated alignment is removed by
+        the read filter. Only the flags that the simulated reads can have
+        set are checked.
+        """
+        if (alignment.alignment.mappingQuality <
+                self._minMappingQuality):
+            return True
+        return alignment.duplicateFragment and SamFlags.isFlagSet(
+            self._excludedFlags, SamFlags.DUPLICATE_FRAGMENT)
+
+    def _getReferenceLength(self, alignment):
+        referenceLength = 0
+        for cigarUnit in alignment.alignment.cigar:
+            if cigarUnit.operation in [
+                    protocol.CigarOperation.ALIGNMENT_MATCH,
+                    protocol.CigarOperation.DELETE]:
+                referenceLength += cigarUnit.operationLength
+        return referenceLength
+
+    def _getWindowAlignments(self, referenceId, window):
+        """
+        Returns the list of the reads starting in the specified window,
+        sorted by position.
+        """
+        # Seeding with a tuple would use its hash, which for a string
+        # varies between builds and with PYTHONHASHSEED, so we pack the
+        # seed, the CRC32 of the reference id and the window into an int.
+        referenceCrc = zlib.crc32(
+            unicode(referenceId).encode("utf-8")) & 0xffffffff
+        randomGenerator = random.Random()
+        randomGenerator.seed(
+            (((self._randomSeed << 32) + referenceCrc) << 32) + window)
+        windowStart = window * self._readLength
+        positions = sorted(
+            windowStart + randomGenerator.randrange(self._readLength)
+            for _ in range(self._numAlignments))
+        return [
+            self._createReadAlignment(
+                "{}:{}:{}".format(referenceId, window, index), referenceId,
+                position, randomGenerator)
+            for index, position in enumerate(positions)]
+
+    def _getCigar(self, randomGenerator):
+        """
+        Returns a CIGAR of matches separated by numIndels insertions or
+        deletions of 1 to 3 bases, which together consume readLength bases
+        of the read.
+        """
+        indels = [
+            (randomGenerator.choice([
+                protocol.CigarOperation.INSERT,
+                protocol.CigarOperation.DELETE]),
+             randomGenerator.randint(1, 3))
+            for _ in range(self._numIndels)]
+        insertedLength = sum(
+            length for operation, length in indels
+            if operation == protocol.CigarOperation.INSERT)
+        matchedLength = self._readLength - insertedLength
+        # Split the matched bases into len(indels) + 1 blocks of at least
+        # one base
+        splits = sorted(randomGenerator.sample(
+            range(1, matchedLength), len(indels)))
+        blockLengths = [
+            end - start
+            for start, end in zip([0] + splits, splits + [matchedLength])]
+        cigar = []
+        for index, blockLength in enumerate(blockLengths):
+            cigar.append(
+                (protocol.CigarOperation.ALIGNMENT_MATCH, blockLength))
+            if index < len(indels):
+                cigar.append(indels[index])
+        gaCigar = []
+        for operation, length in cigar:
+            gaCigarUnit = protocol.CigarUnit()
+            gaCigarUnit.operation = operation
+            gaCigarUnit.operationLength = length
+            gaCigarUnit.referenceSequence = None
+            gaCigar.append(gaCigarUnit)
+        return gaCigar
 
-    def getReadAlignments(self, referenceId=None, start=None, end=None):
-        for i in range(self._numAlignments):
-            alignment = self._createReadAlignment(i)
-            yield alignment
-
-    def _createReadAlignment(self, i):
-        # TODO fill out a bit more
-        id_ = "{}:simulated{}".format(self._id, i)
+    def _createReadAlignment(self, name, referenceId, position,
+                             randomGenerator):
+        id_ = "{}:{}".format(self._id, name)
         alignment = protocol.ReadAlignment()
-        alignment.alignedQuality = [1, 2, 3]
-        alignment.alignedSequence = "ACT"
+        hexDigits = b"{:0{}x}".format(
+            randomGenerator.getrandbits(4 * self._readLength),
+            self._readLength)
+        alignment.alignedSequence = hexDigits.translate(
+            self.basesTranslation)
+        alignment.alignedQuality = [
+            randomGenerator.randint(20, 40)] * self._readLength
         gaPosition = protocol.Position()
-        gaPosition.position = 0
-        gaPosition.referenceName = "whatevs"
-        gaPosition.strand = protocol.Strand.POS_STRAND
+        gaPosition.position = position
+        gaPosition.referenceName = "simRef{}".format(referenceId)
+        gaPosition.strand = randomGenerator.choice([
+            protocol.Strand.POS_STRAND, protocol.Strand.NEG_STRAND])
         gaLinearAlignment = protocol.LinearAlignment()
         gaLinearAlignment.position = gaPosition
+        gaLinearAlignment.cigar = self._getCigar(randomGenerator)
+        gaLinearAlignment.mappingQuality = (
+            0 if randomGenerator.random() < 0.05 else 60)
         alignment.alignment = gaLinearAlignment
-        alignment.duplicateFragment = False
+        alignment.duplicateFragment = randomGenerator.random() < 0.02
         alignment.failedVendorQualityChecks = False
-        alignment.fragmentLength = 3
+        alignment.fragmentLength = self._readLength
         alignment.fragmentName = id_
         alignment.id = id_
-        alignment.info = {}
+        alignment.info = {
+            tagName: [str(randomGenerator.randint(0, 1000))]
+            for tagName in self._tagNames}
         alignment.nextMatePosition = None
         alignment.numberReads = None
         alignment.properPlacement = False
@@ -226,33 +726,110 @@ class HtslibReadGroup(datamodel.PysamDatamodelMixin, AbstractReadGroup):
         """
         return self._samFilePath
 
-    def getReadAlignments(self, referenceId=None, start=None, end=None):
+    def getReadAlignments(
+            self, referenceId=None, start=None, end=None, reopen=False,
+            fields=None, referenceName=None):
         """
-        Returns an iterator over the specified reads
+        Returns an iterator over the specified reads. The reference is
+        given either by its index in the header of the BAM file or by its
+        name. If reopen is True, the iterator reads from its own copy of
+        the file handle, and so remains valid while the cached handle is
+        used by other searches. If fields is not None, only the named
+        fields of the reads need to be filled in; see
+        convertReadAlignment.
         """
         # TODO If referenceId is None, return against all references,
         # including unmapped reads.
-        referenceName = ""
         samFile = self.getFileHandle(self._samFilePath)
-        if referenceId is not None:
+        if referenceName is not None:
+            if referenceName not in samFile.references:
+                raise exceptions.ReferenceNameNotFoundException(
+                    referenceName)
+        elif referenceId is not None:
+            # The protocol gives the reference id as a string, but it is
+            # the index of the reference in the header of the SAM file.
+            if isinstance(referenceId, basestring) and referenceId.isdigit():
+                referenceId = int(referenceId)
             self.sanitizeGetRName(referenceId)
             referenceName = samFile.getrname(referenceId)
+        else:
+            referenceName = ""
         referenceName, start, end = self.sanitizeAlignmentFileFetch(
             referenceName, start, end)
         # TODO deal with errors from htslib
-        readAlignments = samFile.fetch(referenceName, start, end)
-        for readAlignment in readAlignments:
-            yield self.convertReadAlignment(readAlignment)
+        readAlignments = samFile.fetch(
+            referenceName, start, end, multiple_iterators=reopen)
+        if self._isFilteringReads():
+            # Filter on the raw records, so that we don't pay for
+            # converting reads that are thrown away.
+            readAlignments = filterReads(
+                readAlignments, self._excludedFlags,
+                self._minMappingQuality)
+        for readAlignment in metrics.registry.timeRecords(
+                readAlignments, lambda read: self.convertReadAlignment(
+                    read, fields)):
+            yield readAlignment
+
+    def getCoverage(self, referenceName, start, end, binSize):
+        # Count what we can from the precomputed coverage tiles, and scan
+        # only the reads at the edges of the bins that the tiles do not
+        # line up with.
+        binDepths = None
+        coverageTiles = self._getCoverageTiles()
+        if coverageTiles is not None:
+            binDepths = coverageTiles.getBinDepths(
+                referenceName, start, end, binSize)
+        if binDepths is None:
+            return super(HtslibReadGroup, self).getCoverage(
+                referenceName, start, end, binSize)
+        depths, edges = binDepths
+        blocks = (
+            (max(blockStart, edgeStart), min(blockEnd, edgeEnd))
+            for edgeStart, edgeEnd in edges
+            for blockStart, blockEnd in self._getAlignedBlocks(
+                referenceName, edgeStart, edgeEnd))
+        return binCoverage(blocks, start, end, binSize, depths)
+
+    def _getCoverageTiles(self):
+        """
+        Returns the CoverageTiles for this read group's BAM file, or None
+        if there is no up to date, readable sidecar file for it.
+        """
+        if not CoverageTiles.isUpToDate(self._samFilePath):
+            return None
+        try:
+            return datamodel.fileHandleCache.getFileHandle(
+                CoverageTiles.getSidecarPath(self._samFilePath),
+                CoverageTiles)
+        except exceptions.FileOpenFailedException:
+            return None
+
+    def _getAlignedBlocks(self, referenceName, start, end):
+        # Work directly from the pysam records so that we don't pay for
+        # converting reads we only need the aligned blocks of.
+        samFile = self.getFileHandle(self._samFilePath)
+        referenceName, start, end = self.sanitizeAlignmentFileFetch(
+            referenceName, start, end)
+        if referenceName not in samFile.references:
+            raise exceptions.ReferenceNameNotFoundException(referenceName)
+        return getAlignedBlocks(samFile, referenceName, start, end)
 
-    def convertReadAlignment(self, read):
+    def convertReadAlignment(self, read, fields=None):
         """
-        Convert a pysam ReadAlignment to a GA4GH ReadAlignment
+        Convert a pysam ReadAlignment to a GA4GH ReadAlignment. If fields
+        is not None, the alignedQuality, alignedSequence, info and
+        nextMatePosition fields and the CIGAR of the alignment are only
+        filled in if they are named in it, and are otherwise left at
+        their defaults. The position of the alignment is always filled
+        in, as it is needed to page through the results.
         """
         # TODO fill out remaining fields
         # TODO refine in tandem with code in converters module
         ret = protocol.ReadAlignment()
-        ret.alignedQuality = list(read.query_qualities)
-        ret.alignedSequence = read.query_sequence
+        if fields is None or "alignedQuality" in fields:
+            ret.alignedQuality = list(read.query_qualities)
+        if fields is None or "alignedSequence" in fields:
+            ret.alignedSequence = read.query_sequence
         ret.alignment = protocol.LinearAlignment()
         ret.alignment.mappingQuality = read.mapping_quality
         ret.alignment.position = protocol.Position()
@@ -264,12 +841,13 @@ class HtslibReadGroup(datamodel.PysamDatamodelMixin, AbstractReadGroup):
         ret.alignment.position.strand = \
             protocol.Strand.POS_STRAND  # TODO fix this!
         ret.alignment.cigar = []
-        for operation, length in read.cigar:
-            gaCigarUnit = protocol.CigarUnit()
-            gaCigarUnit.operation = SamCigar.int2ga(operation)
-            gaCigarUnit.operationLength = length
-            gaCigarUnit.referenceSequence = None  # TODO fix this!
-            ret.alignment.cigar.append(gaCigarUnit)
+        if fields is None or "alignment" in fields:
+            for operation, length in read.cigar:
+                gaCigarUnit = protocol.CigarUnit()
+                gaCigarUnit.operation = SamCigar.int2ga(operation)
+                gaCigarUnit.operationLength = length
+                gaCigarUnit.referenceSequence = None  # TODO fix this!
+                ret.alignment.cigar.append(gaCigarUnit)
         ret.duplicateFragment = SamFlags.isFlagSet(
             read.flag, SamFlags.DUPLICATE_FRAGMENT)
         ret.failedVendorQualityChecks = SamFlags.isFlagSet(
@@ -277,9 +855,11 @@ class HtslibReadGroup(datamodel.PysamDatamodelMixin, AbstractReadGroup):
         ret.fragmentLength = read.template_length
         ret.fragmentName = read.query_name
         ret.id = "{}:{}".format(self._id, read.query_name)
-        ret.info = {key: [str(value)] for key, value in read.tags}
+        if fields is None or "info" in fields:
+            ret.info = {key: [str(value)] for key, value in read.tags}
         ret.nextMatePosition = None
-        if read.next_reference_id != -1:
+        if read.next_reference_id != -1 and (
+                fields is None or "nextMatePosition" in fields):
             ret.nextMatePosition = protocol.Position()
             self.sanitizeGetRName(read.next_reference_id)
             ret.nextMatePosition.referenceName = samFile.getrname(
@@ -7,6 +7,8 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import os
+import json
+import mmap
 import random
 import hashlib
 
@@ -27,6 +29,7 @@ class AbstractReferenceSet(object):
         self._id = id_
         self._referenceIdMap = {}
         self._referenceIds = []
+        self._md5checksum = None
 
     def getId(self):
         return self._id
@@ -37,33 +40,66 @@ class AbstractReferenceSet(object):
         """
         return self._referenceIdMap.values()
 
+    def getReferenceIds(self):
+        """
+        Returns the sorted list of the ids of the References in this
+        ReferenceSet.
+        """
+        return self._referenceIds
+
+    def getMd5Checksum(self):
+        """
+        Returns the md5 checksum of this ReferenceSet.
+        """
+        return self._md5checksum
+
+    def getAssemblyId(self):
+        """
+        Returns the assembly id of this ReferenceSet, or None if it is
+        not known.
+        """
+        return None
+
+    def getSourceAccessions(self):
+        """
+        Returns the list of accessions for the source of this ReferenceSet.
+        """
+        return []
+
+    def setBasesCache(self, basesCache):
+        """
+        Enables or disables the bases cache of each of the References in
+        this ReferenceSet.
+        """
+        for reference in self.getReferences():
+            reference.setBasesCache(basesCache)
+
     def toProtocolElement(self):
         """
         Returns the GA4GH protocol representation of this ReferenceSet.
         """
         ret = protocol.ReferenceSet()
-        ret.assemblyId = None
+        ret.assemblyId = self.getAssemblyId()
         ret.description = None
         ret.id = self._id
         ret.isDerived = False
-        ret.md5checksum = self._generateMd5Checksum()
+        ret.md5checksum = self.getMd5Checksum()
         ret.ncbiTaxonId = None
         ret.referenceIds = self._referenceIds
-        ret.sourceAccessions = []
+        ret.sourceAccessions = self.getSourceAccessions()
         ret.sourceURI = None
         return ret
 
     def _generateMd5Checksum(self):
-        return "TODO"
         """
-        references = sorted(
-            self.getReferences(),
-            key=lambda ref: ref.getMd5Checksum())
-        checksums = [ref.getMd5Checksum() for ref in references]
+        Returns the order-independent MD5 checksum of this ReferenceSet:
+        the MD5 of the concatenated, sorted checksums of its References.
+        """
+        checksums = sorted(
+            ref.getMd5Checksum() for ref in self.getReferences())
         checksumsString = ''.join(checksums)
         md5checksum = hashlib.md5(checksumsString).hexdigest()
         return md5checksum
-        """
 
 
 class SimulatedReferenceSet(AbstractReferenceSet):
@@ -81,6 +117,7 @@ class SimulatedReferenceSet(AbstractReferenceSet):
             reference = SimulatedReference(referenceId, referenceSeed)
             self._referenceIdMap[referenceId] = reference
         self._referenceIds = sorted(self._referenceIdMap.keys())
+        self._md5checksum = self._generateMd5Checksum()
 
 
 class HtslibReferenceSet(datamodel.PysamDatamodelMixin, AbstractReferenceSet):
@@ -94,6 +131,7 @@ class HtslibReferenceSet(datamodel.PysamDatamodelMixin, AbstractReferenceSet):
         # fill in the fields like ncbiTaxonId etc?
         self._scanDataFiles(dataDir, ["*.fa.gz"])
         self._referenceIds = sorted(self._referenceIdMap.keys())
+        self._md5checksum = self._generateMd5Checksum()
 
     def _addDataFile(self, path):
         filename = os.path.split(path)[1]
@@ -127,7 +165,7 @@ class AbstractReference(object):
         reference.md5checksum = self.getMd5Checksum()
         reference.name = self.getName()
         reference.ncbiTaxonId = None
-        reference.sourceAccessions = []
+        reference.sourceAccessions = self.getSourceAccessions()
         reference.sourceDivergence = None
         reference.sourceURI = None
         return reference
@@ -138,6 +176,19 @@ class AbstractReference(object):
         """
         return self._md5checksum
 
+    def getSourceAccessions(self):
+        """
+        Returns the list of accessions for the source of this Reference.
+        """
+        return []
+
+    def setBasesCache(self, basesCache):
+        """
+        Enables or disables serving bases from a cache. References that
+        do not support this ignore it.
+        """
+        pass
+
 
 class SimulatedReference(AbstractReference):
     """
@@ -172,6 +223,10 @@ class HtslibReference(datamodel.PysamDatamodelMixin, AbstractReference):
     """
     A reference based on data stored in a file on the file system
     """
+    basesCacheSuffix = ".bases"
+    md5ChecksumSuffix = ".md5.json"
+    chunkSize = 2**20
+
     def __init__(self, id_, dataFile):
         super(HtslibReference, self).__init__(id_)
         self._fastaFilePath = dataFile
@@ -181,8 +236,8 @@ class HtslibReference(datamodel.PysamDatamodelMixin, AbstractReference):
             raise exceptions.NotExactlyOneReferenceException(
                 self._id, numReferences)
         self._refName = fastaFile.references[0]
-        # refData = fastaFile.fetch(self._refName)
-        self._md5checksum = "TODO"  # hashlib.md5(refData).hexdigest()
+        self._md5checksum = self._getMd5Checksum(fastaFile)
+        self._basesCachePath = None
 
     def openFile(self, dataFile):
         return pysam.FastaFile(dataFile)
@@ -193,8 +248,152 @@ class HtslibReference(datamodel.PysamDatamodelMixin, AbstractReference):
         """
         return self._fastaFilePath
 
+    def _getMd5Checksum(self, fastaFile):
+        """
+        Returns the MD5 checksum of the upper-cased sequence of this
+        reference. Hashing a whole chromosome is slow, so we use the
+        checksum stored in a file next to the FASTA file if there is one
+        for the FASTA file as it is now. Otherwise we compute it and store
+        it there for later starts, unless the directory is not writable.
+        """
+        md5checksum = self._readMd5Checksum()
+        if md5checksum is None:
+            md5 = hashlib.md5()
+            length = fastaFile.lengths[0]
+            for chunkStart in range(0, length, self.chunkSize):
+                bases = fastaFile.fetch(
+                    self._refName, chunkStart, chunkStart + self.chunkSize)
+                md5.update(bases.upper())
+            md5checksum = md5.hexdigest()
+            try:
+                self._writeMd5Checksum(md5checksum)
+            except (IOError, OSError):
+                pass
+        return md5checksum
+
+    def getMd5ChecksumPath(self):
+        """
+        Returns the path of the file holding the MD5 checksum of this
+        reference.
+        """
+        return self._fastaFilePath + self.md5ChecksumSuffix
+
+    def _readMd5Checksum(self):
+        # The checksum is keyed by the modification time of the FASTA
+        # file, so that it is not used once the FASTA file changes.
+        try:
+            with open(self.getMd5ChecksumPath()) as checksumFile:
+                checksumDict = json.load(checksumFile)
+            if checksumDict["fastaMtime"] == os.path.getmtime(
+                    self._fastaFilePath):
+                return checksumDict["md5checksum"]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def isMd5ChecksumUpToDate(self):
+        """
+        Returns True if this reference has a stored MD5 checksum for its
+        FASTA file as it is now.
+        """
+        return self._readMd5Checksum() is not None
+
+    def writeMd5Checksum(self):
+        """
+        Stores the MD5 checksum of this reference in a file next to the
+        FASTA file, so that it need not be computed when the server
+        starts.
+        """
+        self._writeMd5Checksum(self._md5checksum)
+
+    def _writeMd5Checksum(self, md5checksum):
+        # Write to a temporary file and move it into place, so that other
+        # server processes starting at the same time never read a partial
+        # file.
+        checksumDict = {
+            "fastaMtime": os.path.getmtime(self._fastaFilePath),
+            "md5checksum": md5checksum}
+        checksumPath = self.getMd5ChecksumPath()
+        temporaryPath = "{}.{}.tmp".format(checksumPath, os.getpid())
+        try:
+            with open(temporaryPath, "w") as checksumFile:
+                json.dump(checksumDict, checksumFile)
+            os.rename(temporaryPath, checksumPath)
+        finally:
+            if os.path.exists(temporaryPath):
+                os.unlink(temporaryPath)
+
+    def getBasesCachePath(self):
+        """
+        Returns the path of the file holding the uncompressed bases of
+        this reference when the bases cache is enabled.
+        """
+        return self._fastaFilePath + self.basesCacheSuffix
+
+    def setBasesCache(self, basesCache):
+        """
+        Enables or disables serving bases from an uncompressed copy of
+        the sequence, held in a file next to the FASTA file and memory
+        mapped, so that getBases no longer decompresses BGZF blocks on
+        each call. The copy is written offline by writeBasesCache, and is
+        only used if it is up to date when the cache is enabled. The maps
+        are opened on demand through the file handle cache, so that their
+        number is bounded along with the other open data files.
+        """
+        self._basesCachePath = None
+        if basesCache and self.isBasesCacheUpToDate():
+            self._basesCachePath = self.getBasesCachePath()
+
+    def isBasesCacheUpToDate(self):
+        """
+        Returns True if this reference has an uncompressed copy of its
+        sequence that is at least as recent as its FASTA file.
+        """
+        basesCachePath = self.getBasesCachePath()
+        return (
+            self.getLength() > 0 and
+            os.path.exists(basesCachePath) and
+            os.path.getmtime(basesCachePath) >=
+            os.path.getmtime(self._fastaFilePath) and
+            os.path.getsize(basesCachePath) == self.getLength())
+
+    def writeBasesCache(self):
+        """
+        Writes the uncompressed copy of the sequence of this reference
+        used by the bases cache. We store one byte per base rather than
+        packing bases, so that the soft-masking and IUPAC codes in the
+        FASTA file are returned exactly as they are by pysam.
+        """
+        # Write the bases in chunks so that we never hold a whole
+        # chromosome in memory, and move the finished file into place
+        # so that running servers never see a partial one.
+        fastaFile = self.getFileHandle(self._fastaFilePath)
+        basesCachePath = self.getBasesCachePath()
+        temporaryPath = "{}.{}.tmp".format(basesCachePath, os.getpid())
+        try:
+            with open(temporaryPath, "wb") as basesCacheFile:
+                for chunkStart in range(
+                        0, self.getLength(), self.chunkSize):
+                    basesCacheFile.write(fastaFile.fetch(
+                        self._refName, chunkStart,
+                        chunkStart + self.chunkSize))
+            os.rename(temporaryPath, basesCachePath)
+        finally:
+            if os.path.exists(temporaryPath):
+                os.unlink(temporaryPath)
+
+    @staticmethod
+    def _openBasesCache(basesCachePath):
+        with open(basesCachePath, "rb") as basesCacheFile:
+            return mmap.mmap(
+                basesCacheFile.fileno(), 0, access=mmap.ACCESS_READ)
+
     def getBases(self, start=None, end=None):
         start, end = self.sanitizeFastaFileFetch(start, end)
+        if self._basesCachePath is not None:
+            basesCache = datamodel.fileHandleCache.getFileHandle(
+                self._basesCachePath, self._openBasesCache)
+            return basesCache[start:end]
         bases = self.getFileHandle(self.getFastaFilePath()).fetch(
                       self._refName, start, end)
         return bases
@@ -6,14 +6,18 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import re
 import datetime
+import math
 import random
+import operator
 
 import pysam
 
 import ga4gh.protocol as protocol
 import ga4gh.exceptions as exceptions
 import ga4gh.datamodel as datamodel
+import ga4gh.metrics as metrics
 
 
 def convertVCFPhaseset(vcfPhaseset):
@@ -47,6 +51,100 @@ def convertVCFGenotype(vcfGenotype, vcfPhaseset):
     return genotype, phaseset
 
 
+class VariantFilter(object):
+    """
+    A filter on the raw records of a VCF file, given as an expression
+    of terms joined by "&&", all of which must hold. Each term compares
+    QUAL, FILTER or INFO/<key> with a value using one of ==, !=, <, <=,
+    > or >=, for example "FILTER==PASS && QUAL>=30 && INFO/AF<0.05".
+    FILTER terms hold if the named filter is (or is not) one of those
+    applied to the record, and may only use == and !=. INFO values are
+    compared as numbers if the given value is a number and as strings
+    otherwise; a term on an INFO field with several values holds if any
+    of them matches. Terms on missing QUAL or INFO values do not hold.
+    """
+    _termPattern = re.compile(
+        r"^\s*(QUAL|FILTER|INFO/[A-Za-z0-9_.]+)\s*(==|!=|<=|>=|<|>)"
+        r"\s*(\S+)\s*$")
+    _operators = {
+        "==": operator.eq, "!=": operator.ne, "<": operator.lt,
+        "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+    def __init__(self, expression):
+        self._expression = expression
+        self._terms = [
+            self._parseTerm(term) for term in expression.split("&&")]
+
+    def getExpression(self):
+        """
+        Returns the expression this filter was created from.
+        """
+        return self._expression
+
+    def _parseTerm(self, term):
+        match = self._termPattern.match(term)
+        if match is None:
+            raise exceptions.BadVariantFilterException(
+                self._expression, "cannot parse '{}'".format(term.strip()))
+        field, operatorName, value = match.groups()
+        compare = self._operators[operatorName]
+        if field == "FILTER":
+            if operatorName not in ("==", "!="):
+                raise exceptions.BadVariantFilterException(
+                    self._expression,
+                    "FILTER can only be compared with == or !=")
+            return lambda record: compare(
+                value in record.filter.keys(), True)
+        try:
+            number = float(value)
+        except ValueError:
+            number = None
+        if field == "QUAL":
+            if number is None:
+                raise exceptions.BadVariantFilterException(
+                    self._expression,
+                    "QUAL must be compared with a number")
+            return lambda record: (
+                record.qual is not None and compare(record.qual, number))
+        key = field[len("INFO/"):]
+        if number is None:
+            if operatorName not in ("==", "!="):
+                raise exceptions.BadVariantFilterException(
+                    self._expression,
+                    "INFO/{} can only be compared with == or != unless "
+                    "the value is a number".format(key))
+            target = value
+            convert = str
+        else:
+            target = number
+            convert = float
+
+        def infoTerm(record):
+            if key not in record.info:
+                return False
+            values = record.info[key]
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            for infoValue in values:
+                try:
+                    if compare(convert(infoValue), target):
+                        return True
+                except (TypeError, ValueError):
+                    pass
+            return False
+        return infoTerm
+
+    def matches(self, record):
+        """
+        Returns True if the specified pysam variant record passes this
+        filter.
+        """
+        for term in self._terms:
+            if not term(record):
+                return False
+        return True
+
+
 class CallSet(object):
     """
     Class representing a CallSet. A CallSet basically represents the
@@ -181,6 +279,11 @@ class SimulatedVariantSet(AbstractVariantSet):
     A variant set that doesn't derive from a data store.
     Used mostly for testing.
     """
+    # The positions of variants are generated blockSize bases at a time,
+    # from a random generator seeded with the block.
+    blockSize = 4096
+    genotypes = [[0, 1], [1, 0], [1, 1]]
+
     def __init__(self, randomSeed, numCalls, variantDensity, variantSetId):
         super(SimulatedVariantSet, self).__init__(variantSetId)
         self._randomSeed = randomSeed
@@ -200,16 +303,55 @@ class SimulatedVariantSet(AbstractVariantSet):
         return ret
 
     def getVariants(self, referenceName, startPosition, endPosition,
-                    variantName=None, callSetIds=None):
+                    variantName=None, callSetIds=None, reopen=False,
+                    variantFilter=None, fields=None):
+        if variantFilter is not None:
+            raise exceptions.NotImplementedException(
+                "Simulated variant sets do not support variant filters")
+        if startPosition is None or endPosition is None:
+            return
         randomNumberGenerator = random.Random()
-        i = startPosition
-        while i < endPosition:
-            randomNumberGenerator.seed(self._randomSeed + i)
-            if randomNumberGenerator.random() < self._variantDensity:
-                variant = self.generateVariant(
-                    self._id, referenceName, i, randomNumberGenerator)
-                yield variant
-            i += 1
+        block = startPosition // self.blockSize
+        while block * self.blockSize < endPosition:
+            for position in self._getBlockPositions(block):
+                if position >= endPosition:
+                    return
+                if position >= startPosition:
+                    randomNumberGenerator.seed(self._randomSeed + position)
+                    variant = self.generateVariant(
+                        self._id, referenceName, position,
+                        randomNumberGenerator)
+                    yield variant
+            block += 1
+
+    def _getBlockPositions(self, block):
+        """
+        Returns the positions of the variants in the specified block of
+        blockSize bases. Each base has a variant with probability
+        variantDensity, independently of the others, so the gaps between
+        variants are geometrically distributed. Drawing the gaps rather
+        than a random number for every base means that the cost depends
+        on the number of variants rather than the length of the region.
+        """
+        blockStart = block * self.blockSize
+        blockEnd = blockStart + self.blockSize
+        if self._variantDensity >= 1:
+            return range(blockStart, blockEnd)
+        if self._variantDensity <= 0:
+            return []
+        randomNumberGenerator = random.Random()
+        # an int seed, as the hash of a tuple differs between builds
+        randomNumberGenerator.seed((self._randomSeed << 32) + block)
+        logNoVariant = math.log(1 - self._variantDensity)
+        positions = []
+        position = blockStart - 1
+        while True:
+            gap = math.log(1 - randomNumberGenerator.random()) / logNoVariant
+            position += 1 + int(gap)
+            if position >= blockEnd:
+                break
+            positions.append(position)
+        return positions
 
     def generateVariant(self, variantSetId, referenceName, position,
                         randomNumberGenerator):
@@ -233,15 +375,14 @@ class SimulatedVariantSet(AbstractVariantSet):
             [base for base in bases if base != ref])
         variant.alternateBases = [alt]
         variant.calls = []
-        for callSet in self.getCallSets():
+        for callSetId in self.getCallSetIds():
             call = protocol.Call()
-            call.callSetId = callSet.getId()
+            call.callSetId = callSetId
             # for now, the genotype is either [0,1], [1,1] or [1,0] with equal
             # probability; probably will want to do something more
             # sophisticated later.
-            randomChoice = randomNumberGenerator.choice(
-                [[0, 1], [1, 0], [1, 1]])
-            call.genotype = randomChoice
+            genotypeIndex = int(randomNumberGenerator.random() * 3)
+            call.genotype = list(self.genotypes[genotypeIndex])
             # TODO What is a reasonable model for generating these likelihoods?
             # Are these log-scaled? Spec does not say.
             call.genotypeLikelihood = [-100, -100, -100]
@@ -374,11 +515,12 @@ class HtslibVariantSet(datamodel.PysamDatamodelMixin, AbstractVariantSet):
                 call.info[key] = _encodeValue(value)
         return call
 
-    def convertVariant(self, record, callSetIds):
+    def convertVariant(self, record, callSetIds, fields=None):
         """
         Converts the specified pysam variant record into a GA4GH Variant
         object. Only calls for the specified list of callSetIds will
-        be included.
+        be included. If fields is not None, the info and calls are only
+        filled in if they are named in it.
         """
         variant = self._createGaVariant()
         # N.B. record.pos is 1-based
@@ -396,15 +538,18 @@ class HtslibVariantSet(datamodel.PysamDatamodelMixin, AbstractVariantSet):
             variant.alternateBases = list(record.alts)
         # record.filter and record.qual are also available, when supported
         # by GAVariant.
-        for key, value in record.info.iteritems():
-            if value is not None:
-                variant.info[key] = _encodeValue(value)
+        if fields is None or "info" in fields:
+            for key, value in record.info.iteritems():
+                if value is not None:
+                    variant.info[key] = _encodeValue(value)
+        variant.calls = []
+        if fields is not None and "calls" not in fields:
+            return variant
 
         # NOTE: THE LABELED LINES SHOULD BE REMOVED ONCE PYSAM SUPPORTS
         # phaseset
 
         sampleData = record.__str__().split()[9:]  # REMOVAL
-        variant.calls = []
         sampleIterator = 0  # REMOVAL
         for name, call in record.samples.iteritems():
             if self.getCallSetId(name) in callSetIds:
@@ -416,10 +561,17 @@ class HtslibVariantSet(datamodel.PysamDatamodelMixin, AbstractVariantSet):
         return variant
 
     def getVariants(self, referenceName, startPosition, endPosition,
-                    variantName=None, callSetIds=None):
+                    variantName=None, callSetIds=None, reopen=False,
+                    variantFilter=None, fields=None):
         """
         Returns an iterator over the specified variants. The parameters
         correspond to the attributes of a GASearchVariantsRequest object.
+        If reopen is True, the iterator reads from its own copy of the
+        file handle, and so remains valid while the cached handle is used
+        by other searches. If a VariantFilter is given, only the records
+        that pass it are converted and returned. If fields is not None,
+        only the named fields of the variants need to be filled in; see
+        convertVariant.
         """
         if variantName is not None:
             raise exceptions.NotImplementedException(
@@ -446,9 +598,15 @@ class HtslibVariantSet(datamodel.PysamDatamodelMixin, AbstractVariantSet):
                 self.sanitizeVariantFileFetch(
                     referenceName, startPosition, endPosition)
             cursor = self.getFileHandle(varFileName).fetch(
-                referenceName, startPosition, endPosition)
-            for record in cursor:
-                yield self.convertVariant(record, callSetIds)
+                referenceName, startPosition, endPosition, reopen=reopen)
+            if variantFilter is not None:
+                cursor = (
+                    record for record in cursor
+                    if variantFilter.matches(record))
+            for variant in metrics.registry.timeRecords(
+                    cursor, lambda record: self.convertVariant(
+                        record, callSetIds, fields)):
+                yield variant
 
     def getMetadata(self):
         return self._metadata
@@ -114,6 +114,37 @@ class BadRequestIntegerException(BadRequestException):
                 attrName, intString)
 
 
+class RequestArgumentMissingException(BadRequestException):
+    def __init__(self, attrName):
+        self.message = "Required argument '{}' is missing".format(attrName)
+
+
+class BadRangeException(BadRequestException):
+    def __init__(self, start, end):
+        self.message = (
+            "Invalid range: start ({}) must be non-negative and "
+            "less than end ({})".format(start, end))
+
+
+class BadBinSizeException(BadRequestException):
+    def __init__(self, binSize, maxBins):
+        self.message = (
+            "Bin size '{}' is invalid; it must be positive and result "
+            "in at most {} bins".format(binSize, maxBins))
+
+
+class BadVariantFilterException(BadRequestException):
+    def __init__(self, expression, reason):
+        self.message = "Invalid variant filter '{}': {}".format(
+            expression, reason)
+
+
+class UnknownFieldsException(BadRequestException):
+    def __init__(self, fieldNames, className):
+        self.message = "Unknown fields '{}' requested for {}".format(
+            fieldNames, className)
+
+
 class BadPageSizeException(BadRequestException):
     def __init__(self, pageSize):
         self.message = "Request page size '{}' is invalid".format(pageSize)
@@ -141,6 +172,16 @@ class RequestValidationFailureException(BadRequestException):
             jsonDict, requestClass, validator.getInvalidFields(jsonDict))
 
 
+class BadProfileRequestException(BadRequestException):
+    def __init__(self, message):
+        self.message = message
+
+
+class ProfilerBusyException(RuntimeException):
+    httpStatus = 409
+    message = "A profiling session is already in progress"
+
+
 class BadReadsSearchRequestBothRefs(BadRequestException):
     message = "only one of referenceId and referenceName can be specified"
 
@@ -197,6 +238,16 @@ class ReadGroupNotFoundException(ObjectNotFoundException):
         self.message = "readGroupId '{}' not found".format(readGroupId)
 
 
+class ReferenceSetNotFoundException(ObjectNotFoundException):
+    def __init__(self, referenceSetId):
+        self.message = "referenceSetId '{}' not found".format(referenceSetId)
+
+
+class ReferenceNameNotFoundException(ObjectNotFoundException):
+    def __init__(self, referenceName):
+        self.message = "referenceName '{}' not found".format(referenceName)
+
+
 class ObjectWithIdNotFoundException(ObjectNotFoundException):
     def __init__(self, objectId):
         self.message = "No object of this type exists with id '{}'".format(
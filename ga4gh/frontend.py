@@ -8,6 +8,10 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import os
+import hmac
+import json
+import time
+import logging
 import datetime
 import socket
 import urlparse
@@ -27,6 +31,8 @@ import ga4gh.backend as backend
 import ga4gh.datamodel as datamodel
 import ga4gh.protocol as protocol
 import ga4gh.exceptions as exceptions
+import ga4gh.metrics as metrics
+import ga4gh.profiler as profiler
 
 
 MIMETYPE = "application/json"
@@ -127,7 +133,10 @@ class ServerStatus(object):
         # TODO what other config keys are appropriate to export here?
         keys = [
             'DEBUG', 'REQUEST_VALIDATION', 'RESPONSE_VALIDATION',
-            'DEFAULT_PAGE_SIZE', 'MAX_RESPONSE_LENGTH',
+            'RESPONSE_VALIDATION_SAMPLE_RATE', 'DEFAULT_PAGE_SIZE',
+            'MAX_RESPONSE_LENGTH', 'MAX_COVERAGE_BINS',
+            'REFERENCE_BASES_CACHE', 'CURSOR_CACHE_SIZE',
+            'SEARCH_PAGE_CACHE_SIZE',
         ]
         return [(k, app.config[k]) for k in keys]
 
@@ -224,18 +233,40 @@ def configure(configFile=None, baseConfig="ProductionConfig",
             "SIMULATED_BACKEND_NUM_REFERENCES_PER_REFERENCE_SET"]
         numAlignments = app.config[
             "SIMULATED_BACKEND_NUM_ALIGNMENTS_PER_READ_GROUP"]
+        readLength = app.config["SIMULATED_BACKEND_READ_LENGTH"]
+        numIndels = app.config["SIMULATED_BACKEND_NUM_INDELS_PER_READ"]
+        numTags = app.config["SIMULATED_BACKEND_NUM_TAGS_PER_READ"]
         theBackend = backend.SimulatedBackend(
             randomSeed, numCalls, variantDensity, numVariantSets,
-            numReferenceSets, numReferencesPerReferenceSet, numAlignments)
+            numReferenceSets, numReferencesPerReferenceSet, numAlignments,
+            readLength, numIndels, numTags)
     elif dataSource == "__EMPTY__":
         theBackend = backend.EmptyBackend()
     else:
         theBackend = backend.FileSystemBackend(dataSource)
     theBackend.setRequestValidation(app.config["REQUEST_VALIDATION"])
     theBackend.setResponseValidation(app.config["RESPONSE_VALIDATION"])
+    theBackend.setResponseValidationSampleRate(
+        app.config["RESPONSE_VALIDATION_SAMPLE_RATE"])
     theBackend.setDefaultPageSize(app.config["DEFAULT_PAGE_SIZE"])
     theBackend.setMaxResponseLength(app.config["MAX_RESPONSE_LENGTH"])
+    theBackend.setMaxCoverageBins(app.config["MAX_COVERAGE_BINS"])
+    theBackend.setReferenceBasesCache(app.config["REFERENCE_BASES_CACHE"])
+    theBackend.setReadFilter(
+        app.config["READ_FILTER_EXCLUDED_FLAGS"],
+        app.config["READ_FILTER_MIN_MAPPING_QUALITY"])
+    theBackend.setCursorCacheSize(app.config["CURSOR_CACHE_SIZE"])
+    theBackend.setCursorCacheTimeout(app.config["CURSOR_CACHE_TIMEOUT"])
+    theBackend.setPrefetchEndpoints(app.config["PREFETCH_ENDPOINTS"])
+    theBackend.setPrefetchMemoryBudget(app.config["PREFETCH_MEMORY_BUDGET"])
+    theBackend.setSearchPageCacheSize(app.config["SEARCH_PAGE_CACHE_SIZE"])
+    theBackend.setSingleFlight(
+        app.config["SINGLE_FLIGHT"],
+        app.config["SINGLE_FLIGHT_LOCK_DIRECTORY"])
     app.backend = theBackend
+    app.slowQueryThreshold = app.config["SLOW_QUERY_THRESHOLD"]
+    app.slowQueryLogger = getSlowQueryLogger(app.config["SLOW_QUERY_LOG"])
+    app.profilingSession = None
     app.secret_key = os.urandom(SECRET_KEY_LENGTH)
     app.oidcClient = None
     app.tokenMap = None
@@ -284,29 +315,105 @@ def configure(configFile=None, baseConfig="ProductionConfig",
             app.oidcClient.store_registration_info(response)
 
 
+def getSlowQueryLogger(logFile=None):
+    """
+    Returns the logger for the slow query log, which writes each
+    message on a line of the specified file, or standard error if
+    logFile is None.
+    """
+    logger = logging.getLogger("ga4gh.slowqueries")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    if logFile is None:
+        handler = logging.StreamHandler()
+    else:
+        handler = logging.FileHandler(logFile)
+    logger.addHandler(handler)
+    return logger
+
+
+def logSlowQuery(request, requestStr, requestMetrics, numBytes):
+    """
+    Writes the specified search request to the slow query log if it took
+    longer than the configured threshold to answer.
+    """
+    elapsed = requestMetrics.getElapsedSeconds()
+    if app.slowQueryThreshold is None or elapsed < app.slowQueryThreshold:
+        return
+    try:
+        normalizedRequest = json.dumps(json.loads(requestStr), sort_keys=True)
+    except ValueError:
+        normalizedRequest = requestStr
+    # URL arguments such as filter and fields change the work done, so
+    # they are logged along with the request
+    entry = {
+        "path": request.path,
+        "args": sorted(request.args.items(multi=True)),
+        "request": normalizedRequest,
+        "seconds": elapsed,
+        "recordsScanned": requestMetrics.getCounter(metrics.RECORDS_SCANNED),
+        "bytesReturned": numBytes,
+        "stageSeconds": requestMetrics.stageSeconds,
+    }
+    app.slowQueryLogger.info(json.dumps(entry, sort_keys=True))
+
+
+def callEndpoint(endpoint, *args):
+    """
+    Returns endpoint(*args), profiling the call if a profiling session
+    is active.
+    """
+    if app.profilingSession is None:
+        return endpoint(*args)
+    return app.profilingSession.profileRequest(endpoint, *args)
+
+
 def getFlaskResponse(responseString, httpStatus=200):
     """
     Returns a Flask response object for the specified data and HTTP status.
+    The time from creating the response until the server has finished
+    writing it to the client is added to the response write stage.
     """
-    return flask.Response(responseString, status=httpStatus, mimetype=MIMETYPE)
+    start = time.time()
+    response = flask.Response(
+        responseString, status=httpStatus, mimetype=MIMETYPE)
+    metrics.registry.increment(metrics.BYTES_OUT, response.content_length)
+
+    def onClose():
+        metrics.registry.addTime(metrics.RESPONSE_WRITE, time.time() - start)
+    response.call_on_close(onClose)
+    return response
 
 
 def handleHttpPost(request, endpoint):
     """
     Handles the specified HTTP POST request, which maps to the specified
-    protocol handler endpoint and protocol request class.
+    protocol handler endpoint and protocol request class. The response
+    carries a Server-Timing header with the time spent in each stage of
+    answering the request.
     """
     if request.mimetype != MIMETYPE:
         raise exceptions.UnsupportedMediaTypeException()
-    responseStr = endpoint(request.get_data())
-    return getFlaskResponse(responseStr)
+    requestStr = request.get_data()
+    requestMetrics = metrics.registry.startRequest()
+    try:
+        responseStr = callEndpoint(endpoint, requestStr)
+    finally:
+        metrics.registry.endRequest()
+    response = getFlaskResponse(responseStr)
+    response.headers["Server-Timing"] = requestMetrics.getServerTimingHeader()
+    logSlowQuery(request, requestStr, requestMetrics, response.content_length)
+    return response
 
 
 def handleList(id_, endpoint, request):
     """
     Handles the specified HTTP GET request, mapping to a list request
     """
-    responseStr = endpoint(id_, request.args)
+    responseStr = callEndpoint(endpoint, id_, request.args)
     return getFlaskResponse(responseStr)
 
 
@@ -315,7 +422,7 @@ def handleHttpGet(id_, endpoint):
     Handles the specified HTTP GET request, which maps to the specified
     protocol handler endpoint and protocol request class
     """
-    responseStr = endpoint(id_)
+    responseStr = callEndpoint(endpoint, id_)
     return getFlaskResponse(responseStr)
 
 
@@ -489,6 +596,20 @@ def indexRedirect(version):
         raise exceptions.PathNotFoundException()
 
 
+@app.route('/metrics')
+def getMetrics():
+    """
+    Returns the timers and counters for this server process in the
+    Prometheus text format. Unless they are public, only clients with
+    the admin key may read them.
+    """
+    if not app.config["PUBLIC_METRICS"]:
+        checkAdminKey(flask.request)
+    return flask.Response(
+        metrics.registry.toPrometheusText(),
+        mimetype=metrics.PROMETHEUS_MIMETYPE)
+
+
 @DisplayedRoute('/<version>/references/<id>')
 def getReference(version, id):
     return handleFlaskGetRequest(
@@ -507,6 +628,12 @@ def listReferenceBases(version, id):
         version, id, flask.request, app.backend.listReferenceBases)
 
 
+@DisplayedRoute('/<version>/readgroups/<id>/coverage')
+def getReadGroupCoverage(version, id):
+    return handleFlaskListRequest(
+        version, id, flask.request, app.backend.getReadGroupCoverage)
+
+
 @DisplayedRoute('/<version>/callsets/search', postMethod=True)
 def searchCallSets(version):
     return handleFlaskPostRequest(
@@ -522,7 +649,8 @@ def searchReadGroupSets(version):
 @DisplayedRoute('/<version>/reads/search', postMethod=True)
 def searchReads(version):
     return handleFlaskPostRequest(
-        version, flask.request, app.backend.searchReads)
+        version, flask.request, functools.partial(
+            app.backend.searchReads, requestArgs=flask.request.args))
 
 
 @DisplayedRoute('/<version>/referencesets/search', postMethod=True)
@@ -546,7 +674,8 @@ def searchVariantSets(version):
 @DisplayedRoute('/<version>/variants/search', postMethod=True)
 def searchVariants(version):
     return handleFlaskPostRequest(
-        version, flask.request, app.backend.searchVariants)
+        version, flask.request, functools.partial(
+            app.backend.searchVariants, requestArgs=flask.request.args))
 
 
 @DisplayedRoute('/<version>/datasets/search', postMethod=True)
@@ -744,6 +873,79 @@ def oidcCallback():
     return response
 
 
+def checkAdminKey(request):
+    """
+    Raises an exception unless the specified request carries the admin
+    key in its Authorization header.
+    """
+    adminKey = app.config["ADMIN_KEY"]
+    if adminKey is None:
+        raise exceptions.NotImplementedException(
+            "Admin endpoints are not enabled")
+    # compare_digest only accepts ASCII unicode strings, so we compare
+    # the UTF-8 encodings of the header and the expected value
+    authorization = request.headers.get("Authorization", "")
+    expected = "Bearer {}".format(adminKey)
+    if not hmac.compare_digest(
+            authorization.encode("utf-8"), expected.encode("utf-8")):
+        raise exceptions.NotAuthenticatedException()
+
+
+def startProfiling(requestArgs):
+    """
+    Starts a profiling session as described by the specified request
+    arguments, and returns it.
+    """
+    session = app.profilingSession
+    if session is not None and not session.isFinished():
+        raise exceptions.ProfilerBusyException()
+    try:
+        numRequests = None
+        if "requests" in requestArgs:
+            numRequests = int(requestArgs["requests"])
+        seconds = float(requestArgs.get("seconds", 60))
+    except ValueError:
+        raise exceptions.BadProfileRequestException(
+            "requests must be an integer and seconds a number")
+    if (numRequests is not None and numRequests <= 0) or seconds <= 0:
+        raise exceptions.BadProfileRequestException(
+            "requests and seconds must be positive")
+    outputFormat = requestArgs.get("format", profiler.TEXT)
+    if outputFormat not in profiler.FORMATS:
+        raise exceptions.BadProfileRequestException(
+            "format must be one of {}".format(", ".join(profiler.FORMATS)))
+    session = profiler.ProfilingSession(numRequests, seconds, outputFormat)
+    app.profilingSession = session
+    return session
+
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def adminProfile():
+    """
+    Starts profiling the requests handled by this process on a POST, and
+    returns the profile on a GET once profiling is over. While it is not
+    yet over, or on starting, the state of the session is returned.
+    """
+    checkAdminKey(flask.request)
+    session = app.profilingSession
+    if flask.request.method == "POST":
+        session = startProfiling(flask.request.args)
+    elif session is None:
+        raise exceptions.BadProfileRequestException(
+            "No profiling session has been started")
+    if flask.request.method == "GET" and session.isFinished():
+        mimetype = "text/plain"
+        if session.getOutputFormat() == profiler.PSTATS:
+            mimetype = "application/octet-stream"
+        return flask.Response(session.getOutput(), mimetype=mimetype)
+    status = {
+        "format": session.getOutputFormat(),
+        "requestsProfiled": session.getNumRequests(),
+        "finished": session.isFinished(),
+    }
+    return getFlaskResponse(json.dumps(status))
+
+
 # The below methods ensure that JSON is returned for various errors
 # instead of the default, html
 
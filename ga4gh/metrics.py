@@ -0,0 +1,300 @@
+"""
+Timers and counters describing the work done by the server, rendered
+in the Prometheus text exposition format.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+
+
+JSON_PARSE = "jsonParse"
+VALIDATION = "validation"
+CONTAINER_LOOKUP = "containerLookup"
+HTSLIB_FETCH = "htslibFetch"
+RECORD_CONVERSION = "recordConversion"
+SERIALIZATION = "serialization"
+RESPONSE_WRITE = "responseWrite"
+# The whole of the background computation of each prefetched page. The
+# stages timed within it are also added to their own totals.
+PREFETCH = "prefetch"
+
+STAGES = [
+    JSON_PARSE, VALIDATION, CONTAINER_LOOKUP, HTSLIB_FETCH,
+    RECORD_CONVERSION, SERIALIZATION, RESPONSE_WRITE, PREFETCH]
+
+RECORDS_SCANNED = "ga4gh_records_scanned_total"
+RECORDS_RETURNED = "ga4gh_records_returned_total"
+BYTES_OUT = "ga4gh_response_bytes_total"
+FILE_HANDLE_CACHE_HITS = "ga4gh_file_handle_cache_hits_total"
+FILE_HANDLE_CACHE_MISSES = "ga4gh_file_handle_cache_misses_total"
+SEARCH_PAGE_CACHE_HITS = "ga4gh_search_page_cache_hits_total"
+SEARCH_PAGE_CACHE_MISSES = "ga4gh_search_page_cache_misses_total"
+SEARCH_PAGE_CACHE_EVICTIONS = "ga4gh_search_page_cache_evictions_total"
+
+COUNTERS = [
+    (RECORDS_SCANNED, "Records read from data files."),
+    (RECORDS_RETURNED, "Records written to search responses."),
+    (BYTES_OUT, "Bytes of response bodies sent to clients."),
+    (FILE_HANDLE_CACHE_HITS, "Data files found open in the cache."),
+    (FILE_HANDLE_CACHE_MISSES, "Data files opened on a cache miss."),
+    (SEARCH_PAGE_CACHE_HITS, "Search pages answered from the cache."),
+    (SEARCH_PAGE_CACHE_MISSES, "Search pages not found in the cache."),
+    (SEARCH_PAGE_CACHE_EVICTIONS,
+     "Search pages discarded to keep the cache within its size."),
+]
+
+PROMETHEUS_MIMETYPE = "text/plain; version=0.0.4"
+
+
+class StageTimer(object):
+    """
+    A context manager adding the time spent within it to a stage of a
+    MetricsRegistry. Time spent in stages timed within the block is
+    attributed to those stages rather than to this one.
+    """
+    def __init__(self, registry, stage):
+        self._registry = registry
+        self._stage = stage
+        self._start = None
+
+    def __enter__(self):
+        self._registry._enterStage()
+        self._start = time.time()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        elapsed = time.time() - self._start
+        nestedTime = self._registry._exitStage(elapsed)
+        self._registry.addTime(self._stage, elapsed - nestedTime)
+
+
+class RequestMetrics(object):
+    """
+    The time spent in each stage, and the counters, for a single request.
+    """
+    def __init__(self):
+        self.startTime = time.time()
+        self.stageSeconds = {}
+        self.counters = {}
+
+    def getElapsedSeconds(self):
+        """
+        Returns the number of seconds since the request started.
+        """
+        return time.time() - self.startTime
+
+    def getCounter(self, name):
+        """
+        Returns the value of the specified counter for this request.
+        """
+        return self.counters.get(name, 0)
+
+    def getServerTimingHeader(self):
+        """
+        Returns the value of a Server-Timing HTTP header listing the
+        milliseconds spent in each stage of this request so far.
+        """
+        entries = [
+            "{};dur={:.3f}".format(stage, self.stageSeconds[stage] * 1000)
+            for stage in STAGES if stage in self.stageSeconds]
+        entries.append("total;dur={:.3f}".format(
+            self.getElapsedSeconds() * 1000))
+        return ", ".join(entries)
+
+    def _addTime(self, stage, seconds):
+        self.stageSeconds[stage] = self.stageSeconds.get(stage, 0.0) + seconds
+
+    def _increment(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+
+class MetricsRegistry(object):
+    """
+    Accumulates the total time spent in, and number of observations of,
+    each stage of request handling, along with a set of counters. The
+    registry is shared by all threads in a process. Times and counters
+    are also added to the RequestMetrics of the request the thread
+    adding them is handling, if there is one.
+    """
+    flushInterval = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """
+        Sets all timers and counters back to zero.
+        """
+        with self._lock:
+            self._stageSeconds = dict((stage, 0.0) for stage in STAGES)
+            self._stageCounts = dict((stage, 0) for stage in STAGES)
+            self._counters = dict((name, 0) for name, _ in COUNTERS)
+
+    def startRequest(self):
+        """
+        Returns a new RequestMetrics for the request handled by this
+        thread, to which times and counters are added until endRequest
+        is called.
+        """
+        requestMetrics = RequestMetrics()
+        self._local.request = requestMetrics
+        return requestMetrics
+
+    def endRequest(self):
+        """
+        Stops adding times and counters to this thread's RequestMetrics.
+        """
+        self._local.request = None
+
+    def timer(self, stage):
+        """
+        Returns a context manager timing the specified stage.
+        """
+        return StageTimer(self, stage)
+
+    def addTime(self, stage, seconds, count=1):
+        """
+        Adds the specified number of seconds, spent on count observations,
+        to the specified stage.
+        """
+        with self._lock:
+            self._stageSeconds[stage] = (
+                self._stageSeconds.get(stage, 0.0) + seconds)
+            self._stageCounts[stage] = self._stageCounts.get(stage, 0) + count
+        requestMetrics = getattr(self._local, "request", None)
+        if requestMetrics is not None:
+            requestMetrics._addTime(stage, seconds)
+
+    def increment(self, name, value=1):
+        """
+        Adds the specified value to the specified counter.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        requestMetrics = getattr(self._local, "request", None)
+        if requestMetrics is not None:
+            requestMetrics._increment(name, value)
+
+    def getStageSeconds(self, stage):
+        """
+        Returns the total number of seconds spent in the specified stage.
+        """
+        return self._stageSeconds.get(stage, 0.0)
+
+    def getStageCount(self, stage):
+        """
+        Returns the number of observations of the specified stage.
+        """
+        return self._stageCounts.get(stage, 0)
+
+    def getCounter(self, name):
+        """
+        Returns the value of the specified counter.
+        """
+        return self._counters.get(name, 0)
+
+    def timeRecords(self, records, convert):
+        """
+        Returns an iterator over convert(record) for each of the specified
+        records, which are read from a data file. Time spent reading the
+        records is added to the htslib fetch stage, time spent in convert
+        to the record conversion stage, and each record to the records
+        scanned counter. The totals are added every flushInterval records
+        and when the iterator finishes.
+        """
+        iterator = iter(records)
+        fetchTime = 0.0
+        conversionTime = 0.0
+        numRecords = 0
+        try:
+            while True:
+                start = time.time()
+                try:
+                    record = next(iterator)
+                except StopIteration:
+                    fetchTime += time.time() - start
+                    break
+                fetched = time.time()
+                value = convert(record)
+                converted = time.time()
+                fetchTime += fetched - start
+                conversionTime += converted - fetched
+                numRecords += 1
+                self._addNestedTime(converted - start)
+                if numRecords == self.flushInterval:
+                    self._addRecordTimes(
+                        fetchTime, conversionTime, numRecords)
+                    fetchTime = conversionTime = 0.0
+                    numRecords = 0
+                yield value
+        finally:
+            self._addRecordTimes(fetchTime, conversionTime, numRecords)
+
+    def _addRecordTimes(self, fetchTime, conversionTime, numRecords):
+        with self._lock:
+            self._stageSeconds[HTSLIB_FETCH] += fetchTime
+            self._stageCounts[HTSLIB_FETCH] += numRecords
+            self._stageSeconds[RECORD_CONVERSION] += conversionTime
+            self._stageCounts[RECORD_CONVERSION] += numRecords
+            self._counters[RECORDS_SCANNED] += numRecords
+        requestMetrics = getattr(self._local, "request", None)
+        if requestMetrics is not None:
+            requestMetrics._addTime(HTSLIB_FETCH, fetchTime)
+            requestMetrics._addTime(RECORD_CONVERSION, conversionTime)
+            requestMetrics._increment(RECORDS_SCANNED, numRecords)
+
+    def _getNestedTimes(self):
+        # The stack of time spent in nested stages for each of the
+        # stages this thread is currently timing.
+        nestedTimes = getattr(self._local, "nestedTimes", None)
+        if nestedTimes is None:
+            nestedTimes = self._local.nestedTimes = []
+        return nestedTimes
+
+    def _enterStage(self):
+        self._getNestedTimes().append(0.0)
+
+    def _exitStage(self, elapsed):
+        nestedTimes = self._getNestedTimes()
+        nestedTime = nestedTimes.pop()
+        if len(nestedTimes) > 0:
+            nestedTimes[-1] += elapsed
+        return nestedTime
+
+    def _addNestedTime(self, seconds):
+        nestedTimes = self._getNestedTimes()
+        if len(nestedTimes) > 0:
+            nestedTimes[-1] += seconds
+
+    def toPrometheusText(self):
+        """
+        Returns the timers and counters in the Prometheus text format.
+        """
+        with self._lock:
+            stageSeconds = dict(self._stageSeconds)
+            stageCounts = dict(self._stageCounts)
+            counters = dict(self._counters)
+        lines = [
+            "# HELP ga4gh_stage_seconds Time spent in each stage of "
+            "handling requests.",
+            "# TYPE ga4gh_stage_seconds summary",
+        ]
+        for stage in sorted(stageSeconds.keys()):
+            lines.append('ga4gh_stage_seconds_sum{{stage="{}"}} {!r}'.format(
+                stage, stageSeconds[stage]))
+            lines.append('ga4gh_stage_seconds_count{{stage="{}"}} {}'.format(
+                stage, stageCounts[stage]))
+        for name, description in COUNTERS:
+            lines.append("# HELP {} {}".format(name, description))
+            lines.append("# TYPE {} counter".format(name))
+            lines.append("{} {}".format(name, counters[name]))
+        return "\n".join(lines) + "\n"
+
+
+# The timers and counters for this process
+registry = MetricsRegistry()
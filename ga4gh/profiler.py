@@ -0,0 +1,186 @@
+"""
+Profiling of the requests handled by a running server.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import sys
+import time
+import pstats
+import marshal
+import cProfile
+import threading
+import collections
+from cStringIO import StringIO
+
+
+PSTATS = "pstats"
+TEXT = "text"
+COLLAPSED = "collapsed"
+
+FORMATS = [PSTATS, TEXT, COLLAPSED]
+
+
+def getCollapsedStack(frame):
+    """
+    Returns the stack ending at the specified frame as a single line of
+    "file:function" entries separated by semicolons, outermost first, as
+    used by flame graph tools.
+    """
+    entries = []
+    while frame is not None:
+        code = frame.f_code
+        entries.append("{}:{}".format(
+            os.path.basename(code.co_filename), code.co_name))
+        frame = frame.f_back
+    entries.reverse()
+    return ";".join(entries)
+
+
+class ProfilingSession(object):
+    """
+    Profiles the requests that start while the session is active, which
+    is until numRequests requests have started or the specified number
+    of seconds has passed, whichever comes first. For the pstats and
+    text formats each request is profiled with cProfile. For the
+    collapsed format, the stacks of the threads handling requests are
+    sampled every sampleInterval seconds, which has far less overhead.
+    """
+    sampleInterval = 0.005
+
+    def __init__(self, numRequests=None, seconds=60, outputFormat=TEXT):
+        if outputFormat not in FORMATS:
+            raise ValueError("Unknown profile format '{}'".format(
+                outputFormat))
+        self._numRequests = numRequests
+        self._endTime = time.time() + seconds
+        self._outputFormat = outputFormat
+        self._lock = threading.Lock()
+        self._numStarted = 0
+        self._numFinished = 0
+        self._stats = None
+        self._stackCounts = collections.Counter()
+        self._threadIds = collections.Counter()
+        if outputFormat == COLLAPSED:
+            sampler = threading.Thread(target=self._sample)
+            sampler.daemon = True
+            sampler.start()
+
+    def getOutputFormat(self):
+        """
+        Returns the format of the output of this session.
+        """
+        return self._outputFormat
+
+    def getNumRequests(self):
+        """
+        Returns the number of requests profiled so far.
+        """
+        return self._numStarted
+
+    def isActive(self):
+        """
+        Returns True while requests that start are profiled.
+        """
+        with self._lock:
+            return self._isActive()
+
+    def isFinished(self):
+        """
+        Returns True once the session is no longer active and all of the
+        requests it profiled have finished.
+        """
+        with self._lock:
+            return (
+                not self._isActive() and
+                self._numFinished == self._numStarted)
+
+    def _isActive(self):
+        if (self._numRequests is not None and
+                self._numStarted >= self._numRequests):
+            return False
+        return time.time() < self._endTime
+
+    def profileRequest(self, function, *args):
+        """
+        Returns function(*args), profiling the call if the session is
+        active.
+        """
+        with self._lock:
+            active = self._isActive()
+            if active:
+                self._numStarted += 1
+        if not active:
+            return function(*args)
+        try:
+            if self._outputFormat == COLLAPSED:
+                return self._sampleCall(function, *args)
+            else:
+                return self._profileCall(function, *args)
+        finally:
+            with self._lock:
+                self._numFinished += 1
+
+    def _profileCall(self, function, *args):
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, *args)
+        finally:
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+
+    def _sampleCall(self, function, *args):
+        threadId = threading.current_thread().ident
+        with self._lock:
+            self._threadIds[threadId] += 1
+        try:
+            return function(*args)
+        finally:
+            with self._lock:
+                self._threadIds[threadId] -= 1
+                if self._threadIds[threadId] == 0:
+                    del self._threadIds[threadId]
+
+    def _sample(self):
+        while not self.isFinished():
+            with self._lock:
+                threadIds = list(self._threadIds)
+            frames = sys._current_frames()
+            stacks = [
+                getCollapsedStack(frames[threadId])
+                for threadId in threadIds if threadId in frames]
+            with self._lock:
+                self._stackCounts.update(stacks)
+            time.sleep(self.sampleInterval)
+
+    def getOutput(self):
+        """
+        Returns the profile of the requests profiled so far. For the
+        pstats format this is the marshalled statistics, as written by
+        cProfile and read by pstats.Stats. For the text format it is the
+        pstats report sorted by cumulative time, and for the collapsed
+        format it is one line per distinct stack giving the number of
+        times it was sampled.
+        """
+        with self._lock:
+            if self._outputFormat == PSTATS:
+                stats = {}
+                if self._stats is not None:
+                    stats = self._stats.stats
+                return marshal.dumps(stats)
+            elif self._outputFormat == TEXT:
+                if self._stats is None:
+                    return "No requests were profiled\n"
+                stream = StringIO()
+                self._stats.stream = stream
+                self._stats.sort_stats("cumulative").print_stats()
+                return stream.getvalue()
+            else:
+                return "".join(
+                    "{} {}\n".format(stack, count)
+                    for stack, count in sorted(self._stackCounts.items()))
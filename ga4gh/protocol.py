@@ -9,10 +9,10 @@ import sys
 import json
 import inspect
 import datetime
-import itertools
 from cStringIO import StringIO
 
 import avro.io
+import avro.schema
 
 
 def convertDatetime(t):
@@ -34,16 +34,24 @@ class SearchResponseBuilder(object):
     we are building responses, as we write the JSON representation
     of ProtocolElements directly to a buffer.
     """
-    def __init__(self, responseClass, pageSize, maxResponseLength):
+    def __init__(
+            self, responseClass, pageSize, maxResponseLength,
+            valueValidator=None, fields=None):
         """
         Allocates a new SearchResponseBuilder for the specified
         subclass of SearchResponse, with the specified
         user-requested pageSize and the system mandated
         maxResponseLength (in bytes). The maxResponseLength is an
         approximate limit on the overall length of the JSON
-        response.
+        response. If valueValidator is not None, it is called with
+        each protocolElement before it is added to the value list,
+        and is expected to raise an exception if the element is not
+        valid. If fields is not None, only the fields of the values
+        with these names are written to the response.
         """
         self._responseClass = responseClass
+        self._valueValidator = valueValidator
+        self._fields = fields
         self._pageSize = pageSize
         self._maxResponseLength = maxResponseLength
         self._valueListBuffer = StringIO()
@@ -67,6 +75,12 @@ class SearchResponseBuilder(object):
         """
         return self._maxResponseLength
 
+    def getNumValues(self):
+        """
+        Returns the number of values added to the value list so far.
+        """
+        return self._numElements
+
     def getNextPageToken(self):
         """
         Returns the value of the nextPageToken for this
@@ -85,10 +99,18 @@ class SearchResponseBuilder(object):
         Appends the specified protocolElement to the value list for this
         response.
         """
+        if self._valueValidator is not None:
+            self._valueValidator(protocolElement)
         if self._numElements > 0:
             self._valueListBuffer.write(", ")
         self._numElements += 1
-        self._valueListBuffer.write(protocolElement.toJsonString())
+        if self._fields is None:
+            jsonString = protocolElement.toJsonString()
+        else:
+            values = {
+                name: getattr(protocolElement, name) for name in self._fields}
+            jsonString = json.dumps(values, cls=ProtocolElementEncoder)
+        self._valueListBuffer.write(jsonString)
 
     def isFull(self):
         """
@@ -126,11 +148,26 @@ class ProtocolElementEncoder(json.JSONEncoder):
         return ret
 
 
+class LazySchema(object):
+    """
+    A descriptor for the schema attribute of the generated protocol
+    classes. The avro schema is parsed from the _schemaSource of the
+    class the first time it is accessed, rather than when the class is
+    defined, and then replaces the descriptor on the class.
+    """
+    def __get__(self, instance, owner):
+        schema = avro.schema.parse(owner._schemaSource)
+        setattr(owner, "schema", schema)
+        return schema
+
+
 class ProtocolElement(object):
     """
     Superclass of GA4GH protocol elements. These elements are in one-to-one
     correspondence with the Avro definitions, and provide the basic elements
-    of the on-the-wire protocol.
+    of the on-the-wire protocol. The names of the fields are given by
+    __slots__, so serialising and deserialising elements does not need
+    the avro schema.
     """
     def __str__(self):
         return "{0}({1})".format(self.__class__.__name__, self.toJsonString())
@@ -143,8 +180,8 @@ class ProtocolElement(object):
         if type(other) != type(self):
             return False
 
-        fieldNames = itertools.imap(lambda f: f.name, self.schema.fields)
-        return all(getattr(self, k) == getattr(other, k) for k in fieldNames)
+        return all(
+            getattr(self, k) == getattr(other, k) for k in self.__slots__)
 
     def __ne__(self, other):
         return not self == other
@@ -160,19 +197,19 @@ class ProtocolElement(object):
         Returns a JSON dictionary representation of this ProtocolElement.
         """
         out = {}
-        for field in self.schema.fields:
-            val = getattr(self, field.name)
-            if self.isEmbeddedType(field.name):
+        for fieldName in self.__slots__:
+            val = getattr(self, fieldName)
+            if self.isEmbeddedType(fieldName):
                 if isinstance(val, list):
-                    out[field.name] = list(el.toJsonDict() for el in val)
+                    out[fieldName] = list(el.toJsonDict() for el in val)
                 elif val is None:
-                    out[field.name] = None
+                    out[fieldName] = None
                 else:
-                    out[field.name] = val.toJsonDict()
+                    out[fieldName] = val.toJsonDict()
             elif isinstance(val, list):
-                out[field.name] = list(val)
+                out[fieldName] = list(val)
             else:
-                out[field.name] = val
+                out[fieldName] = val
         return out
 
     @classmethod
@@ -199,25 +236,23 @@ class ProtocolElement(object):
         if jsonDict is None:
             raise ValueError("Required values not set in {0}".format(cls))
 
+        # The constructor sets the default values of all fields
         instance = cls()
-        for field in cls.schema.fields:
-            instanceVal = field.default
-            if field.name in jsonDict:
-                val = jsonDict[field.name]
-                if cls.isEmbeddedType(field.name):
-                    instanceVal = cls._decodeEmbedded(field, val)
-                else:
-                    instanceVal = val
-            setattr(instance, field.name, instanceVal)
+        for fieldName in cls.__slots__:
+            if fieldName in jsonDict:
+                val = jsonDict[fieldName]
+                if cls.isEmbeddedType(fieldName):
+                    val = cls._decodeEmbedded(fieldName, val)
+                setattr(instance, fieldName, val)
         return instance
 
     @classmethod
-    def _decodeEmbedded(cls, field, val):
+    def _decodeEmbedded(cls, fieldName, val):
         if val is None:
             return None
 
-        embeddedType = cls.getEmbeddedType(field.name)
-        if isinstance(field.type, avro.schema.ArraySchema):
+        embeddedType = cls.getEmbeddedType(fieldName)
+        if isinstance(val, list):
             return list(embeddedType.fromJsonDict(elem) for elem in val)
         else:
             return embeddedType.fromJsonDict(val)
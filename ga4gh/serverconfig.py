@@ -17,7 +17,20 @@ class BaseConfig(object):
     MAX_RESPONSE_LENGTH = 1024 * 1024  # 1MB
     REQUEST_VALIDATION = False
     RESPONSE_VALIDATION = False
+    RESPONSE_VALIDATION_SAMPLE_RATE = 1.0
     DEFAULT_PAGE_SIZE = 100
+    MAX_COVERAGE_BINS = 10000
+    CURSOR_CACHE_SIZE = 0
+    CURSOR_CACHE_TIMEOUT = 60
+    PREFETCH_ENDPOINTS = []
+    PREFETCH_MEMORY_BUDGET = 64 * 1024 * 1024  # 64MB
+    SEARCH_PAGE_CACHE_SIZE = 0
+    SINGLE_FLIGHT = False
+    SINGLE_FLIGHT_LOCK_DIRECTORY = None
+    SLOW_QUERY_THRESHOLD = None
+    SLOW_QUERY_LOG = None
+    ADMIN_KEY = None
+    PUBLIC_METRICS = False
     DATA_SOURCE = "__EMPTY__"
 
     # Options for the simulated backend.
@@ -27,9 +40,17 @@ class BaseConfig(object):
     SIMULATED_BACKEND_NUM_VARIANT_SETS = 1
     SIMULATED_BACKEND_NUM_REFERENCE_SETS = 1
     SIMULATED_BACKEND_NUM_REFERENCES_PER_REFERENCE_SET = 1
+    # The number of alignments that start in each window of read length
+    # bases, which is the mean read depth.
     SIMULATED_BACKEND_NUM_ALIGNMENTS_PER_READ_GROUP = 2
+    SIMULATED_BACKEND_READ_LENGTH = 100
+    SIMULATED_BACKEND_NUM_INDELS_PER_READ = 0
+    SIMULATED_BACKEND_NUM_TAGS_PER_READ = 0
 
     FILE_HANDLE_CACHE_MAX_SIZE = 50
+    REFERENCE_BASES_CACHE = False
+    READ_FILTER_EXCLUDED_FLAGS = 0
+    READ_FILTER_MIN_MAPPING_QUALITY = 0
 
 
 class DevelopmentConfig(BaseConfig):
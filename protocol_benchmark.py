@@ -0,0 +1,215 @@
+"""
+Micro-benchmarks for the serialization of GA4GH protocol elements.
+
+Times the conversion of instances of each protocol class to and from
+JSON, their validation, and adding them to a search response, using
+instances built by avrotools.Creator. Variants and reads are also timed
+at realistic sizes. The results can be saved and used as the baseline
+for a later run, which then reports the operations that got slower.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+import ga4gh.protocol as protocol
+import ga4gh.avrotools as avrotools
+
+
+OPERATIONS = [
+    "toJsonString", "toJsonDict", "fromJsonDict", "validate", "isValid",
+    "addValue"]
+
+
+def getValueClasses():
+    """
+    Returns a map of the classes that are returned by searches to the
+    SearchResponse classes that hold them.
+    """
+    valueClasses = {}
+    for responseClass in protocol.getProtocolClasses(protocol.SearchResponse):
+        valueClass = responseClass.getEmbeddedType(
+            responseClass.getValueListName())
+        valueClasses[valueClass] = responseClass
+    return valueClasses
+
+
+def getInstance(class_, randomInstance):
+    creator = avrotools.Creator(class_)
+    if randomInstance:
+        return creator.getRandomInstance()
+    return creator.getTypicalInstance()
+
+
+def getBenchmarkCases(randomInstance):
+    """
+    Returns a list of (name, protocolElement) pairs: one for each protocol
+    class, and Variants and ReadAlignments of realistic sizes.
+    """
+    cases = [
+        (class_.__name__, getInstance(class_, randomInstance))
+        for class_ in protocol.getProtocolClasses()]
+    call = getInstance(protocol.Call, randomInstance)
+    for numCalls in [1, 100, 2500]:
+        variant = getInstance(protocol.Variant, randomInstance)
+        variant.calls = [call] * numCalls
+        cases.append(("Variant[calls={}]".format(numCalls), variant))
+    cigarUnit = getInstance(protocol.CigarUnit, randomInstance)
+    for numCigarUnits in [100, 10000]:
+        readAlignment = getInstance(protocol.ReadAlignment, randomInstance)
+        readAlignment.alignment.cigar = [cigarUnit] * numCigarUnits
+        cases.append((
+            "ReadAlignment[cigar={}]".format(numCigarUnits), readAlignment))
+    return cases
+
+
+def timeCalls(getFunction, number):
+    function = getFunction()
+    startTime = time.time()
+    for _ in xrange(number):
+        function()
+    return time.time() - startTime
+
+
+def timeOperation(getFunction, minTime, repeat):
+    """
+    Returns the number of seconds taken by a call to the function returned
+    by getFunction, which is called before each batch of calls. Batches
+    are made long enough to take at least minTime seconds, and the fastest
+    of repeat batches is used.
+    """
+    number = 1
+    elapsedTime = timeCalls(getFunction, number)
+    while elapsedTime < minTime:
+        number *= 2
+        elapsedTime = timeCalls(getFunction, number)
+    times = [elapsedTime] + [
+        timeCalls(getFunction, number) for _ in range(repeat - 1)]
+    return min(times) / number
+
+
+def benchmarkElement(protocolElement, responseClass, minTime, repeat):
+    """
+    Returns a dictionary mapping each operation that applies to the
+    specified protocolElement to the number of seconds it takes.
+    """
+    class_ = type(protocolElement)
+    jsonDict = protocolElement.toJsonDict()
+    validator = avrotools.Validator(class_)
+    functions = {
+        "toJsonString": lambda: protocolElement.toJsonString,
+        "toJsonDict": lambda: protocolElement.toJsonDict,
+        "fromJsonDict": lambda: lambda: class_.fromJsonDict(jsonDict),
+        "validate": lambda: lambda: class_.validate(jsonDict),
+        "isValid": lambda: lambda: validator.isValid(jsonDict),
+    }
+    if responseClass is not None:
+        def getAddValue():
+            # A new builder for each batch, so the buffer does not grow
+            # for the whole benchmark
+            builder = protocol.SearchResponseBuilder(
+                responseClass, sys.maxint, sys.maxint)
+            return lambda: builder.addValue(protocolElement)
+        functions["addValue"] = getAddValue
+    return dict(
+        (operation, timeOperation(getFunction, minTime, repeat))
+        for operation, getFunction in functions.items())
+
+
+def printResults(results, outputFile=sys.stdout):
+    """
+    Prints a table of the microseconds taken by each operation.
+    """
+    rowFormat = "{:<26}" + " {:>13}" * len(OPERATIONS)
+    print(rowFormat.format("case", *OPERATIONS), file=outputFile)
+    for name, times in results:
+        print(rowFormat.format(name, *[
+            "{:.2f}".format(times[operation] * 10**6)
+            if operation in times else "-"
+            for operation in OPERATIONS]), file=outputFile)
+
+
+def getRegressions(results, baseline, tolerance):
+    """
+    Returns a list of (name, operation, baselineTime, time) tuples for the
+    operations that take more than (1 + tolerance) times as long as in
+    the specified baseline.
+    """
+    regressions = []
+    for name, times in results:
+        baselineTimes = baseline.get(name, {})
+        for operation in OPERATIONS:
+            if operation in times and operation in baselineTimes:
+                if times[operation] > (
+                        baselineTimes[operation] * (1 + tolerance)):
+                    regressions.append((
+                        name, operation, baselineTimes[operation],
+                        times[operation]))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="GA4GH protocol serialization benchmark")
+    parser.add_argument(
+        '--filter', default=None, metavar='REGEX',
+        help='only run the cases with names matching this expression')
+    parser.add_argument(
+        '--random', action='store_true', default=False,
+        help='time random rather than typical instances')
+    parser.add_argument(
+        '--randomSeed', type=int, default=0,
+        help='the seed for random instances (default: %(default)s)')
+    parser.add_argument(
+        '--minTime', type=float, default=0.05, metavar='SECONDS',
+        help='the minimum time of each batch of calls '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '--repeat', type=int, default=3, metavar='N',
+        help='the number of batches to take the fastest of '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '--output', default=None, metavar='FILE',
+        help='write the results to this file as JSON')
+    parser.add_argument(
+        '--baseline', default=None, metavar='FILE',
+        help='compare the results with those written to this file by an '
+             'earlier run, and exit with status 1 if any got slower')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.2,
+        help='the fraction by which an operation may be slower than the '
+             'baseline before it is reported (default: %(default)s)')
+    args = parser.parse_args()
+
+    random.seed(args.randomSeed)
+    valueClasses = getValueClasses()
+    cases = getBenchmarkCases(args.random)
+    if args.filter is not None:
+        cases = [
+            (name, protocolElement) for name, protocolElement in cases
+            if re.search(args.filter, name)]
+    results = [
+        (name, benchmarkElement(
+            protocolElement, valueClasses.get(type(protocolElement)),
+            args.minTime, args.repeat))
+        for name, protocolElement in cases]
+    printResults(results)
+    if args.output is not None:
+        with open(args.output, "w") as outputFile:
+            json.dump(dict(results), outputFile, indent=2, sort_keys=True)
+    if args.baseline is not None:
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+        regressions = getRegressions(results, baseline, args.tolerance)
+        for name, operation, baselineTime, newTime in regressions:
+            print("REGRESSION {} {}: {:.2f}us -> {:.2f}us ({:+.0%})".format(
+                name, operation, baselineTime * 10**6, newTime * 10**6,
+                newTime / baselineTime - 1))
+        if len(regressions) > 0:
+            sys.exit(1)
@@ -0,0 +1,7 @@
+"""
+Simple shim for running the reference cache builder during development.
+"""
+import ga4gh.cli
+
+if __name__ == "__main__":
+    ga4gh.cli.reference_cache_main()
@@ -0,0 +1,418 @@
+"""
+Generate a synthetic data directory for performance testing.
+
+Writes a reference set of bgzipped FASTA files, a read group set of
+indexed BAM files and a variant set of indexed VCF or BCF files, laid
+out as the FileSystemBackend expects:
+
+    OUTPUT_DIR/references/REFERENCE_SET/CONTIG.fa.gz
+    OUTPUT_DIR/DATASET/reads/READ_GROUP_SET/READ_GROUP.bam
+    OUTPUT_DIR/DATASET/variants/VARIANT_SET/CONTIG.vcf.gz
+
+The reads are sampled from the reference with some mismatches and
+indels, and the variants are at random sites of the reference. The
+output only depends on the arguments, so a data directory of any size
+can be regenerated from the same seed rather than downloaded.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import array
+import bisect
+import string
+import random
+import hashlib
+import argparse
+
+import pysam
+
+import utils
+
+
+BASES = "ACGT"
+LINE_LENGTH = 60
+
+CIGAR_MATCH = 0
+CIGAR_INSERTION = 1
+CIGAR_DELETION = 2
+
+# The fields that are written first when INFO and FORMAT fields are
+# asked for, as (id, number, type, description) tuples. Any more fields
+# are integers named INFOn and FORMATn.
+INFO_FIELDS = [
+    ("DP", "1", "Integer", "Total read depth"),
+    ("AF", "A", "Float", "Allele frequency"),
+    ("MQ", "1", "Float", "RMS mapping quality"),
+    ("DB", "0", "Flag", "In dbSNP"),
+]
+FORMAT_FIELDS = [
+    ("GQ", "1", "Integer", "Genotype quality"),
+    ("DP", "1", "Integer", "Read depth"),
+    ("AD", "R", "Integer", "Allelic depths"),
+]
+GENOTYPES = ["0|0", "0|1", "1|0", "1|1", "0/1", "./."]
+GENOTYPE_WEIGHTS = [50, 15, 15, 10, 5, 5]
+GENOTYPE_CUMULATIVE_WEIGHTS = [
+    sum(GENOTYPE_WEIGHTS[:index + 1]) for index in range(len(GENOTYPES))]
+BASES_TRANSLATION = string.maketrans(b"0123456789abcdef", b"ACGT" * 4)
+
+
+def parseArgs():
+    """
+    Parse the command line args
+    """
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic data directory")
+    parser.add_argument(
+        "outputDir", help="the data directory to write")
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="the seed of the random data; default %(default)s")
+    parser.add_argument(
+        "--numContigs", type=int, default=2,
+        help="the number of contigs; default %(default)s")
+    parser.add_argument(
+        "--contigLength", type=int, default=100000,
+        help="the length of each contig; default %(default)s")
+    parser.add_argument(
+        "--numReadGroups", type=int, default=2,
+        help="the number of BAM files; default %(default)s")
+    parser.add_argument(
+        "--coverage", type=float, default=10,
+        help="the mean read depth of each BAM file; default %(default)s")
+    parser.add_argument(
+        "--readLength", type=int, default=100,
+        help="the length of the reads; default %(default)s")
+    parser.add_argument(
+        "--numCallSets", type=int, default=10,
+        help="the number of samples in the variant files; "
+             "default %(default)s")
+    parser.add_argument(
+        "--variantDensity", type=float, default=0.01,
+        help="the mean number of variant sites per base; "
+             "default %(default)s")
+    parser.add_argument(
+        "--numInfoFields", type=int, default=2,
+        help="the number of INFO fields of each variant; "
+             "default %(default)s")
+    parser.add_argument(
+        "--numFormatFields", type=int, default=1,
+        help="the number of FORMAT fields of each call besides GT; "
+             "default %(default)s")
+    parser.add_argument(
+        "--variantFormat", choices=["vcf", "bcf"], default="vcf",
+        help="write bgzipped VCF with tabix indexes, or BCF, which is "
+             "indexed with bcftools; default %(default)s")
+    parser.add_argument(
+        "--datasetName", default="dataset1",
+        help="the name of the dataset; default %(default)s")
+    parser.add_argument(
+        "--name", default="generated",
+        help="the name of the reference set, read group set and variant "
+             "set; default %(default)s")
+    args = parser.parse_args()
+    return args
+
+
+def getRandomGenerator(seed, *names):
+    """
+    Returns a random generator for the part of the data with the
+    specified names, so that each file is the same whatever other files
+    are generated alongside it.
+    """
+    key = ":".join([str(seed)] + list(names))
+    return random.Random(int(hashlib.md5(key).hexdigest(), 16))
+
+
+def getRandomBases(randomGenerator, length):
+    """
+    Returns a string of length random bases. Each hex digit of a random
+    number is mapped to a base, which is much faster than choosing the
+    bases one at a time.
+    """
+    hexDigits = b"{:0{}x}".format(
+        randomGenerator.getrandbits(4 * length), length)
+    return hexDigits.translate(BASES_TRANSLATION)
+
+
+def getContigNames(args):
+    return ["chr{}".format(index + 1) for index in range(args.numContigs)]
+
+
+def makeDirectory(path):
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+
+def writeReferences(args, referenceDir):
+    """
+    Writes a bgzipped and indexed FASTA file for each contig, and returns
+    a map of the contig names to their bases.
+    """
+    contigs = {}
+    for name in getContigNames(args):
+        randomGenerator = getRandomGenerator(args.seed, "reference", name)
+        bases = getRandomBases(randomGenerator, args.contigLength)
+        contigs[name] = bases
+        fastaPath = os.path.join(referenceDir, "{}.fa".format(name))
+        utils.log("writing {} ...".format(fastaPath))
+        with open(fastaPath, "w") as fastaFile:
+            fastaFile.write(">{}\n".format(name))
+            for lineStart in range(0, len(bases), LINE_LENGTH):
+                fastaFile.write(bases[lineStart:lineStart + LINE_LENGTH])
+                fastaFile.write("\n")
+        pysam.tabix_compress(fastaPath, fastaPath + ".gz", force=True)
+        os.unlink(fastaPath)
+        pysam.faidx(str(fastaPath + ".gz"))
+    return contigs
+
+
+def mutateBases(randomGenerator, bases, numMismatches):
+    bases = list(bases)
+    for position in randomGenerator.sample(range(len(bases)), numMismatches):
+        bases[position] = randomGenerator.choice(
+            BASES.replace(bases[position], ""))
+    return "".join(bases)
+
+
+def makeRead(randomGenerator, args, name, readGroupName, referenceId,
+             start, bases):
+    """
+    Returns an AlignedSegment for a read of readLength bases starting at
+    start on the specified reference bases, with a few mismatches and
+    sometimes an insertion or a deletion.
+    """
+    readLength = args.readLength
+    indelLength = 0
+    if randomGenerator.random() < 0.05 and readLength > 10:
+        indelLength = randomGenerator.randint(1, 3)
+        leftLength = randomGenerator.randint(1, readLength - indelLength - 1)
+    if indelLength > 0 and randomGenerator.random() < 0.5:
+        rightLength = readLength - leftLength
+        referenceBases = bases[start:start + readLength + indelLength]
+        sequence = (
+            referenceBases[:leftLength] +
+            referenceBases[leftLength + indelLength:])
+        cigar = [
+            (CIGAR_MATCH, leftLength), (CIGAR_DELETION, indelLength),
+            (CIGAR_MATCH, rightLength)]
+    elif indelLength > 0:
+        rightLength = readLength - indelLength - leftLength
+        referenceBases = bases[start:start + readLength - indelLength]
+        sequence = (
+            referenceBases[:leftLength] +
+            getRandomBases(randomGenerator, indelLength) +
+            referenceBases[leftLength:])
+        cigar = [
+            (CIGAR_MATCH, leftLength), (CIGAR_INSERTION, indelLength),
+            (CIGAR_MATCH, rightLength)]
+    else:
+        sequence = bases[start:start + readLength]
+        cigar = [(CIGAR_MATCH, readLength)]
+    numMismatches = min(int(randomGenerator.expovariate(1)), readLength)
+    # This version of pysam only accepts byte strings
+    read = pysam.AlignedSegment()
+    read.query_name = str(name)
+    read.query_sequence = str(mutateBases(
+        randomGenerator, sequence, numMismatches))
+    read.flag = 16 if randomGenerator.random() < 0.5 else 0
+    if randomGenerator.random() < 0.02:
+        # PCR or optical duplicate
+        read.flag |= 1024
+    read.reference_id = referenceId
+    read.reference_start = start
+    read.mapping_quality = 0 if randomGenerator.random() < 0.05 else 60
+    read.cigartuples = cigar
+    read.query_qualities = array.array(
+        b"B", [randomGenerator.randint(20, 40)] * len(sequence))
+    read.tags = [
+        ("NM", numMismatches + indelLength),
+        ("AS", len(sequence) - numMismatches - indelLength),
+        ("RG", str(readGroupName))]
+    return read
+
+
+def writeReadGroup(args, contigs, path, readGroupName):
+    """
+    Writes a coordinate sorted and indexed BAM file of reads covering
+    each contig coverage times over.
+    """
+    utils.log("writing {} ...".format(path))
+    contigNames = getContigNames(args)
+    header = {
+        "HD": {"VN": "1.0", "SO": "coordinate"},
+        "SQ": [
+            {"SN": name, "LN": len(contigs[name])} for name in contigNames],
+        "RG": [{"ID": readGroupName, "SM": readGroupName}],
+    }
+    bamFile = pysam.AlignmentFile(path, "wb", header=header)
+    for referenceId, contigName in enumerate(contigNames):
+        bases = contigs[contigName]
+        randomGenerator = getRandomGenerator(
+            args.seed, "reads", readGroupName, contigName)
+        # Reads start at the points of a Poisson process, so they come
+        # out sorted without being held in memory.
+        readRate = args.coverage / args.readLength
+        lastStart = len(bases) - args.readLength - 3
+        start = 0
+        readIndex = 0
+        while True:
+            start += int(randomGenerator.expovariate(readRate))
+            if start > lastStart:
+                break
+            readName = "{}:{}:{}".format(readGroupName, contigName, readIndex)
+            read = makeRead(
+                randomGenerator, args, readName, readGroupName, referenceId,
+                start, bases)
+            bamFile.write(read)
+            readIndex += 1
+    bamFile.close()
+    pysam.index(str(path))
+
+
+def getInfoFields(args):
+    fields = INFO_FIELDS[:args.numInfoFields]
+    for index in range(len(fields), args.numInfoFields):
+        fields.append((
+            "INFO{}".format(index), "1", "Integer",
+            "Generated field {}".format(index)))
+    return fields
+
+
+def getFormatFields(args):
+    fields = [("GT", "1", "String", "Genotype")]
+    fields.extend(FORMAT_FIELDS[:args.numFormatFields])
+    for index in range(len(fields) - 1, args.numFormatFields):
+        fields.append((
+            "FORMAT{}".format(index), "1", "Integer",
+            "Generated field {}".format(index)))
+    return fields
+
+
+def getFieldValue(randomGenerator, number, type_, numAlleles):
+    if type_ == "Flag":
+        return None
+    count = {"A": numAlleles - 1, "R": numAlleles}.get(number, 1)
+    if type_ == "Float":
+        values = [
+            "{:.3f}".format(randomGenerator.random()) for _ in range(count)]
+    else:
+        values = [
+            str(randomGenerator.randint(0, 100)) for _ in range(count)]
+    return ",".join(values)
+
+
+def getVcfHeader(args, contigs, infoFields, formatFields):
+    lines = ["##fileformat=VCFv4.2"]
+    for name in getContigNames(args):
+        lines.append("##contig=<ID={},length={}>".format(
+            name, len(contigs[name])))
+    lines.append('##FILTER=<ID=PASS,Description="All filters passed">')
+    lines.append('##FILTER=<ID=q10,Description="Quality below 10">')
+    for fieldType, fields in [("INFO", infoFields), ("FORMAT", formatFields)]:
+        for id_, number, type_, description in fields:
+            lines.append(
+                '##{}=<ID={},Number={},Type={},Description="{}">'.format(
+                    fieldType, id_, number, type_, description))
+    sampleNames = [
+        "SAMPLE{}".format(index) for index in range(args.numCallSets)]
+    lines.append("\t".join([
+        "#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO",
+        "FORMAT"] + sampleNames))
+    return "\n".join(lines) + "\n"
+
+
+def getVcfLine(randomGenerator, contigName, position, bases, infoFields,
+               formatFields, numCallSets):
+    referenceBase = bases[position]
+    otherBases = BASES.replace(referenceBase, "")
+    alternateBases = [randomGenerator.choice(otherBases)]
+    if randomGenerator.random() < 0.05:
+        alternateBases = randomGenerator.sample(otherBases, 2)
+    numAlleles = len(alternateBases) + 1
+    info = []
+    for id_, number, type_, _ in infoFields:
+        value = getFieldValue(randomGenerator, number, type_, numAlleles)
+        if value is not None:
+            info.append("{}={}".format(id_, value))
+        elif randomGenerator.random() < 0.5:
+            info.append(id_)
+    calls = []
+    for _ in range(numCallSets):
+        point = randomGenerator.random() * GENOTYPE_CUMULATIVE_WEIGHTS[-1]
+        genotype = GENOTYPES[bisect.bisect_right(
+            GENOTYPE_CUMULATIVE_WEIGHTS, point)]
+        values = [genotype] + [
+            getFieldValue(randomGenerator, number, type_, numAlleles)
+            for _, number, type_, _ in formatFields[1:]]
+        calls.append(":".join(values))
+    quality = randomGenerator.randint(1, 100)
+    return "\t".join([
+        contigName, str(position + 1), ".", referenceBase,
+        ",".join(alternateBases), str(quality),
+        "PASS" if quality >= 10 else "q10", ";".join(info) or ".",
+        ":".join(id_ for id_, _, _, _ in formatFields)] + calls) + "\n"
+
+
+def writeVariants(args, contigs, variantSetDir):
+    """
+    Writes an indexed VCF or BCF file for each contig, with variants at
+    the points of a Poisson process.
+    """
+    infoFields = getInfoFields(args)
+    formatFields = getFormatFields(args)
+    header = getVcfHeader(args, contigs, infoFields, formatFields)
+    for contigName in getContigNames(args):
+        bases = contigs[contigName]
+        randomGenerator = getRandomGenerator(
+            args.seed, "variants", contigName)
+        vcfPath = os.path.join(variantSetDir, "{}.vcf".format(contigName))
+        utils.log("writing {} ...".format(vcfPath))
+        with open(vcfPath, "w") as vcfFile:
+            vcfFile.write(header)
+            position = 0
+            while True:
+                position += 1 + int(
+                    randomGenerator.expovariate(args.variantDensity))
+                if position >= len(bases):
+                    break
+                vcfFile.write(getVcfLine(
+                    randomGenerator, contigName, position, bases,
+                    infoFields, formatFields, args.numCallSets))
+        if args.variantFormat == "vcf":
+            pysam.tabix_index(vcfPath, preset="vcf", force=True)
+        else:
+            bcfPath = os.path.join(variantSetDir, "{}.bcf".format(contigName))
+            vcfFile = pysam.VariantFile(vcfPath)
+            bcfFile = pysam.VariantFile(bcfPath, "wb", header=vcfFile.header)
+            for record in vcfFile:
+                bcfFile.write(record)
+            bcfFile.close()
+            vcfFile.close()
+            os.unlink(vcfPath)
+            utils.runCommand("bcftools index {}".format(bcfPath))
+
+
+@utils.Timed()
+def main():
+    args = parseArgs()
+    referenceDir = os.path.join(args.outputDir, "references", args.name)
+    datasetDir = os.path.join(args.outputDir, args.datasetName)
+    readGroupSetDir = os.path.join(datasetDir, "reads", args.name)
+    variantSetDir = os.path.join(datasetDir, "variants", args.name)
+    for directory in [referenceDir, readGroupSetDir, variantSetDir]:
+        makeDirectory(directory)
+    contigs = writeReferences(args, referenceDir)
+    for index in range(args.numReadGroups):
+        readGroupName = "READGROUP{}".format(index)
+        writeReadGroup(
+            args, contigs,
+            os.path.join(readGroupSetDir, "{}.bam".format(readGroupName)),
+            readGroupName)
+    writeVariants(args, contigs, variantSetDir)
+
+
+if __name__ == '__main__':
+    main()
@@ -220,7 +220,9 @@ class SchemaClass(object):
             string = '_schemaSource = """\n{0}"""'.format(
                 self.formatSchema())
             self._writeWithIndent(string, outputFile)
-            string = 'schema = avro.schema.parse(_schemaSource)'
+            # The schema is parsed from _schemaSource on first access,
+            # so that importing the protocol doesn't parse every schema
+            string = 'schema = LazySchema()'
             self._writeWithIndent(string, outputFile)
             self.writeRequiredFields(outputFile)
             if self.isSearchResponse():
@@ -285,8 +287,7 @@ class SchemaGenerator(object):
         print("from protocol import ProtocolElement", file=outputFile)
         print("from protocol import SearchRequest", file=outputFile)
         print("from protocol import SearchResponse", file=outputFile)
-        print(file=outputFile)
-        print("import avro.schema", file=outputFile)
+        print("from protocol import LazySchema", file=outputFile)
         print(file=outputFile)
         if self.version[0].lower() == 'v' and self.version.find('.') != -1:
             versionStr = self.version[1:]  # Strip off leading 'v'
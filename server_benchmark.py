@@ -1,124 +1,291 @@
 """
 Stand-alone benchmark for the GA4GH reference implementation.
+
+Runs a set of searches covering every search endpoint, plus reference
+bases, directly against a backend, and reports the latency percentiles
+and throughput of each. The results can also be written as JSON, so
+that the runs for different releases can be compared.
 """
 from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
 import re
+import sys
+import json
 import time
 import pstats
 import argparse
 import cProfile
+import platform
 
+import ga4gh
 import ga4gh.backend
+import ga4gh.cli as cli
 import ga4gh.protocol as protocol
 
-import guppy
 
+class BenchmarkCase(object):
+    """
+    A query to benchmark, made up of the successive pages of a search.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def run(self, pageLimit):
+        """
+        Runs the query for at most pageLimit pages, and returns a list of
+        (seconds, numRecords, numBytes) tuples for the pages. Only the
+        time taken by the backend is counted, and not the time taken to
+        parse the responses here.
+        """
+        pages = []
+        pageToken = None
+        while len(pages) < pageLimit:
+            startTime = time.time()
+            responseString = self._runPage(pageToken)
+            elapsedTime = time.time() - startTime
+            numRecords, pageToken = self._parseResponse(responseString)
+            pages.append((elapsedTime, numRecords, len(responseString)))
+            if pageToken is None:
+                break
+        return pages
+
+    def _runPage(self, pageToken):
+        raise NotImplementedError()
+
+    def _parseResponse(self, responseString):
+        raise NotImplementedError()
 
-class HeapProfilerBackend(ga4gh.backend.FileSystemBackend):
-    def __init__(self, dataDir):
-        super(HeapProfilerBackend, self).__init__(dataDir)
-        self.profiler = guppy.hpy()
 
-    def startProfile(self):
-        self.profiler.setrelheap()
+class SearchCase(BenchmarkCase):
+    """
+    Runs the specified request against the specified backend search
+    method. The records on each page are the values of the specified
+    field of the response.
+    """
+    def __init__(self, name, searchMethod, request, valueListName):
+        super(SearchCase, self).__init__(name)
+        self._searchMethod = searchMethod
+        self._request = request
+        self._valueListName = valueListName
+
+    def _runPage(self, pageToken):
+        self._request.pageToken = pageToken
+        return self._searchMethod(self._request.toJsonString())
 
-    def endProfile(self):
-        print(self.profiler.heap())
+    def _parseResponse(self, responseString):
+        response = json.loads(responseString)
+        return len(response[self._valueListName]), response["nextPageToken"]
 
 
-class CpuProfilerBackend(ga4gh.backend.FileSystemBackend):
-    def __init__(self, dataDir):
-        super(CpuProfilerBackend, self).__init__(dataDir)
-        self.profiler = cProfile.Profile()
+class ReferenceBasesCase(BenchmarkCase):
+    """
+    Lists the bases of the specified reference between start and end.
+    The records on each page are the bases.
+    """
+    def __init__(self, name, theBackend, referenceId, start, end):
+        super(ReferenceBasesCase, self).__init__(name)
+        self._backend = theBackend
+        self._referenceId = referenceId
+        self._start = start
+        self._end = end
 
-    def startProfile(self):
-        self.profiler.enable()
+    def _runPage(self, pageToken):
+        requestArgs = {"start": self._start, "end": self._end}
+        if pageToken is not None:
+            requestArgs["pageToken"] = pageToken
+        return self._backend.listReferenceBases(
+            self._referenceId, requestArgs)
 
-    def endProfile(self):
-        self.profiler.disable()
+    def _parseResponse(self, responseString):
+        response = json.loads(responseString)
+        pageToken = response["nextPageToken"]
+        if pageToken is not None:
+            pageToken = str(pageToken)
+        return len(response["sequence"]), pageToken
 
 
-def _heavyQuery(variantSetId, callSetIds):
+def getBenchmarkCases(theBackend, args):
     """
-    Very heavy query: calls for the specified list of callSetIds
-    on chromosome 2 (11 pages, 90 seconds to fetch the entire thing
-    on a high-end desktop machine)
+    Returns the list of BenchmarkCases for the data in the specified
+    backend, using the first dataset, variant set, read group and
+    reference.
     """
-    request = protocol.GASearchVariantsRequest()
-    request.referenceName = '2'
-    request.variantSetIds = [variantSetId]
-    request.callSetIds = callSetIds
-    request.pageSize = 100
-    request.end = 100000
-    return request
+    def searchRequest(requestClass, **fields):
+        request = requestClass()
+        request.pageSize = args.pageSize
+        for name, value in fields.items():
+            setattr(request, name, value)
+        return request
+
+    datasetId = theBackend.getDatasetIds()[0]
+    dataset = theBackend.getDataset(datasetId)
+    cases = [
+        SearchCase(
+            "datasets", theBackend.searchDatasets,
+            searchRequest(protocol.SearchDatasetsRequest), "datasets"),
+        SearchCase(
+            "referenceSets", theBackend.searchReferenceSets,
+            searchRequest(protocol.SearchReferenceSetsRequest),
+            "referenceSets"),
+        SearchCase(
+            "references", theBackend.searchReferences,
+            searchRequest(protocol.SearchReferencesRequest), "references"),
+        SearchCase(
+            "variantSets", theBackend.searchVariantSets,
+            searchRequest(
+                protocol.SearchVariantSetsRequest, datasetIds=[datasetId]),
+            "variantSets"),
+        SearchCase(
+            "readGroupSets", theBackend.searchReadGroupSets,
+            searchRequest(
+                protocol.SearchReadGroupSetsRequest, datasetIds=[datasetId]),
+            "readGroupSets"),
+    ]
+    variantSets = dataset.getVariantSets()
+    if len(variantSets) > 0:
+        variantSetId = variantSets[0].getId()
+        callSetIds = variantSets[0].getCallSetIds()
+        cases.append(SearchCase(
+            "callSets", theBackend.searchCallSets,
+            searchRequest(
+                protocol.SearchCallSetsRequest, variantSetIds=[variantSetId]),
+            "callSets"))
+        for callSetCount in args.callSetCounts.split(","):
+            # An empty list of callSetIds asks for all of the call sets
+            requestCallSetIds = []
+            searchBackend = theBackend
+            if isinstance(theBackend, ga4gh.backend.SimulatedBackend):
+                # Simulated variants have a call for every call set of
+                # their variant set whichever are requested, so we search
+                # a variant set simulated with that number instead.
+                numCalls = args.numCalls
+                if callSetCount != "all":
+                    numCalls = int(callSetCount)
+                searchBackend = getBackend(args, numCalls)
+                searchBackend.startProfile = theBackend.startProfile
+                searchBackend.endProfile = theBackend.endProfile
+            elif callSetCount != "all":
+                requestCallSetIds = callSetIds[:int(callSetCount)]
+            cases.append(SearchCase(
+                "variants[calls={}]".format(callSetCount),
+                searchBackend.searchVariants,
+                searchRequest(
+                    protocol.SearchVariantsRequest,
+                    variantSetIds=[variantSetId],
+                    referenceName=args.referenceName,
+                    callSetIds=requestCallSetIds,
+                    start=args.start, end=args.end),
+                "variants"))
+    readGroupSets = dataset.getReadGroupSets()
+    if len(readGroupSets) > 0:
+        readGroupId = readGroupSets[0].getReadGroups()[0].getId()
+        cases.append(SearchCase(
+            "reads", theBackend.searchReads,
+            searchRequest(
+                protocol.SearchReadsRequest, readGroupIds=[readGroupId],
+                referenceId=args.readsReferenceId,
+                start=args.start, end=args.end),
+            "alignments"))
+    referenceSets = theBackend.getReferenceSets()
+    if len(referenceSets) > 0:
+        reference = referenceSets[0].getReferences()[0]
+        cases.append(ReferenceBasesCase(
+            "referenceBases", theBackend, reference.getId(), args.start,
+            min(args.end, reference.getLength())))
+    return cases
 
 
-def timeOneSearch(queryString):
+def runBenchmarkCase(case, repeatLimit, pageLimit):
     """
-    Returns (search result as JSON string, time elapsed during search)
+    Runs the specified case repeatLimit times and returns a dictionary
+    summarising the latency of its pages and its throughput.
     """
-    startTime = time.clock()
-    resultString = backend.searchVariants(queryString)
-    endTime = time.clock()
-    elapsedTime = endTime - startTime
-    return resultString, elapsedTime
+    pages = []
+    for _ in range(repeatLimit):
+        pages.extend(case.run(pageLimit))
+    times = [elapsedTime for elapsedTime, _, _ in pages]
+    totalTime = sum(times)
+    numRecords = sum(numRecords for _, numRecords, _ in pages)
+    numBytes = sum(numBytes for _, _, numBytes in pages)
+    return {
+        "name": case.name,
+        "pages": len(pages),
+        "records": numRecords,
+        "bytes": numBytes,
+        "seconds": totalTime,
+        "p50": cli.getPercentile(times, 0.5),
+        "p95": cli.getPercentile(times, 0.95),
+        "p99": cli.getPercentile(times, 0.99),
+        "recordsPerSecond": numRecords / totalTime if totalTime > 0 else 0,
+        "bytesPerSecond": numBytes / totalTime if totalTime > 0 else 0,
+    }
 
 
-def extractNextPageToken(resultString):
+def printResults(results, outputFile=sys.stdout):
     """
-    Calling GASearchVariantsResponse.fromJsonString() can be slower
-    than doing the variant search in the first place; instead we use
-    a regexp to extract the next page token.
+    Prints a table of the specified results.
     """
-    m = re.search('(?<=nextPageToken": )(?:")?([0-9]*?:[0-9]*)|null',
-                  resultString)
-    if m is not None:
-        return m.group(1)
-    return None
+    rowFormat = "{:<22} {:>6} {:>9} {:>9} {:>9} {:>12} {:>9}"
+    print(rowFormat.format(
+        "case", "pages", "p50 ms", "p95 ms", "p99 ms", "records/s",
+        "MB/s"), file=outputFile)
+    for result in results:
+        print(rowFormat.format(
+            result["name"], result["pages"],
+            "{:.2f}".format(result["p50"] * 1000),
+            "{:.2f}".format(result["p95"] * 1000),
+            "{:.2f}".format(result["p99"] * 1000),
+            "{:.0f}".format(result["recordsPerSecond"]),
+            "{:.2f}".format(result["bytesPerSecond"] / 2**20)),
+            file=outputFile)
 
 
-def benchmarkOneQuery(request, repeatLimit=3, pageLimit=3):
+def getBackend(args, numCalls=None):
+    if numCalls is None:
+        numCalls = args.numCalls
+    if args.dataSource == "__SIMULATED__":
+        return ga4gh.backend.SimulatedBackend(
+            randomSeed=args.randomSeed, numCalls=numCalls,
+            variantDensity=args.variantDensity,
+            numAlignments=args.numAlignments, readLength=args.readLength,
+            numIndels=args.numIndels, numTags=args.numTags)
+    return ga4gh.backend.FileSystemBackend(args.dataSource)
+
+
+def addProfiler(theBackend, profile):
     """
-    Repeat the query several times; perhaps don't go through *all* the
-    pages.  Returns minimum time to run backend.searchVariants() to execute
-    the query (as far as pageLimit allows), *not* including JSON
-    processing to prepare queries or parse responses.
+    Installs the specified kind of profiler in the profiling hooks of
+    the specified backend, and returns a function that prints its
+    results.
     """
-    times = []
-    queryString = request.toJsonString()
-    for i in range(0, repeatLimit):
-        resultString, elapsedTime = timeOneSearch(queryString)
-        accruedTime = elapsedTime
-        pageCount = 1
-        token = extractNextPageToken(resultString)
-        # Iterate to go beyond the first page of results.
-        while token is not None and pageCount < pageLimit:
-            pageRequest = request
-            pageRequest.pageToken = token
-            pageRequestString = pageRequest.toJsonString()
-            resultString, elapsedTime = timeOneSearch(pageRequestString)
-            accruedTime += elapsedTime
-            pageCount = pageCount + 1
-            token = extractNextPageToken(resultString)
-        times.append(accruedTime)
-
-    # TODO: more sophisticated statistics. Sometimes we want min(),
-    # sometimes mean = sum() / len(), sometimes other measures,
-    # perhaps exclude outliers...
-
-    # If we compute average we should throw out at least the first one.
-    # return sum(times[2:])/len(times[2:])
-    return min(times)
+    if profile == 'heap':
+        import guppy
+        heapProfiler = guppy.hpy()
+        theBackend.startProfile = heapProfiler.setrelheap
+        theBackend.endProfile = lambda: print(heapProfiler.heap())
+        return lambda: None
+    elif profile == 'cpu':
+        cpuProfiler = cProfile.Profile()
+        theBackend.startProfile = cpuProfiler.enable
+        theBackend.endProfile = cpuProfiler.disable
+
+        def printStats():
+            stats = pstats.Stats(cpuProfiler)
+            stats.sort_stats('time')
+            stats.print_stats(.25)
+        return printStats
+    return lambda: None
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description="GA4GH reference server benchmark")
     parser.add_argument(
-        'variantSetId',
-        help="The variant set ID to run the query against")
+        'dataSource', nargs='?', default="__SIMULATED__",
+        help="The data directory to benchmark, or __SIMULATED__ for "
+             "simulated data (default: %(default)s)")
     parser.add_argument(
         '--profile', default='none',
         choices=['none', 'heap', 'cpu'],
@@ -132,36 +299,81 @@ if __name__ == '__main__':
         help='how many pages (max) to load '
              'from each test case (default: %(default)s)')
     parser.add_argument(
-        "--callSetIds", "-c", default=[],
-        help="""Return variant calls which belong to call sets
-            with these IDs. Pass in IDs as a comma separated list (no spaces),
-            or '*' (with the single quotes!) to indicate 'all call sets'.
-            Omit this option to indicate 'no call sets'.
-            """)
-
+        '--pageSize', type=int, default=None, metavar='N',
+        help='the page size of the searches (default: the server default)')
+    parser.add_argument(
+        '--callSetCounts', default="1,10,all",
+        help='comma separated numbers of call sets to search variants '
+             'over, where "all" is every call set (default: %(default)s)')
+    parser.add_argument(
+        '--referenceName', default="1",
+        help='the reference name to search variants on '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '--readsReferenceId', default="0",
+        help='the reference id to search reads on, which is the index of '
+             'the reference in the header of the BAM file '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '--start', type=int, default=0,
+        help='the start of the searched region (default: %(default)s)')
+    parser.add_argument(
+        '--end', type=int, default=10**7,
+        help='the end of the searched region (default: %(default)s)')
+    parser.add_argument(
+        '--filter', default=None, metavar='REGEX',
+        help='only run the cases with names matching this expression')
+    parser.add_argument(
+        '--output', default=None, metavar='FILE',
+        help='write the results to this file as JSON')
+    parser.add_argument(
+        '--randomSeed', type=int, default=0,
+        help='the seed of the simulated data (default: %(default)s)')
+    parser.add_argument(
+        '--numCalls', type=int, default=100,
+        help='the number of simulated calls per variant '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '--variantDensity', type=float, default=0.5,
+        help='the density of simulated variants (default: %(default)s)')
+    parser.add_argument(
+        '--numAlignments', type=int, default=30,
+        help='the read depth of the simulated reads (default: %(default)s)')
+    parser.add_argument(
+        '--readLength', type=int, default=100,
+        help='the length of the simulated reads (default: %(default)s)')
+    parser.add_argument(
+        '--numIndels', type=int, default=1,
+        help='the number of indels in the CIGAR of each simulated read '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '--numTags', type=int, default=5,
+        help='the number of tags of each simulated read '
+             '(default: %(default)s)')
     args = parser.parse_args()
 
-    backendClass = ga4gh.backend.FileSystemBackend
     if args.profile == 'heap':
-        backendClass = HeapProfilerBackend
         args.repeatLimit = 1
         args.pageLimit = 1
-    elif args.profile == 'cpu':
-        backendClass = CpuProfilerBackend
-    # Get our list of callSetids
-    callSetIds = args.callSetIds
-    if callSetIds != []:
-        callSetIds = None
-        if args.callSetIds != "*":
-            callSetIds = args.callSetIds.split(",")
-
-    backend = backendClass("ga4gh-example-data")
-    minTime = benchmarkOneQuery(
-        _heavyQuery(args.variantSetId, callSetIds), args.repeatLimit,
-        args.pageLimit)
-    print(minTime)
-
-    if args.profile == 'cpu':
-        stats = pstats.Stats(backend.profiler)
-        stats.sort_stats('time')
-        stats.print_stats(.25)
+    theBackend = getBackend(args)
+    printProfile = addProfiler(theBackend, args.profile)
+    cases = getBenchmarkCases(theBackend, args)
+    if args.filter is not None:
+        cases = [case for case in cases if re.search(args.filter, case.name)]
+    results = [
+        runBenchmarkCase(case, args.repeatLimit, args.pageLimit)
+        for case in cases]
+    printResults(results)
+    printProfile()
+    if args.output is not None:
+        output = {
+            "serverVersion": ga4gh.__version__,
+            "protocolVersion": protocol.version,
+            "pythonVersion": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "arguments": vars(args),
+            "results": results,
+        }
+        with open(args.output, "w") as outputFile:
+            json.dump(output, outputFile, indent=2, sort_keys=True)
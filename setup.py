@@ -47,6 +47,8 @@ setup(
             'ga4gh_client=ga4gh.cli:client_main',
             'ga4gh_configtest=ga4gh.cli:configtest_main',
             'ga4gh_server=ga4gh.cli:server_main',
+            'ga4gh_coverage=ga4gh.cli:coverage_main',
+            'ga4gh_reference_cache=ga4gh.cli:reference_cache_main',
             'ga2vcf=ga4gh.cli:ga2vcf_main',
             'ga2sam=ga4gh.cli:ga2sam_main',
         ]
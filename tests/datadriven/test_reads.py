@@ -91,6 +91,11 @@ class ReadGroupSetTest(datadriven.DataDrivenTest):
                         alignments, refIdReads):
                     self.assertAlignmentsEqual(
                         gaAlignment, pysamAlignment, readGroupInfo)
+                # the protocol gives the reference id as a string
+                self.assertEqual(
+                    [alignment.toJsonDict() for alignment in alignments],
+                    [alignment.toJsonDict() for alignment in
+                     readGroup.getReadAlignments(referenceId=str(refId))])
 
     def testGetReadAlignmentsStartEnd(self):
         # test that searching with start and end coords succeeds
@@ -136,6 +141,43 @@ class ReadGroupSetTest(datadriven.DataDrivenTest):
                     readGroup, refId, begin + beginLength,
                     end, length - 2)
 
+    def testGetCoverage(self):
+        # test that binned coverage agrees with a per-base count of the
+        # aligned blocks of the reads we would count
+        excludedFlags = (
+            reads.SamFlags.SEGMENT_UNMAPPED |
+            reads.SamFlags.SECONDARY_ALIGNMENT |
+            reads.SamFlags.FAILED_VENDOR_QUALITY_CHECKS |
+            reads.SamFlags.DUPLICATE_FRAGMENT)
+        readGroupSet = self._gaObject
+        for readGroup in readGroupSet.getReadGroups():
+            readGroupInfo = self._readGroupInfos[readGroup.getSamFilePath()]
+            for refId, refIdReads in readGroupInfo.refIds.items():
+                if refId == -1:
+                    continue
+                referenceName = readGroupInfo.samFile.getrname(refId)
+                start = refIdReads[0].reference_start
+                end = max(read.reference_end for read in refIdReads) + 10
+                depths = collections.Counter()
+                for read in refIdReads:
+                    if read.flag & excludedFlags == 0:
+                        for blockStart, blockEnd in read.get_blocks():
+                            for position in range(blockStart, blockEnd):
+                                depths[position] += 1
+                for binSize in [1, 7, end - start]:
+                    coverage = readGroup.getCoverage(
+                        referenceName, start, end, binSize)
+                    self.assertEqual(
+                        len(coverage), (end - start + binSize - 1) // binSize)
+                    for i, depth in enumerate(coverage):
+                        binStart = start + i * binSize
+                        binEnd = min(binStart + binSize, end)
+                        expected = sum(
+                            depths[position]
+                            for position in range(binStart, binEnd))
+                        self.assertAlmostEqual(
+                            depth, expected / (binEnd - binStart))
+
     def assertGetReadAlignmentsRangeResult(self, readGroup, refId,
                                            start, end, result):
         alignments = list(readGroup.getReadAlignments(
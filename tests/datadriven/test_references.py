@@ -98,13 +98,14 @@ class ReferenceSetTest(datadriven.DataDrivenTest):
         for gaReference in referenceSet.getReferences():
             pysamReference = self._referenceInfos[
                 gaReference.getFastaFilePath()]
-            basesChecksum = hashlib.md5(pysamReference.bases).hexdigest()
-            self.assertEqual("TODO", gaReference.getMd5Checksum())
+            basesChecksum = hashlib.md5(
+                pysamReference.bases.upper()).hexdigest()
+            self.assertEqual(basesChecksum, gaReference.getMd5Checksum())
             referenceMd5s.append(basesChecksum)
-        # checksumsString = ''.join(referenceMd5s)
-        # md5checksum = hashlib.md5(checksumsString).hexdigest()
+        checksumsString = ''.join(sorted(referenceMd5s))
+        md5checksum = hashlib.md5(checksumsString).hexdigest()
         referenceSetMd5 = referenceSet._generateMd5Checksum()
-        self.assertEqual("TODO", referenceSetMd5)
+        self.assertEqual(md5checksum, referenceSetMd5)
 
     def doRangeTest(self, start=None, end=None):
         referenceSet = self._gaObject
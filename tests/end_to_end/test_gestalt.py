@@ -76,7 +76,7 @@ class TestGestalt(server_test.ServerTest):
 
     def runReadsRequest(self):
         cmd = (
-            "reads-search --readGroupIds "
+            "reads-search --start 0 --end 1000 --readGroupIds "
             "'simulatedDataset1:aReadGroupSet:one'")
         self.runClientCmd(self.client, cmd)
 
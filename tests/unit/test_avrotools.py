@@ -46,3 +46,50 @@ class TestAvrotools(unittest.TestCase):
             jsonDict = generatedInstance.toJsonDict()
             returnValue = validator.getInvalidFields(jsonDict)
             self.assertEqual(returnValue, {})
+
+    def _assertCompiledAgrees(self, class_, jsonDict):
+        validator = avrotools.Validator(class_)
+        self.assertEqual(
+            validator.isValid(jsonDict), class_.validate(jsonDict))
+
+    def testCompiledValidatorGeneratedObjects(self):
+        # The compiled validator agrees with avro on generated instances
+        for class_ in protocol.getProtocolClasses():
+            creator = avrotools.Creator(class_)
+            instances = [
+                creator.getTypicalInstance(), creator.getRandomInstance(),
+                creator.getDefaultInstance()]
+            for instance in instances:
+                self._assertCompiledAgrees(class_, instance.toJsonDict())
+                # protocol elements are validated without conversion
+                validator = avrotools.Validator(class_)
+                self.assertEqual(
+                    validator.isValid(instance),
+                    validator.isValid(instance.toJsonDict()))
+
+    def testCompiledValidatorInvalidFields(self):
+        # The compiled validator agrees with avro when a single field
+        # of an otherwise valid instance is replaced by a bad value
+        badValues = [
+            None, True, 1, 2 ** 40, 2 ** 70, 1.5, "string", ["string"],
+            [1], {}, {"key": "value"}, {1: "value"}]
+        for class_ in protocol.getProtocolClasses():
+            creator = avrotools.Creator(class_)
+            jsonDict = creator.getTypicalInstance().toJsonDict()
+            for field in class_.schema.fields:
+                values = badValues + [creator.getInvalidField(field.name)]
+                for value in values:
+                    modified = dict(jsonDict)
+                    modified[field.name] = value
+                    self._assertCompiledAgrees(class_, modified)
+
+    def testCompiledValidatorNonDicts(self):
+        for class_ in protocol.getProtocolClasses():
+            for value in [None, [], "string", 1]:
+                self._assertCompiledAgrees(class_, value)
+
+    def testCompiledValidatorCached(self):
+        for class_ in protocol.getProtocolClasses():
+            first = avrotools.Validator(class_).getCompiledValidator()
+            second = avrotools.Validator(class_).getCompiledValidator()
+            self.assertIs(first, second)
@@ -9,8 +9,14 @@ from __future__ import unicode_literals
 
 import os
 import glob
+import json
+import functools
+import itertools
+import threading
+import time
 import unittest
 
+import mock
 import pysam
 
 import ga4gh.exceptions as exceptions
@@ -114,6 +120,43 @@ class TestAbstractBackend(unittest.TestCase):
         self.assertTrue(
             isinstance(response, protocol.SearchVariantSetsResponse))
 
+    def testRunSearchRequestResponseValidation(self):
+        request = protocol.SearchVariantSetsRequest()
+        request.datasetIds = [self._backend.getDatasetIds()[0]]
+        requestStr = request.toJsonString()
+
+        def invalidGenerator(request):
+            variantSet = protocol.VariantSet()
+            variantSet.id = 5
+            yield variantSet, None
+
+        self._backend.setResponseValidation(True)
+        responseStr = self._backend.runSearchRequest(
+            requestStr, protocol.SearchVariantSetsRequest,
+            protocol.SearchVariantSetsResponse,
+            self._backend.variantSetsGenerator)
+        self.assertTrue(
+            protocol.SearchVariantSetsResponse.validate(
+                json.loads(responseStr)))
+        with self.assertRaises(exceptions.ResponseValidationFailureException):
+            self._backend.runSearchRequest(
+                requestStr, protocol.SearchVariantSetsRequest,
+                protocol.SearchVariantSetsResponse, invalidGenerator)
+
+        # the page token is checked along with the values
+        def invalidTokenGenerator(request):
+            for variantSet, _ in self._backend.variantSetsGenerator(request):
+                yield variantSet, 5
+        with self.assertRaises(exceptions.ResponseValidationFailureException):
+            self._backend.runSearchRequest(
+                requestStr, protocol.SearchVariantSetsRequest,
+                protocol.SearchVariantSetsResponse, invalidTokenGenerator)
+        # responses that are not sampled are not validated
+        self._backend.setResponseValidationSampleRate(0)
+        self._backend.runSearchRequest(
+            requestStr, protocol.SearchVariantSetsRequest,
+            protocol.SearchVariantSetsResponse, invalidGenerator)
+
     def testRunGetRequest(self):
         id_ = "anId"
         obj = references.SimulatedReferenceSet(id_)
@@ -168,6 +211,171 @@ class TestAbstractBackend(unittest.TestCase):
         for result in results[1:]:
             self.assertEqual(result, results[0])
 
+    def testVariantSetPaginationWithPrefetch(self):
+        expected = [variantSet.id for variantSet in self.getVariantSets()]
+        self._backend.setPrefetchEndpoints(["variantsets"])
+        prefetcher = self._backend._pagePrefetcher
+        pagesTaken = []
+        take = prefetcher.take
+
+        def countingTake(key):
+            page = take(key)
+            pagesTaken.append(page)
+            return page
+        prefetcher.take = countingTake
+        ids = [
+            variantSet.id for variantSet in self.getVariantSets(pageSize=1)]
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pagesTaken), len(expected) - 1)
+        self.assertNotIn(None, pagesTaken)
+        self.assertEqual(prefetcher.getMemoryUsed(), 0)
+
+    def testVariantSetsSearchPageCache(self):
+        request = protocol.SearchVariantSetsRequest()
+        request.datasetIds = [self._backend.getDatasetIds()[0]]
+        request.pageSize = 1
+        requestStr = request.toJsonString()
+        expected = self._backend.searchVariantSets(requestStr)
+        self._backend.setSearchPageCacheSize(2**20)
+        for _ in range(3):
+            self.assertEqual(
+                self._backend.searchVariantSets(requestStr), expected)
+        statistics = self._backend.getSearchPageCacheStatistics()
+        self.assertEqual(statistics["misses"], 1)
+        self.assertEqual(statistics["hits"], 2)
+        # requests differing in their JSON formatting share pages
+        reformatted = json.dumps(json.loads(requestStr), indent=4)
+        self._backend.searchVariantSets(reformatted)
+        statistics = self._backend.getSearchPageCacheStatistics()
+        self.assertEqual(statistics["hits"], 3)
+
+    def testSingleFlightSearches(self):
+        request = protocol.SearchVariantSetsRequest()
+        request.datasetIds = [self._backend.getDatasetIds()[0]]
+        requestStr = request.toJsonString()
+        expected = self._backend.searchVariantSets(requestStr)
+        self._backend.setSingleFlight(True)
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    self._backend.searchVariantSets(requestStr)))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [expected] * 5)
+
+    def testSingleFlightPagesFromOtherProcesses(self):
+        # pages passed between processes as JSON lists are cached as
+        # tuples, like those computed in this process
+        request = protocol.SearchVariantSetsRequest()
+        request.datasetIds = [self._backend.getDatasetIds()[0]]
+        request.pageSize = 1
+        requestStr = request.toJsonString()
+        self._backend.setSingleFlight(True)
+        self._backend.setSearchPageCacheSize(2**20)
+        page = ["page", "token"]
+        with mock.patch.object(
+                backend.SingleFlight, "run", return_value=page), \
+                mock.patch.object(backend.SearchPageCache, "put") as put:
+            self.assertEqual(
+                self._backend.searchVariantSets(requestStr), "page")
+        cachedPage = put.call_args[0][2]
+        self.assertEqual(cachedPage, ("page", "token"))
+
+    def testPrefetchedSearchesReopenFiles(self):
+        # searches that may run in the prefetcher's threads do not share
+        # the cached file handles
+        variantSetId = self.getVariantSets(pageSize=1).next().id
+        request = protocol.SearchVariantsRequest()
+        request.variantSetIds = [variantSetId]
+        request.referenceName = "1"
+        request.start = 0
+        request.end = 100
+        for endpoints, reopen in [([], False), (["variants"], True)]:
+            self._backend.setPrefetchEndpoints(endpoints)
+            iterator = self._backend.variantsGenerator(request)
+            self.assertEqual(iterator._reopen, reopen)
+
+    def testPrefetchUnknownEndpoint(self):
+        with self.assertRaises(exceptions.ConfigurationException):
+            self._backend.setPrefetchEndpoints(["notAnEndpoint"])
+
+    def getReferences(self, request, pageSize=100):
+        return self.resultIterator(
+            request, pageSize, self._backend.searchReferences,
+            protocol.SearchReferencesResponse, "references")
+
+    def getReferenceSets(self, request, pageSize=100):
+        return self.resultIterator(
+            request, pageSize, self._backend.searchReferenceSets,
+            protocol.SearchReferenceSetsResponse, "referenceSets")
+
+    def testSearchReferencesByMd5Checksum(self):
+        allReferences = list(
+            self.getReferences(protocol.SearchReferencesRequest()))
+        self.assertGreater(len(allReferences), 0)
+        for reference in allReferences:
+            request = protocol.SearchReferencesRequest()
+            request.md5checksums = [reference.md5checksum, "notFound"]
+            expectedIds = [
+                ref.id for ref in allReferences
+                if ref.md5checksum == reference.md5checksum]
+            ids = [ref.id for ref in self.getReferences(request, 1)]
+            self.assertEqual(ids, expectedIds)
+            request.referenceSetId = reference.id.split(":")[0]
+            ids = [ref.id for ref in self.getReferences(request, 1)]
+            self.assertIn(reference.id, ids)
+        request = protocol.SearchReferencesRequest()
+        request.md5checksums = ["notFound"]
+        self.assertEqual(list(self.getReferences(request)), [])
+        request = protocol.SearchReferencesRequest()
+        request.accessions = ["notFound"]
+        self.assertEqual(list(self.getReferences(request)), [])
+
+    def testSearchReferencesByReferenceSetId(self):
+        request = protocol.SearchReferenceSetsRequest()
+        for referenceSet in self.getReferenceSets(request):
+            request = protocol.SearchReferencesRequest()
+            request.referenceSetId = referenceSet.id
+            ids = [ref.id for ref in self.getReferences(request)]
+            self.assertEqual(ids, referenceSet.referenceIds)
+        request = protocol.SearchReferencesRequest()
+        request.referenceSetId = "notFound"
+        with self.assertRaises(exceptions.ReferenceSetNotFoundException):
+            list(self.getReferences(request))
+
+    def testSearchReferenceSetsByFilters(self):
+        allReferenceSets = list(
+            self.getReferenceSets(protocol.SearchReferenceSetsRequest()))
+        self.assertGreater(len(allReferenceSets), 0)
+        for referenceSet in allReferenceSets:
+            request = protocol.SearchReferenceSetsRequest()
+            request.md5checksums = [referenceSet.md5checksum]
+            ids = [refSet.id for refSet in self.getReferenceSets(request)]
+            self.assertIn(referenceSet.id, ids)
+        for attrName, value in [
+                ("md5checksums", ["notFound"]), ("accessions", ["notFound"]),
+                ("assemblyId", "notFound")]:
+            request = protocol.SearchReferenceSetsRequest()
+            setattr(request, attrName, value)
+            self.assertEqual(list(self.getReferenceSets(request)), [])
+
+    def testSearchReferenceSetsByAssemblyIdAndAccession(self):
+        referenceSet = self._backend.getReferenceSets()[0]
+        request = protocol.SearchReferenceSetsRequest()
+        request.assemblyId = "GRCh37"
+        request.accessions = ["NC_000001.10", "notFound"]
+        with mock.patch.object(
+                referenceSet, "getAssemblyId", return_value="GRCh37-lite"), \
+                mock.patch.object(
+                    referenceSet, "getSourceAccessions",
+                    return_value=["NC_000001.10"]):
+            ids = [refSet.id for refSet in self.getReferenceSets(request)]
+        self.assertEqual(ids, [referenceSet.getId()])
+
     def runListReferenceBases(self, id_):
         requestArgs = {"start": 5, "end": 10, "pageToken": "0"}
         responseStr = self._backend.listReferenceBases(id_, requestArgs)
@@ -216,6 +424,183 @@ class TestFileSystemBackend(TestAbstractBackend):
         id_ = "example_1:simple"
         self.runListReferenceBases(id_)
 
+    def testSearchPageCacheInvalidation(self):
+        request = protocol.SearchVariantSetsRequest()
+        request.datasetIds = [self._backend.getDatasetIds()[0]]
+        requestStr = request.toJsonString()
+        self._backend.setSearchPageCacheSize(2**20)
+        self._backend.searchVariantSets(requestStr)
+        self._backend.searchVariantSets(requestStr)
+        self.assertEqual(
+            self._backend.getSearchPageCacheStatistics()["hits"], 1)
+        # a change to the data invalidates the cached pages
+        dataVersion = self._backend.getDataVersion()
+        with mock.patch.object(
+                self._backend, "getDataVersion",
+                return_value=dataVersion + 1):
+            self._backend.searchVariantSets(requestStr)
+        statistics = self._backend.getSearchPageCacheStatistics()
+        self.assertEqual(statistics["hits"], 1)
+        self.assertEqual(statistics["misses"], 2)
+
+    def testDataVersion(self):
+        latestMtime = os.path.getmtime(self._dataDir)
+        for dirPath, dirNames, fileNames in os.walk(self._dataDir):
+            for name in dirNames + fileNames:
+                latestMtime = max(
+                    latestMtime, os.path.getmtime(
+                        os.path.join(dirPath, name)))
+        self.assertEqual(self._backend.getDataVersion(), latestMtime)
+
+    def testDataVersionRefreshedInBackground(self):
+        self._backend.dataVersionInterval = 0.01
+        dataVersion = self._backend.getDataVersion()
+        # the request threads never scan the directory themselves
+        with mock.patch.object(
+                self._backend, "_scanDataVersion",
+                return_value=dataVersion + 1), \
+                mock.patch("os.walk") as walk:
+            deadline = time.time() + 10
+            while (self._backend.getDataVersion() == dataVersion and
+                    time.time() < deadline):
+                time.sleep(0.01)
+            self.assertEqual(self._backend.getDataVersion(), dataVersion + 1)
+            self.assertFalse(walk.called)
+        self._backend.dataVersionInterval = 3600
+
+    def testVariantPagingWithCursorCache(self):
+        variantSetIds = ["dataset1:1kgPhase1"]
+
+        def getVariantIds(start, pageSize):
+            return [
+                variant.id for variant in self.getVariants(
+                    variantSetIds, "1", start=start, pageSize=pageSize)]
+        variants = list(self.getVariants(variantSetIds, "1"))
+        self.assertGreater(len(variants), 10)
+        tailStart = variants[len(variants) // 2].start
+        expectedAll = getVariantIds(0, 1000)
+        expectedTail = getVariantIds(tailStart, 1000)
+        self._backend.setCursorCacheSize(10)
+        # Interleave two searches over the same file, so that parked
+        # cursors must not be disturbed by other searches
+        allIterator = self.getVariants(variantSetIds, "1", pageSize=3)
+        tailIterator = self.getVariants(
+            variantSetIds, "1", start=tailStart, pageSize=5)
+        allIds = []
+        tailIds = []
+        for allVariant, tailVariant in itertools.izip_longest(
+                allIterator, tailIterator):
+            if allVariant is not None:
+                allIds.append(allVariant.id)
+            if tailVariant is not None:
+                tailIds.append(tailVariant.id)
+        self.assertEqual(allIds, expectedAll)
+        self.assertEqual(tailIds, expectedTail)
+        # Expired cursors fall back to the page token
+        self._backend.setCursorCacheTimeout(0)
+        self.assertEqual(getVariantIds(0, 3), expectedAll)
+
+    def testFilteredVariantSearch(self):
+        request = protocol.SearchVariantsRequest()
+        request.variantSetIds = ["dataset1:1kgPhase1"]
+        request.referenceName = "1"
+        request.start = 0
+        request.end = 2 ** 32
+        allVariants = list(self.resultIterator(
+            request, 5, self._backend.searchVariants,
+            protocol.SearchVariantsResponse, "variants"))
+        expectedIds = [
+            variant.id for variant in allVariants
+            if float(variant.info["AF"][0]) < 0.05]
+        self.assertGreater(len(expectedIds), 0)
+        self.assertLess(len(expectedIds), len(allVariants))
+        # Filtered and unfiltered pages must not be mixed up in the caches
+        self._backend.setSearchPageCacheSize(2**20)
+        self._backend.setCursorCacheSize(10)
+        for _ in range(2):
+            filteredVariants = self.resultIterator(
+                request, 5, functools.partial(
+                    self._backend.searchVariants,
+                    requestArgs={"filter": "INFO/AF<0.05"}),
+                protocol.SearchVariantsResponse, "variants")
+            self.assertEqual(
+                [variant.id for variant in filteredVariants], expectedIds)
+        with self.assertRaises(exceptions.BadVariantFilterException):
+            self._backend.searchVariants(
+                request.toJsonString(), requestArgs={"filter": "AF<0.05"})
+
+    def testSearchFields(self):
+        request = protocol.SearchReadsRequest()
+        request.readGroupIds = [
+            "dataset1:wgBam:wgEncodeUwRepliSeqBg02esG1bAlnRep1_sample"]
+        request.referenceId = "0"
+        request.start = 0
+        request.end = 2 ** 32
+        fields = ["id", "alignment"]
+        allReads = list(self.resultIterator(
+            request, 3, self._backend.searchReads,
+            protocol.SearchReadsResponse, "alignments"))
+        self.assertGreater(len(allReads), 3)
+        # Paging and caching work on the projected reads
+        self._backend.setSearchPageCacheSize(2**20)
+        self._backend.setCursorCacheSize(10)
+        searchReads = functools.partial(
+            self._backend.searchReads, requestArgs={"fields": "alignment,id"})
+        for _ in range(2):
+            responseStr = searchReads(request.toJsonString())
+            for value in json.loads(responseStr)["alignments"]:
+                self.assertEqual(set(value.keys()), set(fields))
+            projectedReads = list(self.resultIterator(
+                request, 3, searchReads, protocol.SearchReadsResponse,
+                "alignments"))
+            self.assertEqual(
+                [(read.id, read.alignment) for read in projectedReads],
+                [(read.id, read.alignment) for read in allReads])
+            for read in projectedReads:
+                self.assertEqual(read.alignedQuality, [])
+                self.assertEqual(read.info, {})
+        with self.assertRaises(exceptions.UnknownFieldsException):
+            self._backend.searchReads(
+                request.toJsonString(), requestArgs={"fields": "id,calls"})
+        # Variants without calls or info
+        request = protocol.SearchVariantsRequest()
+        request.variantSetIds = ["dataset1:1kgPhase1"]
+        request.referenceName = "1"
+        request.start = 0
+        request.end = 2 ** 32
+        responseStr = self._backend.searchVariants(
+            request.toJsonString(), requestArgs={"fields": "id,start,end"})
+        values = json.loads(responseStr)["variants"]
+        self.assertGreater(len(values), 0)
+        for value in values:
+            self.assertEqual(set(value.keys()), set(["id", "start", "end"]))
+
+    def testSearchReadsByReferenceId(self):
+        # a server Reference id finds the reads on the contig of its name,
+        # wherever that contig is in the BAM header
+        request = protocol.SearchReadsRequest()
+        request.readGroupIds = [
+            "dataset1:wgBam:wgEncodeUwRepliSeqBg02esG1bAlnRep1_sample"]
+        request.referenceId = "0"
+        request.start = 0
+        request.end = 2 ** 32
+        readsByIndex = list(self.resultIterator(
+            request, 10, self._backend.searchReads,
+            protocol.SearchReadsResponse, "alignments"))
+        self.assertGreater(len(readsByIndex), 0)
+        referenceId = "example_1:simple"
+        request.referenceId = referenceId
+        with self.assertRaises(exceptions.ReferenceNameNotFoundException):
+            self._backend.searchReads(request.toJsonString())
+        reference = self._backend._referenceIdMap[referenceId]
+        with mock.patch.object(reference, "getName", return_value="chr1"):
+            readsByName = list(self.resultIterator(
+                request, 10, self._backend.searchReads,
+                protocol.SearchReadsResponse, "alignments"))
+        self.assertEqual(
+            [read.toJsonDict() for read in readsByName],
+            [read.toJsonDict() for read in readsByIndex])
+
     def testOneDatasetRestriction(self):
         # no datasetIds attr
         request = protocol.SearchReadsRequest()
@@ -243,6 +628,54 @@ class TestFileSystemBackend(TestAbstractBackend):
         with self.assertRaises(exceptions.DatasetNotFoundException):
             self._backend._getDatasetFromCompoundId(datasetId + ':notUsed')
 
+    def testReadGroupCoverage(self):
+        readGroupId = (
+            "dataset1:wgBam:wgEncodeUwRepliSeqBg02esG1bAlnRep1_sample")
+        requestArgs = {
+            "referenceName": "chr1", "start": "10000", "end": "10200",
+            "binSize": "50"}
+        response = json.loads(
+            self._backend.getReadGroupCoverage(readGroupId, requestArgs))
+        self.assertEqual(response["readGroupId"], readGroupId)
+        self.assertEqual(response["referenceName"], "chr1")
+        self.assertEqual(response["binSize"], 50)
+        self.assertEqual(len(response["coverage"]), 4)
+        self.assertEqual(response["coverage"][0], 0)
+        self.assertGreater(response["coverage"][3], 0)
+        del requestArgs["binSize"]
+        response = json.loads(
+            self._backend.getReadGroupCoverage(readGroupId, requestArgs))
+        self.assertEqual(response["binSize"], 1)
+        self.assertEqual(len(response["coverage"]), 200)
+
+    def testReadGroupCoverageBadRequests(self):
+        readGroupId = (
+            "dataset1:wgBam:wgEncodeUwRepliSeqBg02esG1bAlnRep1_sample")
+        self._backend.setMaxCoverageBins(10)
+        goodArgs = {"referenceName": "chr1", "start": "0", "end": "100"}
+        badArgsList = [
+            ({"start": "0", "end": "100"},
+             exceptions.RequestArgumentMissingException),
+            ({"referenceName": "chr1"},
+             exceptions.RequestArgumentMissingException),
+            (dict(goodArgs, end="x"), exceptions.BadRequestIntegerException),
+            (dict(goodArgs, start="100"), exceptions.BadRangeException),
+            (dict(goodArgs, start="-1"), exceptions.BadRangeException),
+            (dict(goodArgs, binSize="0"), exceptions.BadBinSizeException),
+            (dict(goodArgs, binSize="9"), exceptions.BadBinSizeException),
+            (dict(goodArgs, referenceName="notFound"),
+             exceptions.ReferenceNameNotFoundException),
+        ]
+        for badArgs, exceptionClass in badArgsList:
+            with self.assertRaises(exceptionClass):
+                self._backend.getReadGroupCoverage(readGroupId, badArgs)
+        with self.assertRaises(exceptions.ReadGroupNotFoundException):
+            self._backend.getReadGroupCoverage(
+                "dataset1:wgBam:notFound", goodArgs)
+        response = json.loads(
+            self._backend.getReadGroupCoverage(readGroupId, goodArgs))
+        self.assertEqual(response["binSize"], 10)
+
 
 class TestTopLevelObjectGenerator(unittest.TestCase):
     """
@@ -5,7 +5,11 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import random
 import argparse
+import subprocess
+import collections
+import sys
 import unittest
 import mock
 
@@ -40,6 +44,29 @@ class TestNoInput(unittest.TestCase):
     def testCliNoInput(self):
         cli.client_main(self.parser)
 
+    def testCoverageNoInput(self):
+        cli.coverage_main(self.parser)
+
+    def testReferenceCacheNoInput(self):
+        cli.reference_cache_main(self.parser)
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Tests that the client programs start without importing the server
+    stack or the converters, which dominate interpreter startup time.
+    """
+    def testClientImports(self):
+        serverModules = ["flask", "flask_cors", "oic", "humanize", "pysam"]
+        script = (
+            "import sys\n"
+            "import ga4gh.cli\n"
+            "print(' '.join(sorted(sys.modules)))\n")
+        output = subprocess.check_output([sys.executable, "-c", script])
+        loadedModules = set(output.split())
+        for moduleName in serverModules:
+            self.assertNotIn(moduleName, loadedModules)
+
 
 class TestGa2VcfArguments(unittest.TestCase):
     """
@@ -115,7 +142,8 @@ class TestClientArguments(unittest.TestCase):
     def testVariantsSearchArguments(self):
         self.cliInput = """variants-search --referenceName REFERENCENAME
         --variantName VARIANTNAME --callSetIds CALL,SET,IDS --start 0
-        --end 1 --pageSize 2 --variantSetIds VARIANT,SET,IDS"""
+        --end 1 --pageSize 2 --variantSetIds VARIANT,SET,IDS
+        --filter QUAL>30"""
 
     def testVariantSetsSearchArguments(self):
         self.cliInput = """variantsets-search --pageSize 1 --datasetIds
@@ -145,6 +173,12 @@ class TestClientArguments(unittest.TestCase):
     def testDatasetsSearchArguments(self):
         self.cliInput = """datasets-search"""
 
+    def testLoadTestArguments(self):
+        self.cliInput = """loadtest --mix variants=3,reads=1 --clients 1,2
+        --duration 5 --regionSize 100 --contigs 1:1000,2:500
+        --seed 2 --pageSize 10 --output OUTPUT
+        --readFields id,alignment --variantFields id,start,end"""
+
     def testReferenceSetGetArguments(self):
         self.cliInput = """referencesets-get ID"""
 
@@ -156,6 +190,43 @@ class TestClientArguments(unittest.TestCase):
         --start 1 --end 2"""
 
 
+class TestLoadTest(unittest.TestCase):
+    """
+    Tests the helpers of the load test runner
+    """
+    def testParseRequestMix(self):
+        self.assertEqual(
+            cli.parseRequestMix("variants=3,reads,bases=0.5"),
+            [("variants", 3), ("reads", 1), ("bases", 0.5)])
+        with self.assertRaises(ValueError):
+            cli.parseRequestMix("alleles=1")
+        with self.assertRaises(ValueError):
+            cli.parseRequestMix("variants=-1")
+
+    def testParseContigs(self):
+        self.assertEqual(
+            cli.parseContigs("1:1000,HLA:A:50"),
+            [("1", 1000), ("HLA:A", 50)])
+
+    def testWeightedChoice(self):
+        choice = cli.WeightedChoice([("a", 3), ("b", 0), ("c", 1)])
+        randomGenerator = random.Random(0)
+        counts = collections.Counter(
+            choice.choose(randomGenerator) for _ in range(1000))
+        self.assertEqual(set(counts), set(["a", "c"]))
+        self.assertGreater(counts["a"], 2 * counts["c"])
+        with self.assertRaises(ValueError):
+            cli.WeightedChoice([("a", 0)])
+
+    def testLatencyHistogram(self):
+        histogram = cli.getLatencyHistogram([0.0005, 0.001, 0.0015, 20])
+        self.assertEqual(len(histogram), len(cli.LATENCY_BUCKETS) + 1)
+        self.assertEqual(histogram[0], 2)
+        self.assertEqual(histogram[1], 1)
+        self.assertEqual(histogram[-1], 1)
+        self.assertEqual(sum(histogram), 4)
+
+
 class StubArgumentParser(object):
     """
     A stand-in object for an ArgumentParser that intercepts calls
@@ -43,6 +43,7 @@ class DummyResponse(object):
             self.text = self._getText()
         else:
             self.text = text
+        self.content = self.text
 
     def _getText(self):
         txt = {
@@ -74,7 +75,13 @@ class TestSearchMethodsCallRunRequest(unittest.TestCase):
         self.httpClient.searchVariants(self.protocolRequest)
         self.httpClient.runSearchRequest.assert_called_once_with(
             self.protocolRequest, "variants",
-            protocol.SearchVariantsResponse)
+            protocol.SearchVariantsResponse, {})
+
+    def testSearchVariantsWithFilter(self):
+        self.httpClient.searchVariants(self.protocolRequest, "QUAL>30")
+        self.httpClient.runSearchRequest.assert_called_once_with(
+            self.protocolRequest, "variants",
+            protocol.SearchVariantsResponse, {"filter": "QUAL>30"})
 
     def testSearchVariantSets(self):
         self.httpClient.searchVariantSets(self.protocolRequest)
@@ -110,7 +117,14 @@ class TestSearchMethodsCallRunRequest(unittest.TestCase):
         self.httpClient.searchReads(self.protocolRequest)
         self.httpClient.runSearchRequest.assert_called_once_with(
             self.protocolRequest, "reads",
-            protocol.SearchReadsResponse)
+            protocol.SearchReadsResponse, {})
+
+    def testSearchReadsWithFields(self):
+        self.httpClient.searchReads(
+            self.protocolRequest, fields=["id", "alignment"])
+        self.httpClient.runSearchRequest.assert_called_once_with(
+            self.protocolRequest, "reads",
+            protocol.SearchReadsResponse, {"fields": "id,alignment"})
 
     def testSearchDatasets(self):
         self.httpClient.searchDatasets(self.protocolRequest)
@@ -237,3 +251,24 @@ class TestRunRequest(unittest.TestCase):
             params = {"start": 1, "end": 5}
             httpMethod = 'GET'
             mockGet.assert_called_twice_with(httpMethod, url, params=params)
+
+    def testDoRawRequest(self):
+        # setup
+        mockGet = mock.Mock()
+        with mock.patch('requests.request', mockGet):
+            mockGet.side_effect = [DummyResponse('{"sequence": "ACGT"}')]
+
+            # invoke SUT
+            result = self.httpClient.doRawRequest(
+                'GET', "references/myId/bases", httpParams={"start": 1})
+
+            # verify the body is returned unparsed
+            self.assertEqual(result, '{"sequence": "ACGT"}')
+            self.assertEqual(self.httpClient.getBytesRead(), len(result))
+
+            # verify requests.request called correctly
+            url = "http://example.com/references/myId/bases"
+            params = {'key': 'KEY', 'start': 1}
+            mockGet.assert_called_once_with(
+                'GET', url, params=params, headers={}, data=None,
+                verify=False)
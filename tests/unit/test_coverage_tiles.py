@@ -0,0 +1,156 @@
+"""
+Tests for the precomputed coverage tiles of read groups
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+import ga4gh.backend as backend
+import ga4gh.datamodel as datamodel
+import ga4gh.datamodel.reads as reads
+
+
+class TestCoverageTiles(unittest.TestCase):
+    """
+    Tests building coverage sidecar files and answering queries from them
+    """
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp(prefix="ga4gh_coverage_test")
+        sourcePath = os.path.join(
+            "tests", "data", "dataset1", "reads", "1kg-low-coverage",
+            "HG00096.mapped.ILLUMINA.bwa.GBR.low_coverage.20120522.bam")
+        self.samFilePath = os.path.join(self.tempDir, "sample.bam")
+        shutil.copy(sourcePath, self.samFilePath)
+        shutil.copy(sourcePath + ".bai", self.samFilePath + ".bai")
+        self.tileSizes = [2048, 8192, 32768]
+        self.referenceName = "1"
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def _getReadGroup(self):
+        return reads.HtslibReadGroup("readGroupSet:sample", self.samFilePath)
+
+    def _scanCoverage(self, start, end, binSize):
+        readGroup = self._getReadGroup()
+        blocks = readGroup._getAlignedBlocks(self.referenceName, start, end)
+        return reads.binCoverage(blocks, start, end, binSize)
+
+    def testBuildIsUpToDate(self):
+        self.assertFalse(reads.CoverageTiles.isUpToDate(self.samFilePath))
+        reads.CoverageTiles.build(self.samFilePath, self.tileSizes)
+        self.assertTrue(reads.CoverageTiles.isUpToDate(self.samFilePath))
+        sidecarTime = os.path.getmtime(
+            reads.CoverageTiles.getSidecarPath(self.samFilePath))
+        os.utime(self.samFilePath, (sidecarTime + 10, sidecarTime + 10))
+        self.assertFalse(reads.CoverageTiles.isUpToDate(self.samFilePath))
+
+    def testTilesAgreeWithScan(self):
+        reads.CoverageTiles.build(self.samFilePath, self.tileSizes)
+        coverageTiles = reads.CoverageTiles(
+            reads.CoverageTiles.getSidecarPath(self.samFilePath))
+        for start, end, binSize in [
+                (8192, 12288, 2048), (0, 16384, 8192), (0, 65536, 32768),
+                (8192, 14336, 6144), (0, 262144, 65536)]:
+            depths, edges = coverageTiles.getBinDepths(
+                self.referenceName, start, end, binSize)
+            self.assertEqual(edges, [])
+            tileCoverage = reads.binCoverage(
+                [], start, end, binSize, depths)
+            scanCoverage = self._scanCoverage(start, end, binSize)
+            self.assertEqual(len(tileCoverage), len(scanCoverage))
+            for tileDepth, scanDepth in zip(tileCoverage, scanCoverage):
+                self.assertAlmostEqual(tileDepth, scanDepth, places=5)
+
+    def testUnalignedQueryEdges(self):
+        reads.CoverageTiles.build(self.samFilePath, self.tileSizes)
+        coverageTiles = reads.CoverageTiles(
+            reads.CoverageTiles.getSidecarPath(self.samFilePath))
+        depths, edges = coverageTiles.getBinDepths(
+            self.referenceName, 10000, 30000, 10000)
+        self.assertEqual(len(depths), 2)
+        self.assertEqual(
+            edges, [(10000, 10240), (18432, 20480), (28672, 30000)])
+        # bins smaller than a tile are left to the scan entirely
+        depths, edges = coverageTiles.getBinDepths(
+            self.referenceName, 8192, 12288, 1024)
+        self.assertEqual(depths, [0] * 4)
+        self.assertEqual(edges, [(8192, 12288)])
+        self.assertIsNone(coverageTiles.getBinDepths(
+            "notFound", 8192, 12288, 2048))
+
+    def testReadGroupUsesTiles(self):
+        start, end, binSize = 8192, 12288, 2048
+        expected = self._getReadGroup().getCoverage(
+            self.referenceName, start, end, binSize)
+        reads.CoverageTiles.build(self.samFilePath, self.tileSizes)
+        readGroup = self._getReadGroup()
+        coverage = readGroup.getCoverage(
+            self.referenceName, start, end, binSize)
+        # the tiles are held by the bounded file handle cache
+        self.assertIn(
+            reads.CoverageTiles.getSidecarPath(self.samFilePath),
+            datamodel.fileHandleCache.getCachedFiles())
+        for depth, expectedDepth in zip(coverage, expected):
+            self.assertAlmostEqual(depth, expectedDepth, places=5)
+        # queries that do not line up with the tiles give the same results
+        # as a scan
+        for start, end, binSize in [
+                (10001, 10010, 3), (100, 300100, 30000),
+                (5000, 250000, 7777)]:
+            coverage = readGroup.getCoverage(
+                self.referenceName, start, end, binSize)
+            expected = self._scanCoverage(start, end, binSize)
+            self.assertEqual(len(coverage), len(expected))
+            for depth, expectedDepth in zip(coverage, expected):
+                self.assertAlmostEqual(depth, expectedDepth, places=4)
+
+    def testDefaultBinSizeUsesTiles(self):
+        # a query without a binSize is answered from the tiles, scanning
+        # only the reads at the edges of its bins
+        dataDir = os.path.join(self.tempDir, "data")
+        readGroupSetDir = os.path.join(dataDir, "dataset", "reads", "sample")
+        os.makedirs(readGroupSetDir)
+        os.makedirs(os.path.join(dataDir, "dataset", "variants"))
+        os.makedirs(os.path.join(dataDir, "references"))
+        for suffix in ["", ".bai"]:
+            shutil.copy(
+                self.samFilePath + suffix,
+                os.path.join(readGroupSetDir, "sample.bam" + suffix))
+        samFilePath = os.path.join(readGroupSetDir, "sample.bam")
+        reads.CoverageTiles.build(samFilePath, self.tileSizes)
+        fileSystemBackend = backend.FileSystemBackend(dataDir)
+        fileSystemBackend.setMaxCoverageBins(10)
+        readGroupId = fileSystemBackend.getDataset(
+            "dataset").getReadGroupIds()[0]
+        start, end = 100, 300100
+        scanned = []
+        getAlignedBlocks = reads.HtslibReadGroup._getAlignedBlocks
+
+        def recordScan(readGroup, referenceName, scanStart, scanEnd):
+            scanned.append(scanEnd - scanStart)
+            return getAlignedBlocks(
+                readGroup, referenceName, scanStart, scanEnd)
+        with mock.patch.object(
+                reads.HtslibReadGroup, "_getAlignedBlocks", recordScan):
+            response = json.loads(fileSystemBackend.getReadGroupCoverage(
+                readGroupId, {
+                    "referenceName": self.referenceName,
+                    "start": str(start), "end": str(end)}))
+        self.assertEqual(response["binSize"], 30000)
+        self.assertLess(sum(scanned), (end - start) // 10)
+        expected = self._scanCoverage(start, end, response["binSize"])
+        for depth, expectedDepth in zip(response["coverage"], expected):
+            self.assertAlmostEqual(depth, expectedDepth, places=4)
+
+    def testBadTileSizes(self):
+        with self.assertRaises(ValueError):
+            reads.CoverageTiles.build(self.samFilePath, [2048, 3072])
@@ -0,0 +1,54 @@
+"""
+Tests the cursor cache
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import unittest
+
+import ga4gh.backend as backend
+
+
+class TestCursorCache(unittest.TestCase):
+    """
+    Tests the parking and eviction of cursors
+    """
+    def setUp(self):
+        self._cache = backend.CursorCache(maxSize=3, timeout=60)
+
+    def testDisabledByDefault(self):
+        self.assertFalse(backend.CursorCache().isEnabled())
+        self.assertTrue(self._cache.isEnabled())
+
+    def testTakeRemovesCursor(self):
+        cursor = object()
+        self._cache.park("key", cursor)
+        self.assertEqual(self._cache.getNumCursors(), 1)
+        self.assertIs(self._cache.take("key"), cursor)
+        self.assertIsNone(self._cache.take("key"))
+        self.assertEqual(self._cache.getNumCursors(), 0)
+
+    def testMissingCursor(self):
+        self.assertIsNone(self._cache.take("missing"))
+
+    def testLeastRecentlyParkedEvicted(self):
+        cursors = [object() for _ in range(4)]
+        for i, cursor in enumerate(cursors):
+            self._cache.park(i, cursor)
+        self.assertEqual(self._cache.getNumCursors(), 3)
+        self.assertIsNone(self._cache.take(0))
+        for i in range(1, 4):
+            self.assertIs(self._cache.take(i), cursors[i])
+
+    def testExpiredCursor(self):
+        self._cache.setTimeout(0)
+        self._cache.park("key", object())
+        self.assertIsNone(self._cache.take("key"))
+
+    def testShrinkingEvicts(self):
+        for i in range(3):
+            self._cache.park(i, object())
+        self._cache.setMaxSize(0)
+        self.assertEqual(self._cache.getNumCursors(), 0)
+        self.assertFalse(self._cache.isEnabled())
@@ -168,6 +168,8 @@ class ImportGraphLayerChecker(object):
                      'ga4gh/_protocol_definitions.py'],
         'config': ['ga4gh/serverconfig.py'],
         'avrotools': ['ga4gh/avrotools.py'],
+        'metrics': ['ga4gh/metrics.py'],
+        'profiler': ['ga4gh/profiler.py'],
     }
 
     # each moduleGroupName has one and only one entry here
@@ -182,6 +184,7 @@ class ImportGraphLayerChecker(object):
         ['avrotools'],
         ['config'],
         ['protocol'],
+        ['metrics', 'profiler'],
     ]
 
     def __init__(self, graph):
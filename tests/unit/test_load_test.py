@@ -0,0 +1,149 @@
+"""
+Tests the load test runner against a server that validates requests
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import logging
+
+import mock
+import pysam
+
+import ga4gh.cli as cli
+import ga4gh.frontend as frontend
+
+
+class FakeHttpResponse(object):
+    """
+    A stand-in for the response of the requests library, made from the
+    response of the Flask test client.
+    """
+    def __init__(self, url, testResponse):
+        self.url = url
+        self.status_code = testResponse.status_code
+        self.content = testResponse.data
+        self.text = testResponse.data.decode("utf-8")
+
+
+class TestLoadTestRunner(unittest.TestCase):
+    """
+    Runs a short load test against the test reads and variants, sending
+    the requests to the Flask test client with request validation turned
+    on. The test references are not those the reads are aligned to, so
+    we add a reference named as the reads' first contig.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.dataDir = tempfile.mkdtemp(prefix="ga4gh_load_test_data")
+        datasetDir = os.path.join(cls.dataDir, "dataset1")
+        os.makedirs(os.path.join(datasetDir, "reads"))
+        sourceDir = os.path.abspath(os.path.join("tests", "data", "dataset1"))
+        os.symlink(
+            os.path.join(sourceDir, "variants"),
+            os.path.join(datasetDir, "variants"))
+        os.symlink(
+            os.path.join(sourceDir, "reads", "1kg-low-coverage"),
+            os.path.join(datasetDir, "reads", "1kg-low-coverage"))
+        referenceSetDir = os.path.join(cls.dataDir, "references", "grch37")
+        os.makedirs(referenceSetDir)
+        fastaPath = os.path.join(referenceSetDir, "1.fa")
+        with open(fastaPath, "w") as fastaFile:
+            fastaFile.write(">1\n")
+            for _ in range(1000):
+                fastaFile.write("ACGT" * 25 + "\n")
+        # pysam wants byte strings for its file names
+        pysam.tabix_compress(str(fastaPath), str(fastaPath + ".gz"))
+        pysam.faidx(str(fastaPath + ".gz"))
+        config = {
+            "DATA_SOURCE": cls.dataDir,
+        }
+        reload(frontend)
+        frontend.configure(baseConfig="TestConfig", extraConfig=config)
+        cls.app = frontend.app.test_client()
+        # silence usually unhelpful CORS log
+        logging.getLogger('ga4gh.frontend.cors').setLevel(logging.CRITICAL)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app = None
+        shutil.rmtree(cls.dataDir)
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp(prefix="ga4gh_load_test")
+        self.baseUrl = "http://localhost/current"
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def sendRequest(self, method, url, params=None, data=None, headers=None,
+                    verify=True):
+        path = url[len("http://localhost"):]
+        testResponse = self.app.open(
+            path, method=method, query_string=params, data=data,
+            headers=headers)
+        return FakeHttpResponse(url, testResponse)
+
+    def runLoadTest(self, mix):
+        outputPath = os.path.join(self.tempDir, "output.json")
+        parser = cli.argparse.ArgumentParser()
+        cli.addClientGlobalOptions(parser)
+        subparsers = parser.add_subparsers()
+        cli.addLoadTestParser(subparsers)
+        args = parser.parse_args([
+            "loadtest", "--mix", mix, "--clients", "1", "--duration", "0.5",
+            "--contigs", "1:100000,chr1:100000", "--pageSize", "10",
+            "--output", outputPath, self.baseUrl])
+        with mock.patch(
+                "ga4gh.client.requests.request",
+                side_effect=self.sendRequest), \
+                mock.patch("sys.stdout"):
+            args.runner(args).run()
+        with open(outputPath) as outputFile:
+            return json.load(outputFile)
+
+    def testValidRequests(self):
+        # every request the load test sends is a valid protocol request
+        output = self.runLoadTest("variants,reads,bases,variantsets")
+        stage = output["stages"][0]
+        self.assertGreater(stage["requests"], 0)
+        self.assertEqual(stage["errors"], 0)
+        for requestType in ["variants", "reads", "bases", "variantsets"]:
+            self.assertIn(requestType, stage["requestTypes"])
+            self.assertEqual(stage["requestTypes"][requestType]["errors"], 0)
+        self.assertEqual(sum(stage["histogram"]), stage["requests"])
+
+    def testReadsSearchedByReferenceName(self):
+        # reads are searched on the server's reference of the contig's
+        # name, and not on contigs the server has no reference for
+        requests = []
+        sendRequest = self.sendRequest
+
+        def recordRequest(method, url, params=None, data=None, headers=None,
+                          verify=True):
+            if url.endswith("/reads/search"):
+                requests.append(json.loads(data))
+            return sendRequest(method, url, params, data, headers, verify)
+        with mock.patch.object(self, "sendRequest", recordRequest):
+            output = self.runLoadTest("reads")
+        self.assertEqual(output["stages"][0]["errors"], 0)
+        self.assertGreater(len(requests), 0)
+        for request in requests:
+            self.assertEqual(request["referenceId"], "grch37:1")
+
+    def testErrorsLeftOutOfLatencies(self):
+        # failed requests are counted but are not in the latencies
+        with mock.patch.object(
+                cli.LoadTestRunner, "_sendRequest",
+                side_effect=Exception("failed")):
+            output = self.runLoadTest("datasets")
+        stage = output["stages"][0]
+        self.assertGreater(stage["requests"], 0)
+        self.assertEqual(stage["errors"], stage["requests"])
+        self.assertEqual(sum(stage["histogram"]), 0)
+        self.assertEqual(stage["p99"], 0)
@@ -0,0 +1,106 @@
+"""
+Tests the timers and counters of the metrics registry
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import time
+import unittest
+
+import ga4gh.metrics as metrics
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """
+    Tests the accumulation and rendering of timers and counters
+    """
+    def setUp(self):
+        self._registry = metrics.MetricsRegistry()
+
+    def testInitialState(self):
+        for stage in metrics.STAGES:
+            self.assertEqual(self._registry.getStageSeconds(stage), 0)
+            self.assertEqual(self._registry.getStageCount(stage), 0)
+        for name, _ in metrics.COUNTERS:
+            self.assertEqual(self._registry.getCounter(name), 0)
+
+    def testCounters(self):
+        self._registry.increment(metrics.BYTES_OUT, 10)
+        self._registry.increment(metrics.BYTES_OUT, 5)
+        self._registry.increment(metrics.RECORDS_RETURNED)
+        self.assertEqual(self._registry.getCounter(metrics.BYTES_OUT), 15)
+        self.assertEqual(
+            self._registry.getCounter(metrics.RECORDS_RETURNED), 1)
+        self._registry.reset()
+        self.assertEqual(self._registry.getCounter(metrics.BYTES_OUT), 0)
+
+    def testTimer(self):
+        with self._registry.timer(metrics.JSON_PARSE):
+            time.sleep(0.01)
+        self.assertGreater(
+            self._registry.getStageSeconds(metrics.JSON_PARSE), 0.005)
+        self.assertEqual(self._registry.getStageCount(metrics.JSON_PARSE), 1)
+
+    def testNestedTimers(self):
+        # Time spent in the inner stage is not counted in the outer one
+        with self._registry.timer(metrics.CONTAINER_LOOKUP):
+            with self._registry.timer(metrics.VALIDATION):
+                time.sleep(0.05)
+        self.assertGreater(
+            self._registry.getStageSeconds(metrics.VALIDATION), 0.04)
+        self.assertLess(
+            self._registry.getStageSeconds(metrics.CONTAINER_LOOKUP), 0.04)
+
+    def testTimeRecords(self):
+        records = self._registry.timeRecords(range(250), lambda x: x * 2)
+        with self._registry.timer(metrics.CONTAINER_LOOKUP):
+            self.assertEqual(next(records), 0)
+        self.assertEqual(list(records), [x * 2 for x in range(1, 250)])
+        self.assertEqual(
+            self._registry.getCounter(metrics.RECORDS_SCANNED), 250)
+        for stage in [metrics.HTSLIB_FETCH, metrics.RECORD_CONVERSION]:
+            self.assertEqual(self._registry.getStageCount(stage), 250)
+
+    def testTimeRecordsFlushedOnClose(self):
+        records = self._registry.timeRecords(range(250), lambda x: x)
+        for _ in range(150):
+            next(records)
+        self.assertEqual(
+            self._registry.getCounter(metrics.RECORDS_SCANNED), 100)
+        records.close()
+        self.assertEqual(
+            self._registry.getCounter(metrics.RECORDS_SCANNED), 150)
+
+    def testRequestMetrics(self):
+        self._registry.increment(metrics.BYTES_OUT, 3)
+        requestMetrics = self._registry.startRequest()
+        self._registry.increment(metrics.BYTES_OUT, 5)
+        self._registry.addTime(metrics.VALIDATION, 0.25)
+        list(self._registry.timeRecords(range(10), lambda x: x))
+        self._registry.endRequest()
+        self._registry.increment(metrics.BYTES_OUT, 7)
+        self.assertEqual(requestMetrics.getCounter(metrics.BYTES_OUT), 5)
+        self.assertEqual(
+            requestMetrics.getCounter(metrics.RECORDS_SCANNED), 10)
+        self.assertEqual(self._registry.getCounter(metrics.BYTES_OUT), 15)
+        entries = requestMetrics.getServerTimingHeader().split(", ")
+        self.assertEqual(entries[0], "validation;dur=250.000")
+        self.assertTrue(entries[1].startswith("htslibFetch;dur="))
+        self.assertTrue(entries[-1].startswith("total;dur="))
+
+    def testPrometheusText(self):
+        self._registry.increment(metrics.RECORDS_SCANNED, 7)
+        self._registry.addTime(metrics.SERIALIZATION, 0.5, 2)
+        lines = self._registry.toPrometheusText().splitlines()
+        self.assertIn("# TYPE ga4gh_stage_seconds summary", lines)
+        self.assertIn(
+            'ga4gh_stage_seconds_sum{stage="serialization"} 0.5', lines)
+        self.assertIn(
+            'ga4gh_stage_seconds_count{stage="serialization"} 2', lines)
+        self.assertIn("# TYPE ga4gh_records_scanned_total counter", lines)
+        self.assertIn("ga4gh_records_scanned_total 7", lines)
+        for line in lines:
+            if not line.startswith("#"):
+                name, value = line.rsplit(" ", 1)
+                float(value)
@@ -0,0 +1,75 @@
+"""
+Tests the page prefetcher
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import unittest
+
+import ga4gh.backend as backend
+import ga4gh.metrics as metrics
+
+
+class TestPagePrefetcher(unittest.TestCase):
+    """
+    Tests the computation, retrieval and eviction of prefetched pages
+    """
+    def setUp(self):
+        self._prefetcher = backend.PagePrefetcher(memoryBudget=10)
+
+    def testTakeComputedPage(self):
+        self._prefetcher.prefetch("key", lambda: ("page", "token"))
+        self.assertEqual(self._prefetcher.take("key"), ("page", "token"))
+        self.assertIsNone(self._prefetcher.take("key"))
+        self.assertEqual(self._prefetcher.getMemoryUsed(), 0)
+
+    def testTakeWaitsForPendingPage(self):
+        release = threading.Event()
+
+        def computePage():
+            release.wait()
+            return "page", None
+        self._prefetcher.prefetch("key", computePage)
+        release.set()
+        self.assertEqual(self._prefetcher.take("key"), ("page", None))
+
+    def testPrefetchTimed(self):
+        # prefetches run outside requests, and are timed as their own stage
+        count = metrics.registry.getStageCount(metrics.PREFETCH)
+        self._prefetcher.prefetch("key", lambda: ("page", "token"))
+        self._prefetcher.take("key")
+        self.assertEqual(
+            metrics.registry.getStageCount(metrics.PREFETCH), count + 1)
+
+    def testMissingPage(self):
+        self.assertIsNone(self._prefetcher.take("missing"))
+
+    def testFailedPage(self):
+        def computePage():
+            raise ValueError()
+        self._prefetcher.prefetch("key", computePage)
+        self.assertIsNone(self._prefetcher.take("key"))
+
+    def testMemoryBudget(self):
+        # the oldest page is discarded to keep within the budget
+        for key in ["first", "second"]:
+            self._prefetcher.prefetch(key, lambda: ("a" * 6, None))
+            self._prefetcher._pages[key].computed.wait()
+        self.assertEqual(self._prefetcher.getMemoryUsed(), 6)
+        self.assertIsNone(self._prefetcher.take("first"))
+        self.assertEqual(self._prefetcher.take("second"), ("a" * 6, None))
+
+    def testExpiredPage(self):
+        prefetcher = backend.PagePrefetcher(timeout=0)
+        release = threading.Event()
+
+        def computePage():
+            release.wait()
+            return "page", None
+        prefetcher.prefetch("key", computePage)
+        page = prefetcher._pages["key"]
+        release.set()
+        page.computed.wait()
+        self.assertIsNone(prefetcher.take("key"))
@@ -0,0 +1,81 @@
+"""
+Tests the profiling of requests in a running server
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import time
+import marshal
+import unittest
+
+import ga4gh.profiler as profiler
+
+
+def slowFunction(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+class TestProfilingSession(unittest.TestCase):
+    """
+    Tests the selection of requests to profile and the output formats
+    """
+    def testNumRequests(self):
+        session = profiler.ProfilingSession(numRequests=2)
+        self.assertTrue(session.isActive())
+        for _ in range(3):
+            self.assertEqual(session.profileRequest(slowFunction, 0), 0)
+        self.assertEqual(session.getNumRequests(), 2)
+        self.assertFalse(session.isActive())
+        self.assertTrue(session.isFinished())
+
+    def testTimeWindow(self):
+        session = profiler.ProfilingSession(seconds=0.05)
+        session.profileRequest(slowFunction, 0)
+        self.assertFalse(session.isFinished())
+        time.sleep(0.1)
+        session.profileRequest(slowFunction, 0)
+        self.assertEqual(session.getNumRequests(), 1)
+        self.assertTrue(session.isFinished())
+
+    def testExceptionsCounted(self):
+        session = profiler.ProfilingSession(numRequests=1)
+        with self.assertRaises(ZeroDivisionError):
+            session.profileRequest(lambda: 1 / 0)
+        self.assertTrue(session.isFinished())
+
+    def testTextFormat(self):
+        session = profiler.ProfilingSession(numRequests=1)
+        self.assertEqual(
+            session.getOutput(), "No requests were profiled\n")
+        session.profileRequest(slowFunction, 0)
+        self.assertIn("slowFunction", session.getOutput())
+
+    def testPstatsFormat(self):
+        session = profiler.ProfilingSession(
+            numRequests=2, outputFormat=profiler.PSTATS)
+        session.profileRequest(slowFunction, 0)
+        session.profileRequest(slowFunction, 0)
+        stats = marshal.loads(session.getOutput())
+        functionNames = [key[2] for key in stats]
+        self.assertIn("slowFunction", functionNames)
+        for key, value in stats.items():
+            if key[2] == "slowFunction":
+                # The number of calls is summed over the requests
+                self.assertEqual(value[1], 2)
+
+    def testCollapsedFormat(self):
+        session = profiler.ProfilingSession(
+            numRequests=1, outputFormat=profiler.COLLAPSED)
+        session.profileRequest(slowFunction, 0.1)
+        lines = session.getOutput().splitlines()
+        self.assertGreater(len(lines), 0)
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertTrue(stack.endswith(
+            "test_profiler.py:slowFunction"))
+        self.assertGreater(int(count), 0)
+
+    def testUnknownFormat(self):
+        with self.assertRaises(ValueError):
+            profiler.ProfilingSession(outputFormat="flamegraph")
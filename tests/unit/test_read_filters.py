@@ -0,0 +1,94 @@
+"""
+Tests the filtering of reads by flags and mapping quality
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import array
+import shutil
+import tempfile
+import unittest
+
+import pysam
+
+import ga4gh.datamodel.reads as reads
+
+
+class TestHtslibReadFilter(unittest.TestCase):
+    """
+    Tests that HtslibReadGroup drops filtered reads before converting them
+    """
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp(prefix="ga4gh_read_filter_test")
+        self.samFilePath = os.path.join(self.tempDir, "sample.bam")
+        # (name, flag, mapping quality)
+        self.readSpecs = [
+            ("plain", 0, 60),
+            ("duplicate", reads.SamFlags.DUPLICATE_FRAGMENT, 60),
+            ("secondary", reads.SamFlags.SECONDARY_ALIGNMENT, 60),
+            ("qcFailed", reads.SamFlags.FAILED_VENDOR_QUALITY_CHECKS, 60),
+            ("lowQuality", 0, 5),
+        ]
+        header = {
+            "HD": {"VN": "1.0", "SO": "coordinate"},
+            "SQ": [{"SN": "chr1", "LN": 10000}]}
+        samFile = pysam.AlignmentFile(
+            str(self.samFilePath), "wb", header=header)
+        for index, (name, flag, mappingQuality) in enumerate(
+                self.readSpecs):
+            read = pysam.AlignedSegment()
+            read.query_name = str(name)
+            read.query_sequence = str("ACGT" * 5)
+            read.flag = flag
+            read.reference_id = 0
+            read.reference_start = 100 + index
+            read.mapping_quality = mappingQuality
+            read.cigarstring = str("20M")
+            read.query_qualities = array.array(b"B", [40] * 20)
+            samFile.write(read)
+        samFile.close()
+        pysam.index(str(self.samFilePath))
+        self.readGroup = reads.HtslibReadGroup(
+            "readGroupSet:sample", self.samFilePath)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def _getReadNames(self):
+        return [
+            readAlignment.fragmentName
+            for readAlignment in self.readGroup.getReadAlignments(0)]
+
+    def testNoFilter(self):
+        self.assertEqual(
+            self._getReadNames(), [name for name, _, _ in self.readSpecs])
+
+    def testExcludedFlags(self):
+        self.readGroup.setReadFilter(
+            excludedFlags=(
+                reads.SamFlags.DUPLICATE_FRAGMENT |
+                reads.SamFlags.SECONDARY_ALIGNMENT))
+        self.assertEqual(
+            self._getReadNames(), ["plain", "qcFailed", "lowQuality"])
+
+    def testMinMappingQuality(self):
+        self.readGroup.setReadFilter(minMappingQuality=20)
+        self.assertEqual(
+            self._getReadNames(),
+            ["plain", "duplicate", "secondary", "qcFailed"])
+
+    def testFilteredReadsNotConverted(self):
+        # Only the reads that pass the filter should be converted
+        self.readGroup.setReadFilter(
+            excludedFlags=0xF00, minMappingQuality=20)
+        convertedNames = []
+        convertReadAlignment = self.readGroup.convertReadAlignment
+
+        def countingConvert(read, fields=None):
+            convertedNames.append(read.query_name)
+            return convertReadAlignment(read, fields)
+        self.readGroup.convertReadAlignment = countingConvert
+        self.assertEqual(self._getReadNames(), ["plain"])
+        self.assertEqual(convertedNames, ["plain"])
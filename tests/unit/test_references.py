@@ -0,0 +1,162 @@
+"""
+Tests for the file system based references
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import json
+import stat
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+import mock
+
+import ga4gh.datamodel as datamodel
+import ga4gh.datamodel.references as references
+
+
+class TestHtslibReferenceSet(unittest.TestCase):
+    """
+    Tests HtslibReferenceSet objects on a copy of the test references,
+    so that we can write sidecar files next to them.
+    """
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp(prefix="ga4gh_references_test")
+        self.dataDir = os.path.join(self.tempDir, "example_1")
+        # leave out any sidecar files the other tests' servers wrote
+        shutil.copytree(
+            os.path.join("tests", "data", "references", "example_1"),
+            self.dataDir, ignore=shutil.ignore_patterns(
+                "*" + references.HtslibReference.md5ChecksumSuffix,
+                "*" + references.HtslibReference.basesCacheSuffix))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def _getReferenceSet(self):
+        return references.HtslibReferenceSet("example_1", self.dataDir)
+
+    def testBasesCache(self):
+        referenceSet = self._getReferenceSet()
+        ranges = [(None, None), (0, 10), (5, None), (None, 5), (100, 50000)]
+        expected = {}
+        for reference in referenceSet.getReferences():
+            expected[reference.getId()] = [
+                reference.getBases(start, end) for start, end in ranges]
+        for reference in referenceSet.getReferences():
+            reference.writeBasesCache()
+        referenceSet.setBasesCache(True)
+        for reference in referenceSet.getReferences():
+            self.assertIsNotNone(reference._basesCachePath)
+            bases = [reference.getBases(start, end) for start, end in ranges]
+            self.assertEqual(bases, expected[reference.getId()])
+            # the maps are held by the bounded file handle cache
+            self.assertIn(
+                reference.getBasesCachePath(),
+                datamodel.fileHandleCache.getCachedFiles())
+        referenceSet.setBasesCache(False)
+        for reference in referenceSet.getReferences():
+            self.assertIsNone(reference._basesCachePath)
+            bases = [reference.getBases(start, end) for start, end in ranges]
+            self.assertEqual(bases, expected[reference.getId()])
+
+    def testBasesCacheNotWrittenByServer(self):
+        # without a copy written offline, bases come from the FASTA file
+        referenceSet = self._getReferenceSet()
+        referenceSet.setBasesCache(True)
+        for reference in referenceSet.getReferences():
+            self.assertFalse(os.path.exists(reference.getBasesCachePath()))
+            self.assertIsNone(reference._basesCachePath)
+
+    def testStaleBasesCacheIgnored(self):
+        referenceSet = self._getReferenceSet()
+        for reference in referenceSet.getReferences():
+            expected = reference.getBases()
+            reference.writeBasesCache()
+            basesCachePath = reference.getBasesCachePath()
+            with open(basesCachePath, "wb") as basesCacheFile:
+                basesCacheFile.write(b"N" * reference.getLength())
+            fastaTime = os.path.getmtime(basesCachePath) + 10
+            os.utime(reference.getFastaFilePath(), (fastaTime, fastaTime))
+            self.assertFalse(reference.isBasesCacheUpToDate())
+            reference.setBasesCache(True)
+            self.assertEqual(reference.getBases(), expected)
+
+    def testMd5ChecksumWrittenByServer(self):
+        referenceSet = self._getReferenceSet()
+        for reference in referenceSet.getReferences():
+            expected = hashlib.md5(reference.getBases().upper()).hexdigest()
+            self.assertEqual(reference.getMd5Checksum(), expected)
+            self.assertTrue(reference.isMd5ChecksumUpToDate())
+            with open(reference.getMd5ChecksumPath()) as checksumFile:
+                checksumDict = json.load(checksumFile)
+            self.assertEqual(checksumDict["md5checksum"], expected)
+        # later starts use the stored checksums rather than computing and
+        # storing them again
+        with mock.patch.object(
+                references.HtslibReference, "_writeMd5Checksum") as write:
+            self._getReferenceSet()
+        self.assertFalse(write.called)
+
+    def testMd5ChecksumPersisted(self):
+        referenceSet = self._getReferenceSet()
+        for reference in referenceSet.getReferences():
+            checksumPath = reference.getMd5ChecksumPath()
+            expected = hashlib.md5(reference.getBases().upper()).hexdigest()
+            reference.writeMd5Checksum()
+            self.assertTrue(reference.isMd5ChecksumUpToDate())
+            with open(checksumPath) as checksumFile:
+                checksumDict = json.load(checksumFile)
+            self.assertEqual(checksumDict["md5checksum"], expected)
+            # a checksum recorded against the current mtime is trusted
+            checksumDict["md5checksum"] = "persisted"
+            with open(checksumPath, "w") as checksumFile:
+                json.dump(checksumDict, checksumFile)
+        referenceSet = self._getReferenceSet()
+        for reference in referenceSet.getReferences():
+            self.assertEqual(reference.getMd5Checksum(), "persisted")
+        # but is recomputed once the FASTA file changes
+        for reference in referenceSet.getReferences():
+            fastaTime = os.path.getmtime(reference.getFastaFilePath()) + 10
+            os.utime(reference.getFastaFilePath(), (fastaTime, fastaTime))
+        referenceSet = self._getReferenceSet()
+        for reference in referenceSet.getReferences():
+            self.assertNotEqual(reference.getMd5Checksum(), "persisted")
+
+    def testFailedMd5ChecksumWriteCleanedUp(self):
+        referenceSet = self._getReferenceSet()
+        for reference in referenceSet.getReferences():
+            # a directory in the way makes the rename fail
+            os.unlink(reference.getMd5ChecksumPath())
+            os.mkdir(reference.getMd5ChecksumPath())
+            with self.assertRaises(OSError):
+                reference.writeMd5Checksum()
+            temporaryFiles = [
+                fileName for fileName in os.listdir(self.dataDir)
+                if fileName.endswith(".tmp")]
+            self.assertEqual(temporaryFiles, [])
+
+    def testMd5ChecksumReadOnlyDirectory(self):
+        os.chmod(self.dataDir, stat.S_IRUSR | stat.S_IXUSR)
+        try:
+            referenceSet = self._getReferenceSet()
+        finally:
+            os.chmod(self.dataDir, stat.S_IRWXU)
+        for reference in referenceSet.getReferences():
+            expected = hashlib.md5(reference.getBases().upper()).hexdigest()
+            self.assertEqual(reference.getMd5Checksum(), expected)
+
+    def testMd5ChecksumWriteFailureIgnored(self):
+        # the server still starts when it cannot store the checksums
+        with mock.patch.object(
+                references.HtslibReference, "_writeMd5Checksum",
+                side_effect=IOError("read-only")):
+            referenceSet = self._getReferenceSet()
+        for reference in referenceSet.getReferences():
+            expected = hashlib.md5(reference.getBases().upper()).hexdigest()
+            self.assertEqual(reference.getMd5Checksum(), expected)
+            self.assertFalse(reference.isMd5ChecksumUpToDate())
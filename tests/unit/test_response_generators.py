@@ -26,7 +26,8 @@ class MockVariantSet(variants.AbstractVariantSet):
         self.numVariants = numVariants
 
     def getVariants(self, referenceName, startPosition, endPosition,
-                    variantName=None, callSetIds=None):
+                    variantName=None, callSetIds=None, reopen=False,
+                    variantFilter=None, fields=None):
         for i in range(self.numVariants):
             yield generateVariant()
 
@@ -109,8 +110,8 @@ class MockReadGroup(reads.AbstractReadGroup):
         super(MockReadGroup, self).__init__(id_)
         self.numAlignments = numAlignments
 
-    def getReadAlignments(self, referenceName=None, referenceId=None,
-                          start=None, end=None):
+    def getReadAlignments(self, referenceId=None, start=None, end=None,
+                          reopen=False, fields=None, referenceName=None):
         for i in range(self.numAlignments):
             yield generateReadAlignment(i)
 
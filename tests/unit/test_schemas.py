@@ -5,6 +5,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import json
 import string
 import random
 import unittest
@@ -279,6 +280,35 @@ class GetProtocolClassesTest(SchemaTest):
             self.assertGreater(len(valueListName), 0)
 
 
+class LazySchemaTest(SchemaTest):
+    """
+    Tests that schemas are parsed on first access, and that the
+    precomputed field names agree with the schemas.
+    """
+    def testSchemaParsedOnAccess(self):
+        for class_ in protocol.getProtocolClasses():
+            schema = class_.schema
+            self.assertIsInstance(schema, avro.schema.RecordSchema)
+            self.assertEqual(schema.name, class_.__name__)
+            # the parsed schema replaces the descriptor on the class
+            self.assertIs(class_.__dict__["schema"], schema)
+            self.assertIs(class_.schema, schema)
+
+    def testSlotsMatchSchemaFields(self):
+        for class_ in protocol.getProtocolClasses():
+            fieldNames = [field.name for field in class_.schema.fields]
+            self.assertEqual(sorted(fieldNames), sorted(class_.__slots__))
+
+    def testDefaultsNotShared(self):
+        for class_ in protocol.getProtocolClasses():
+            first = class_.fromJsonDict({})
+            second = class_.fromJsonDict({})
+            for fieldName in class_.__slots__:
+                value = getattr(first, fieldName)
+                if isinstance(value, (list, dict)):
+                    self.assertIsNot(value, getattr(second, fieldName))
+
+
 class SearchResponseBuilderTest(SchemaTest):
     """
     Tests the SearchResponseBuilder class to ensure that it behaves
@@ -367,3 +397,18 @@ class SearchResponseBuilderTest(SchemaTest):
             self.assertEqual(nextPageToken, builder.getNextPageToken())
             instance = responseClass.fromJsonString(builder.getJsonString())
             self.assertEqual(nextPageToken, instance.nextPageToken)
+
+    def testFields(self):
+        # Only the selected fields of the values are written
+        responseClass = protocol.SearchVariantsResponse
+        variant = self.getTypicalInstance(protocol.Variant)
+        builder = protocol.SearchResponseBuilder(
+            responseClass, 100, 2**32, fields=["id", "calls"])
+        builder.addValue(variant)
+        jsonDict = json.loads(builder.getJsonString())
+        self.assertEqual(len(jsonDict["variants"]), 1)
+        value = jsonDict["variants"][0]
+        self.assertEqual(set(value.keys()), set(["id", "calls"]))
+        self.assertEqual(value["id"], variant.id)
+        self.assertEqual(
+            value["calls"], [call.toJsonDict() for call in variant.calls])
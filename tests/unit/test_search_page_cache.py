@@ -0,0 +1,75 @@
+"""
+Tests the search page cache
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import unittest
+
+import ga4gh.backend as backend
+import ga4gh.metrics as metrics
+
+
+class TestSearchPageCache(unittest.TestCase):
+    """
+    Tests the lookup, invalidation and eviction of cached pages
+    """
+    def setUp(self):
+        self._cache = backend.SearchPageCache(maxSize=10)
+
+    def assertStatistics(self, **expected):
+        statistics = self._cache.getStatistics()
+        for key, value in expected.items():
+            self.assertEqual(statistics[key], value)
+
+    def testDisabledByDefault(self):
+        self.assertFalse(backend.SearchPageCache().isEnabled())
+        self.assertTrue(self._cache.isEnabled())
+
+    def testHitAndMiss(self):
+        self.assertIsNone(self._cache.get("key", 1))
+        self._cache.put("key", 1, ("page", None))
+        self.assertEqual(self._cache.get("key", 1), ("page", None))
+        self.assertEqual(self._cache.get("key", 1), ("page", None))
+        self.assertStatistics(hits=2, misses=1, pages=1, size=4)
+
+    def testDataVersionChange(self):
+        self._cache.put("key", 1, ("page", None))
+        self.assertIsNone(self._cache.get("key", 2))
+        self.assertStatistics(hits=0, misses=1, pages=0, size=0)
+
+    def testLeastRecentlyUsedEvicted(self):
+        self._cache.put("first", 1, ("aaaa", None))
+        self._cache.put("second", 1, ("bbbb", None))
+        self._cache.get("first", 1)
+        self._cache.put("third", 1, ("cccc", None))
+        self.assertIsNone(self._cache.get("second", 1))
+        self.assertIsNotNone(self._cache.get("first", 1))
+        self.assertIsNotNone(self._cache.get("third", 1))
+        self.assertStatistics(evictions=1, pages=2, size=8)
+
+    def testReplacePage(self):
+        self._cache.put("key", 1, ("aaaa", None))
+        self._cache.put("key", 1, ("bb", "token"))
+        self.assertEqual(self._cache.get("key", 1), ("bb", "token"))
+        self.assertStatistics(pages=1, size=2)
+
+    def testShrinkingEvicts(self):
+        self._cache.put("key", 1, ("page", None))
+        self._cache.setMaxSize(0)
+        self.assertStatistics(pages=0, size=0)
+
+    def testCountedInMetrics(self):
+        names = [
+            metrics.SEARCH_PAGE_CACHE_HITS, metrics.SEARCH_PAGE_CACHE_MISSES,
+            metrics.SEARCH_PAGE_CACHE_EVICTIONS]
+        before = [metrics.registry.getCounter(name) for name in names]
+        self._cache.get("first", 1)
+        self._cache.put("first", 1, ("aaaaaa", None))
+        self._cache.get("first", 1)
+        self._cache.put("second", 1, ("bbbbbb", None))
+        after = [metrics.registry.getCounter(name) for name in names]
+        self.assertEqual(
+            [count - previous for count, previous in zip(after, before)],
+            [1, 1, 1])
@@ -271,6 +271,10 @@ class TestSimulatedStack(unittest.TestCase):
         request = protocol.SearchReadsRequest()
         readGroupId = readGroupSets[0].readGroups[0].id
         request.readGroupIds = [readGroupId]
+        # The reads overlapping the first window of read length bases are
+        # those that start in it
+        request.start = 0
+        request.end = 100
         response = self.sendJsonPostRequest(path, request.toJsonString())
         self.assertEqual(response.status_code, 200)
         responseData = protocol.SearchReadsResponse.fromJsonString(
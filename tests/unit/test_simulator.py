@@ -5,8 +5,12 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
+import subprocess
+import sys
 import unittest
 
+import ga4gh.protocol as protocol
 import ga4gh.datamodel.reads as reads
 import ga4gh.datamodel.variants as variants
 
@@ -93,6 +97,36 @@ class TestSimulatedVariantSet(unittest.TestCase):
         variantListTwo = self._getSimulatedVariantsList()
         self.assertEqual(variantListOne, variantListTwo)
 
+    def testOverlappingRanges(self):
+        # variants should depend only on their position, not on the
+        # range that was searched for
+        variantSet = variants.SimulatedVariantSet(
+            self.randomSeed, self.numCalls, 0.01, self.variantSetId)
+        start, end = 1000, 20000
+        variantList = list(variantSet.getVariants("1", start, end))
+        self.assertGreater(len(variantList), 0)
+        for variant in variantList:
+            self.assertGreaterEqual(variant.start, start)
+            self.assertLess(variant.start, end)
+        middle = variantList[len(variantList) // 2].start
+        variantListOne = list(variantSet.getVariants("1", start, middle))
+        variantListTwo = list(variantSet.getVariants("1", middle, end))
+        self._assertEqualVariantLists(
+            variantList, variantListOne + variantListTwo)
+
+    def testDensity(self):
+        # the number of variants should be close to the density times
+        # the length of the region
+        variantSet = variants.SimulatedVariantSet(
+            self.randomSeed, 1, 0.05, self.variantSetId)
+        numVariants = len(list(variantSet.getVariants("1", 0, 100000)))
+        self.assertGreater(numVariants, 4500)
+        self.assertLess(numVariants, 5500)
+        emptyVariantSet = variants.SimulatedVariantSet(
+            self.randomSeed, 1, 0, self.variantSetId)
+        self.assertEqual(
+            list(emptyVariantSet.getVariants("1", 0, 100000)), [])
+
     def _assertEqualVariantLists(self, variantListOne, variantListTwo):
         # need to make time-dependent fields equal before the comparison,
         # otherwise we're introducing a race condition
@@ -112,5 +146,98 @@ class TestSimulatedReadGroupSet(unittest.TestCase):
         readGroupSetId = "readGroupSetId"
         simulatedReadGroupSet = reads.SimulatedReadGroupSet(readGroupSetId)
         for readGroup in simulatedReadGroupSet.getReadGroups():
-            alignments = list(readGroup.getReadAlignments())
+            alignments = list(readGroup.getReadAlignments(0, 0, 1000))
             self.assertGreater(len(alignments), 0)
+
+
+class TestSimulatedReadGroup(unittest.TestCase):
+    """
+    Test that simulated reads depend only on their position
+    """
+    def setUp(self):
+        self.readLength = 50
+        self.readGroup = reads.SimulatedReadGroup(
+            "readGroupId", numAlignments=4, randomSeed=1,
+            readLength=self.readLength, numIndels=2, numTags=3)
+
+    def _getReferenceEnd(self, alignment):
+        end = alignment.alignment.position.position
+        for cigarUnit in alignment.alignment.cigar:
+            if cigarUnit.operation != protocol.CigarOperation.INSERT:
+                end += cigarUnit.operationLength
+        return end
+
+    def testRange(self):
+        start, end = 1000, 2000
+        alignments = list(self.readGroup.getReadAlignments(0, start, end))
+        positions = [
+            alignment.alignment.position.position
+            for alignment in alignments]
+        self.assertEqual(positions, sorted(positions))
+        # Four reads start in each window of readLength bases
+        self.assertEqual(
+            len([position for position in positions if position >= start]),
+            4 * (end - start) // self.readLength)
+        for alignment in alignments:
+            self.assertLess(alignment.alignment.position.position, end)
+            self.assertGreater(self._getReferenceEnd(alignment), start)
+
+    def testDeterministic(self):
+        alignments = list(self.readGroup.getReadAlignments(0, 1000, 2000))
+        subRange = list(self.readGroup.getReadAlignments(0, 1400, 1500))
+        self.assertEqual(
+            [alignment.toJsonDict() for alignment in subRange],
+            [alignment.toJsonDict() for alignment in alignments
+             if alignment.alignment.position.position < 1500 and
+             self._getReferenceEnd(alignment) > 1400])
+        otherReference = list(self.readGroup.getReadAlignments(1, 1000, 2000))
+        self.assertNotEqual(
+            [alignment.alignedSequence for alignment in alignments],
+            [alignment.alignedSequence for alignment in otherReference])
+
+    def testIndependentOfHashSeed(self):
+        # the reads for a reference named by a string are the same in
+        # interpreters with different string hashes
+        script = (
+            "import ga4gh.datamodel.reads as reads\n"
+            "readGroup = reads.SimulatedReadGroup(\n"
+            "    'readGroupId', numAlignments=4, randomSeed=1,\n"
+            "    readLength=50, numIndels=2, numTags=3)\n"
+            "for alignment in readGroup.getReadAlignments(u'1', 0, 100):\n"
+            "    print(alignment.alignedSequence)\n")
+        outputs = []
+        for hashSeed in ["1", "2"]:
+            env = dict(os.environ, PYTHONHASHSEED=hashSeed)
+            outputs.append(subprocess.check_output(
+                [sys.executable, "-c", script], env=env))
+        self.assertNotEqual(outputs[0], "")
+        self.assertEqual(outputs[0], outputs[1])
+
+    def testAlignments(self):
+        for alignment in self.readGroup.getReadAlignments(0, 0, 1000):
+            self.assertTrue(alignment.validate(alignment.toJsonDict()))
+            self.assertEqual(len(alignment.alignedSequence), self.readLength)
+            self.assertEqual(len(alignment.alignment.cigar), 5)
+            queryLength = sum(
+                cigarUnit.operationLength
+                for cigarUnit in alignment.alignment.cigar
+                if cigarUnit.operation != protocol.CigarOperation.DELETE)
+            self.assertEqual(queryLength, self.readLength)
+            self.assertEqual(len(alignment.info), 3)
+
+    def testTooManyIndels(self):
+        with self.assertRaises(ValueError):
+            reads.SimulatedReadGroup("readGroupId", readLength=8, numIndels=2)
+
+    def testReadFilter(self):
+        alignments = list(self.readGroup.getReadAlignments(0, 0, 10000))
+        self.readGroup.setReadFilter(
+            excludedFlags=reads.SamFlags.DUPLICATE_FRAGMENT,
+            minMappingQuality=20)
+        filtered = list(self.readGroup.getReadAlignments(0, 0, 10000))
+        self.assertEqual(
+            [alignment.id for alignment in filtered],
+            [alignment.id for alignment in alignments
+             if not alignment.duplicateFragment and
+             alignment.alignment.mappingQuality >= 20])
+        self.assertLess(len(filtered), len(alignments))
@@ -0,0 +1,164 @@
+"""
+Tests the collapsing of concurrent calls
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import fcntl
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import ga4gh.backend as backend
+
+
+class TestSingleFlight(unittest.TestCase):
+    """
+    Tests that concurrent calls with the same key are made once
+    """
+    def setUp(self):
+        self._singleFlight = backend.SingleFlight()
+
+    def _runConcurrently(self, key, function, numCallers=5):
+        # Starts numCallers threads making the call, and returns the
+        # results and exceptions once they have all finished. The first
+        # caller blocks in function until the others are waiting.
+        results = []
+        exceptions = []
+
+        def caller():
+            try:
+                results.append(self._singleFlight.run(key, function))
+            except Exception as exception:
+                exceptions.append(exception)
+        threads = [threading.Thread(target=caller) for _ in range(numCallers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, exceptions
+
+    def _getBlockingFunction(self, result=None, exception=None):
+        calls = []
+        release = threading.Event()
+
+        def function():
+            calls.append(None)
+            release.wait(1)
+            if exception is not None:
+                raise exception
+            return result
+        # release the call once the other callers have had time to join
+        threading.Timer(0.2, release.set).start()
+        return function, calls
+
+    def testCallsCollapsed(self):
+        function, calls = self._getBlockingFunction(result=["page", None])
+        results, exceptions = self._runConcurrently("key", function)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(exceptions, [])
+        self.assertEqual(results, [["page", None]] * 5)
+
+    def testExceptionShared(self):
+        error = ValueError("failed")
+        function, calls = self._getBlockingFunction(exception=error)
+        results, exceptions = self._runConcurrently("key", function)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [])
+        self.assertEqual(exceptions, [error] * 5)
+
+    def testSequentialCallsNotCollapsed(self):
+        calls = []
+
+        def function():
+            calls.append(None)
+            return len(calls)
+        self.assertEqual(self._singleFlight.run("key", function), 1)
+        self.assertEqual(self._singleFlight.run("key", function), 2)
+
+
+class TestSingleFlightBetweenProcesses(TestSingleFlight):
+    """
+    Tests collapsing calls through a lock directory
+    """
+    def setUp(self):
+        self._lockDirectory = tempfile.mkdtemp(prefix="ga4gh_single_flight")
+        self._singleFlight = backend.SingleFlight(self._lockDirectory)
+
+    def tearDown(self):
+        shutil.rmtree(self._lockDirectory)
+
+    def testResultPassedThroughDirectory(self):
+        # Another process finishing the call while we wait for the lock
+        # leaves its result in the lock directory
+        otherProcess = backend.SingleFlight(self._lockDirectory)
+        function, calls = self._getBlockingFunction(result=["page", None])
+        otherThread = threading.Thread(
+            target=otherProcess.run, args=("key", function))
+        otherThread.start()
+        while len(calls) == 0:
+            time.sleep(0.01)
+        result = self._singleFlight.run("key", function)
+        otherThread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(result, ["page", None])
+        fileNames = os.listdir(self._lockDirectory)
+        self.assertEqual(len(fileNames), 2)
+
+    def testEarlierResultNotReused(self):
+        # A result written before the call began is not used, however
+        # recent the modification time of its file
+        calls = []
+
+        def function():
+            calls.append(None)
+            return len(calls)
+        self.assertEqual(self._singleFlight.run("key", function), 1)
+        future = time.time() + 3600
+        for fileName in os.listdir(self._lockDirectory):
+            path = os.path.join(self._lockDirectory, fileName)
+            os.utime(path, (future, future))
+        self.assertEqual(self._singleFlight.run("key", function), 2)
+
+    def _getLockPath(self):
+        # Makes a call so that the lock file for "key" exists, and
+        # returns its path
+        self._singleFlight.run("key", lambda: None)
+        lockPaths = [
+            os.path.join(self._lockDirectory, fileName)
+            for fileName in os.listdir(self._lockDirectory)
+            if fileName.endswith(".lock")]
+        self.assertEqual(len(lockPaths), 1)
+        return lockPaths[0]
+
+    def testLockedFilesNotRemoved(self):
+        # An old lock file that another process holds is left in place
+        lockPath = self._getLockPath()
+        past = time.time() - 2 * self._singleFlight.fileTimeout
+        os.utime(lockPath, (past, past))
+        with open(lockPath) as lockFile:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            self._singleFlight._nextCleanup = 0
+            self._singleFlight._removeUnusedFiles()
+            self.assertTrue(os.path.exists(lockPath))
+        self._singleFlight._nextCleanup = 0
+        self._singleFlight._removeUnusedFiles()
+        self.assertFalse(os.path.exists(lockPath))
+
+    def testRemovedLockFileNotUsed(self):
+        # A caller waiting on a lock file that is then removed locks the
+        # file that replaces it, where other processes can see the lock
+        lockPath = self._getLockPath()
+        with open(lockPath) as lockFile:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            thread = threading.Thread(
+                target=self._singleFlight.run, args=("key", lambda: None))
+            thread.start()
+            time.sleep(0.1)
+            os.unlink(lockPath)
+        thread.join()
+        self.assertTrue(os.path.exists(lockPath))
@@ -8,6 +8,7 @@ from __future__ import unicode_literals
 
 import unittest
 
+import ga4gh.exceptions as exceptions
 import ga4gh.datamodel.variants as variants
 
 
@@ -70,3 +71,65 @@ class TestGenotypes(unittest.TestCase):
 
     def testGenotypeHaploid(self):
         self.verifyGenotypeConversion("1", "376", [1], None)
+
+
+class FakeVariantRecord(object):
+    """
+    The attributes of a pysam variant record that are used by filters
+    """
+    class FakeFilter(object):
+        def __init__(self, names):
+            self._names = names
+
+        def keys(self):
+            return self._names
+
+    def __init__(self, qual=None, filters=[], info={}):
+        self.qual = qual
+        self.filter = self.FakeFilter(filters)
+        self.info = info
+
+
+class TestVariantFilter(unittest.TestCase):
+    """
+    Tests parsing and evaluating variant filter expressions
+    """
+    def setUp(self):
+        self.records = [
+            FakeVariantRecord(50.0, ["PASS"], {"AF": (0.01,), "VT": "SNP"}),
+            FakeVariantRecord(10.0, ["q10"], {"AF": (0.2, 0.03)}),
+            FakeVariantRecord(None, [], {"VT": "INDEL"}),
+        ]
+
+    def getMatches(self, expression):
+        variantFilter = variants.VariantFilter(expression)
+        return [
+            index for index, record in enumerate(self.records)
+            if variantFilter.matches(record)]
+
+    def testFilter(self):
+        self.assertEqual(self.getMatches("FILTER==PASS"), [0])
+        self.assertEqual(self.getMatches("FILTER!=PASS"), [1, 2])
+
+    def testQual(self):
+        self.assertEqual(self.getMatches("QUAL>=30"), [0])
+        self.assertEqual(self.getMatches("QUAL < 30"), [1])
+
+    def testInfo(self):
+        # Any value of a multi-valued field may match
+        self.assertEqual(self.getMatches("INFO/AF<0.05"), [0, 1])
+        self.assertEqual(self.getMatches("INFO/AF>0.1"), [1])
+        self.assertEqual(self.getMatches("INFO/VT==SNP"), [0])
+        self.assertEqual(self.getMatches("INFO/VT!=SNP"), [2])
+
+    def testConjunction(self):
+        self.assertEqual(
+            self.getMatches("FILTER==PASS && QUAL>30 && INFO/AF<0.05"), [0])
+        self.assertEqual(self.getMatches("QUAL>30 && QUAL<40"), [])
+
+    def testBadExpressions(self):
+        for expression in [
+                "", "QUAL", "QUAL>high", "FILTER<PASS", "INFO/VT<SNP",
+                "QUAL>30 &&", "POS>100", "QUAL=30"]:
+            with self.assertRaises(exceptions.BadVariantFilterException):
+                variants.VariantFilter(expression)
@@ -5,10 +5,15 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
+import json
+import shutil
+import tempfile
 import unittest
 import logging
 
 import ga4gh.frontend as frontend
+import ga4gh.metrics as metrics
 import ga4gh.protocol as protocol
 import tests.utils as utils
 
@@ -247,6 +252,21 @@ class TestFrontend(unittest.TestCase):
             response.data)
         self.assertEqual(len(responseData.variants), 1)
 
+    def testVariantsSearchFilter(self):
+        request = protocol.SearchVariantsRequest()
+        request.variantSetIds = ["simulatedDataset1:simVs0"]
+        request.referenceName = "1"
+        request.start = 0
+        request.end = 1
+        # The filter is parsed before the search is run
+        response = self.sendPostRequest(
+            '/variants/search?filter=AF<0.05', request)
+        self.assertEqual(400, response.status_code)
+        # simulated variants have no QUAL, FILTER or INFO to filter on
+        response = self.sendPostRequest(
+            '/variants/search?filter=QUAL>30', request)
+        self.assertEqual(501, response.status_code)
+
     def testVariantSetsSearch(self):
         response = self.sendVariantSetsSearch()
         self.assertEqual(200, response.status_code)
@@ -276,13 +296,39 @@ class TestFrontend(unittest.TestCase):
         self.assertEqual(200, response.status_code)
         responseData = protocol.SearchReadsResponse.fromJsonString(
             response.data)
-        self.assertEqual(len(responseData.alignments), 2)
+        # The reads in the first window of the first reference come first
         self.assertEqual(
             responseData.alignments[0].id,
-            "simulatedDataset1:aReadGroupSet:one:simulated0")
+            "simulatedDataset1:aReadGroupSet:one:0:0:0")
         self.assertEqual(
             responseData.alignments[1].id,
-            "simulatedDataset1:aReadGroupSet:one:simulated1")
+            "simulatedDataset1:aReadGroupSet:one:0:0:1")
+
+    def testReadGroupCoverage(self):
+        # Two simulated reads start in each window of read length bases,
+        # so the mean depth over a long range is close to 2
+        path = (
+            "/readgroups/simulatedDataset1:aReadGroupSet:one/coverage"
+            "?referenceName=simRef0&start=0&end=100000&binSize=100000")
+        response = self.sendGetRequest(path)
+        self.assertEqual(200, response.status_code)
+        responseData = json.loads(response.data)
+        self.assertEqual(len(responseData["coverage"]), 1)
+        self.assertAlmostEqual(responseData["coverage"][0], 2, delta=0.01)
+        path = (
+            "/readgroups/simulatedDataset1:aReadGroupSet:one/coverage"
+            "?referenceName=whatevs&start=0&end=4&binSize=1")
+        response = self.sendGetRequest(path)
+        self.assertEqual(200, response.status_code)
+        responseData = json.loads(response.data)
+        self.assertEqual(responseData["coverage"], [0, 0, 0, 0])
+        response = self.sendGetRequest(
+            "/readgroups/simulatedDataset1:aReadGroupSet:one/coverage")
+        self.assertEqual(400, response.status_code)
+        response = self.sendGetRequest(
+            "/readgroups/simulatedDataset1:notFound/coverage"
+            "?referenceName=whatevs&end=4")
+        self.assertEqual(404, response.status_code)
 
     def testDatasetsSearch(self):
         response = self.sendDatasetsSearch()
@@ -291,6 +337,134 @@ class TestFrontend(unittest.TestCase):
         datasets = list(responseData.datasets)
         self.assertEqual('simulatedDataset1', datasets[0].id)
 
+    def testMetrics(self):
+        # The response write is timed when the server closes the response
+        self.sendVariantsSearch().close()
+        path = '/metrics'
+        self.assertEqual(501, self.app.get(path).status_code)
+        frontend.app.config["ADMIN_KEY"] = "secret"
+        try:
+            self.assertEqual(403, self.app.get(path).status_code)
+            headers = {'Authorization': 'Bearer secret'}
+            response = self.app.get(path, headers=headers)
+            self.assertEqual(200, response.status_code)
+            frontend.app.config["PUBLIC_METRICS"] = True
+            response = self.app.get(path)
+            self.assertEqual(200, response.status_code)
+        finally:
+            frontend.app.config["ADMIN_KEY"] = None
+            frontend.app.config["PUBLIC_METRICS"] = False
+        self.assertEqual("text/plain", response.mimetype)
+        lines = response.data.splitlines()
+        self.assertNotIn(
+            'ga4gh_stage_seconds_count{stage="jsonParse"} 0', lines)
+        self.assertNotIn(
+            'ga4gh_stage_seconds_count{stage="serialization"} 0', lines)
+        self.assertNotIn(
+            'ga4gh_stage_seconds_count{stage="responseWrite"} 0', lines)
+        self.assertNotIn("ga4gh_records_returned_total 0", lines)
+        self.assertNotIn("ga4gh_response_bytes_total 0", lines)
+
+    def testMetricsCountEncodedBytes(self):
+        before = metrics.registry.getCounter(metrics.BYTES_OUT)
+        with frontend.app.test_request_context():
+            frontend.getFlaskResponse('{"name": "s\u00e9quence"}')
+        self.assertEqual(
+            metrics.registry.getCounter(metrics.BYTES_OUT) - before, 21)
+
+    def testServerTiming(self):
+        response = self.sendVariantsSearch()
+        stages = dict(
+            entry.split(";dur=")
+            for entry in response.headers["Server-Timing"].split(", "))
+        self.assertIn("jsonParse", stages)
+        self.assertIn("serialization", stages)
+        self.assertGreaterEqual(
+            float(stages["total"]), float(stages["serialization"]))
+
+    def testSlowQueryLog(self):
+        tempDir = tempfile.mkdtemp()
+        logFile = os.path.join(tempDir, "slow.log")
+        try:
+            frontend.app.slowQueryLogger = frontend.getSlowQueryLogger(
+                logFile)
+            self.sendVariantSetsSearch()
+            frontend.app.slowQueryThreshold = 0
+            self.sendVariantSetsSearch()
+            with open(logFile) as f:
+                entries = [json.loads(line) for line in f]
+        finally:
+            frontend.app.slowQueryThreshold = None
+            frontend.app.slowQueryLogger = frontend.getSlowQueryLogger()
+            shutil.rmtree(tempDir)
+        # Only the request made with a threshold is logged
+        self.assertEqual(len(entries), 1)
+        entry = entries[0]
+        self.assertEqual(
+            entry["path"], utils.applyVersion('/variantsets/search'))
+        self.assertEqual(entry["args"], [])
+        self.assertEqual(
+            json.loads(entry["request"])["datasetIds"], ["simulatedDataset1"])
+        self.assertGreater(entry["bytesReturned"], 0)
+        self.assertIn("serialization", entry["stageSeconds"])
+
+    def testSlowQueryLogArgs(self):
+        tempDir = tempfile.mkdtemp()
+        logFile = os.path.join(tempDir, "slow.log")
+        request = protocol.SearchReadsRequest()
+        request.readGroupIds = ["simulatedDataset1:aReadGroupSet:one"]
+        request.referenceId = "chr1"
+        request.start = 0
+        request.end = 100
+        path = utils.applyVersion(
+            '/reads/search?fields=id&fields=alignedSequence&filter=mapq')
+        try:
+            frontend.app.slowQueryLogger = frontend.getSlowQueryLogger(
+                logFile)
+            frontend.app.slowQueryThreshold = 0
+            self.app.post(
+                path, headers={'Content-type': 'application/json'},
+                data=request.toJsonString())
+            with open(logFile) as f:
+                entries = [json.loads(line) for line in f]
+        finally:
+            frontend.app.slowQueryThreshold = None
+            frontend.app.slowQueryLogger = frontend.getSlowQueryLogger()
+            shutil.rmtree(tempDir)
+        self.assertEqual(entries[0]["args"], [
+            ["fields", "alignedSequence"], ["fields", "id"],
+            ["filter", "mapq"]])
+
+    def testAdminProfile(self):
+        path = '/admin/profile'
+        self.assertEqual(501, self.app.post(path).status_code)
+        frontend.app.config["ADMIN_KEY"] = "secret"
+        try:
+            self.assertEqual(403, self.app.post(path).status_code)
+            badHeaders = {'Authorization': 'Bearer s\u00e9cret'}
+            response = self.app.post(path, headers=badHeaders)
+            self.assertEqual(403, response.status_code)
+            headers = {'Authorization': 'Bearer secret'}
+            response = self.app.get(path, headers=headers)
+            self.assertEqual(400, response.status_code)
+            response = self.app.post(
+                path + '?requests=0', headers=headers)
+            self.assertEqual(400, response.status_code)
+            response = self.app.post(
+                path + '?requests=1&format=text', headers=headers)
+            self.assertEqual(200, response.status_code)
+            self.assertFalse(json.loads(response.data)["finished"])
+            response = self.app.post(path, headers=headers)
+            self.assertEqual(409, response.status_code)
+            self.sendVariantSetsSearch()
+            response = self.app.get(path, headers=headers)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual("text/plain", response.mimetype)
+            self.assertIn("searchVariantSets", response.data)
+        finally:
+            frontend.app.config["ADMIN_KEY"] = None
+            frontend.app.profilingSession = None
+
     def testWrongVersion(self):
         path = '/v0.1.2/variantsets/search'
         self.assertEqual(404, self.app.options(path).status_code)